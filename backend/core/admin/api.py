@@ -31,6 +31,24 @@ async def admin_install_suna_for_user(
             detail=f"Failed to install Suna agent for user {account_id}"
         )
 
+@router.get("/db-stats")
+async def get_db_stats(_: bool = Depends(verify_admin_api_key)) -> Dict:
+    """Supabase connection pool utilization and per-table request latency."""
+    from core.services.supabase import DBConnection
+    return DBConnection().get_stats()
+
+@router.get("/cache-stats")
+async def get_cache_stats(_: bool = Depends(verify_admin_api_key)) -> Dict:
+    """Two-level cache hit/miss counters and Redis/loader latency."""
+    from core.utils.cache import Cache
+    return Cache.get_stats()
+
+@router.get("/message-cache-stats")
+async def get_message_cache_stats(_: bool = Depends(verify_admin_api_key)) -> Dict:
+    """Per-thread message cache hit/miss counters and bytes held by this process."""
+    from core.agentpress.message_cache import message_cache
+    return message_cache.get_stats()
+
 @router.get("/env-vars")
 def get_env_vars() -> Dict[str, str]:
     """Get environment variables (local mode only)."""
@@ -50,7 +50,7 @@ async def advanced_user_search(
 ) -> PaginatedResponse[UserSummary]:
     try:
         db = DBConnection()
-        client = await db.client
+        client = await db.client_for('admin')
         
         pagination_params = PaginationParams(page=page, page_size=page_size)
         
@@ -217,7 +217,7 @@ async def list_users(
 ) -> PaginatedResponse[UserSummary]:
     try:
         db = DBConnection()
-        client = await db.client
+        client = await db.client_for('admin')
         
         pagination_params = PaginationParams(page=page, page_size=page_size)
         
@@ -361,7 +361,7 @@ async def get_user_details(
 ):
     try:
         db = DBConnection()
-        client = await db.client
+        client = await db.client_for('admin')
 
         account_result = await client.schema('basejump').from_('accounts').select(
             '''
@@ -430,7 +430,7 @@ async def search_users_by_email(
 ) -> PaginatedResponse[Dict[str, Any]]:
     try:
         db = DBConnection()
-        client = await db.client
+        client = await db.client_for('admin')
         
         pagination_params = PaginationParams(page=page, page_size=page_size)
         
@@ -498,7 +498,7 @@ async def get_user_stats_overview(
 ):
     try:
         db = DBConnection()
-        client = await db.client
+        client = await db.client_for('admin')
         
         total_users = await client.schema('basejump').from_('accounts').select('*', count='exact').execute()
         
@@ -552,7 +552,7 @@ async def get_user_activity_summary(
 ):
     try:
         db = DBConnection()
-        client = await db.client
+        client = await db.client_for('admin')
         
         cutoff_date = (datetime.utcnow() - timedelta(days=request.days)).isoformat()
         
@@ -621,7 +621,7 @@ async def adjust_user_credits(
 ):
     try:
         db = DBConnection()
-        client = await db.client
+        client = await db.client_for('admin')
         
         current_result = await client.from_('credit_accounts').select(
             'balance'
@@ -13,8 +13,14 @@ from core.utils.logger import logger, structlog
 # Billing checks now handled by billing_integration.check_model_and_billing_access
 from core.billing.billing_integration import billing_integration
 from core.utils.config import config, EnvMode
-from core.services import redis
+from core.services import redis, active_runs
+from core.services.response_stream import stream_response_frames, has_response_stream, sse_frame, response_hub, response_stream_hub
+from core.services.running_runs import running_runs
+from core.services.identity_map import request_read_scope, get_row, remember
+from core.services.projections import AGENT_CONFIG
+from core.sandbox.pool import sandbox_pool
 from core.sandbox.sandbox import create_sandbox, delete_sandbox
+from core.sandbox.handles import sandbox_handles
 from run_agent_background import run_agent_background
 from core.ai_models import model_manager
 
@@ -50,7 +56,8 @@ async def check_billing_status(client, user_id: str) -> Tuple[bool, str, Optiona
 async def start_agent(
     thread_id: str,
     body: AgentStartRequest = Body(...),
-    user_id: str = Depends(verify_and_get_user_id_from_jwt)
+    user_id: str = Depends(verify_and_get_user_id_from_jwt),
+    _read_scope = Depends(request_read_scope)
 ):
     """Start an agent for a specific thread in the background"""
     structlog.contextvars.bind_contextvars(
@@ -75,11 +82,10 @@ async def start_agent(
     client = await utils.db.client
 
 
-    thread_result = await client.table('threads').select('project_id', 'account_id', 'metadata').eq('thread_id', thread_id).execute()
+    thread_data = await get_row(client, 'threads', thread_id, 'project_id, account_id, metadata')
 
-    if not thread_result.data:
+    if not thread_data:
         raise HTTPException(status_code=404, detail="Thread not found")
-    thread_data = thread_result.data[0]
     project_id = thread_data.get('project_id')
     account_id = thread_data.get('account_id')
     thread_metadata = thread_data.get('metadata', {})
@@ -104,17 +110,18 @@ async def start_agent(
     if effective_agent_id:
         logger.debug(f"[AGENT LOAD] Querying for agent: {effective_agent_id}")
         # Get agent
-        agent_result = await client.table('agents').select('*').eq('agent_id', effective_agent_id).eq('account_id', account_id).execute()
-        logger.debug(f"[AGENT LOAD] Query result: found {len(agent_result.data) if agent_result.data else 0} agents")
+        agent_data = await get_row(client, 'agents', effective_agent_id, AGENT_CONFIG.select)
+        if agent_data and agent_data.get('account_id') != account_id:
+            agent_data = None
+        logger.debug(f"[AGENT LOAD] Query result: found {1 if agent_data else 0} agents")
         
-        if not agent_result.data:
+        if not agent_data:
             if body.agent_id:
                 raise HTTPException(status_code=404, detail="Agent not found or access denied")
             else:
                 logger.warning(f"Stored agent_id {effective_agent_id} not found, falling back to default")
                 effective_agent_id = None
         else:
-            agent_data = agent_result.data[0]
             version_data = None
             if agent_data.get('current_version_id'):
                 try:
@@ -144,11 +151,12 @@ async def start_agent(
 
     if not agent_config:
         logger.debug(f"[AGENT LOAD] No agent config yet, querying for default agent")
-        default_agent_result = await client.table('agents').select('*').eq('account_id', account_id).eq('is_default', True).execute()
+        default_agent_result = await client.table('agents').select(AGENT_CONFIG.select).eq('account_id', account_id).eq('is_default', True).execute()
         logger.debug(f"[AGENT LOAD] Default agent query result: found {len(default_agent_result.data) if default_agent_result.data else 0} default agents")
         
         if default_agent_result.data:
             agent_data = default_agent_result.data[0]
+            remember('agents', agent_data)
             
             # Use versioning system to get current version
             version_data = None
@@ -210,6 +218,9 @@ async def start_agent(
             logger.warning(f"Agent run limit exceeded for account {account_id}: {limit_check['running_count']} running agents")
             raise HTTPException(status_code=429, detail=error_detail)
 
+    # Start an archived or stopped sandbox now rather than on the run's first tool call
+    sandbox_handles.prefetch(project_id, client)
+
     effective_model = model_name
     if not model_name and agent_config and agent_config.get('model'):
         effective_model = agent_config['model']
@@ -240,11 +251,15 @@ async def start_agent(
     )
     logger.debug(f"Created new agent run: {agent_run_id}")
 
-    instance_key = f"active_run:{utils.instance_id}:{agent_run_id}"
     try:
-        await redis.set(instance_key, "running", ex=redis.REDIS_KEY_TTL)
+        await active_runs.register(utils.instance_id, agent_run_id)
+    except Exception as e:
+        logger.warning(f"Failed to register agent run {agent_run_id} in Redis: {str(e)}")
+
+    try:
+        await running_runs.register(account_id, agent_run_id)
     except Exception as e:
-        logger.warning(f"Failed to register agent run in Redis ({instance_key}): {str(e)}")
+        logger.warning(f"Failed to count agent run {agent_run_id} against account {account_id}: {str(e)}")
 
     request_id = structlog.contextvars.get_contextvars().get('request_id')
 
@@ -453,9 +468,14 @@ async def get_thread_agent(thread_id: str, user_id: str = Depends(verify_and_get
 async def stream_agent_run(
     agent_run_id: str,
     token: Optional[str] = None,
+    last_event_id: Optional[str] = None,
     request: Request = None
 ):
-    """Stream the responses of an agent run using Redis Lists and Pub/Sub."""
+    """Stream the responses of an agent run using Redis Lists and Pub/Sub, or Redis Streams if enabled.
+
+    With Redis Streams, clients can resume by sending the ID of the last received
+    event in the Last-Event-ID header (or the last_event_id query parameter).
+    """
     logger.debug(f"Starting stream for agent run: {agent_run_id}")
     client = await utils.db.client
 
@@ -469,164 +489,75 @@ async def stream_agent_run(
 
     response_list_key = f"agent_run:{agent_run_id}:responses"
     response_channel = f"agent_run:{agent_run_id}:new_response"
-    control_channel = f"agent_run:{agent_run_id}:control" # Global control channel
+    stream_headers = {
+        "Cache-Control": "no-cache, no-transform", "Connection": "keep-alive",
+        "X-Accel-Buffering": "no", "Content-Type": "text/event-stream",
+        "Access-Control-Allow-Origin": "*"
+    }
+
+    async def get_run_status():
+        result = await client.table('agent_runs').select('status').eq('id', agent_run_id).execute()
+        return result.data[0]['status'] if result.data else None
+
+    async def redis_stream_generator(agent_run_data):
+        resume_from = (request.headers.get("last-event-id") if request else None) or last_event_id
+        is_running = agent_run_data.get('status') == 'running' if agent_run_data else False
+        logger.debug(f"Streaming responses for {agent_run_id} from Redis Stream (resume from: {resume_from})")
+        try:
+            if is_running:
+                # Viewers of the same run in this process share one blocking reader via the hub
+                async for frame in response_stream_hub.stream(agent_run_id, resume_from, get_run_status):
+                    yield frame
+            else:
+                async for frame in stream_response_frames(agent_run_id, resume_from):
+                    yield frame
+                yield f"data: {json.dumps({'type': 'status', 'status': 'completed'})}\n\n"
+        except asyncio.CancelledError:
+            logger.debug(f"Redis Stream generator cancelled for {agent_run_id}")
+        except Exception as e:
+            logger.error(f"Error streaming agent run {agent_run_id} from Redis Stream: {e}", exc_info=True)
+            yield f"data: {json.dumps({'type': 'status', 'status': 'error', 'message': f'Stream failed: {e}'})}\n\n"
+
+    # The worker picks the transport when the run starts; runs without a stream are read from the list
+    if await has_response_stream(agent_run_id):
+        return StreamingResponse(redis_stream_generator(agent_run_data), media_type="text/event-stream", headers=stream_headers)
 
     async def stream_generator(agent_run_data):
-        logger.debug(f"Streaming responses for {agent_run_id} using Redis list {response_list_key} and channel {response_channel}")
-        last_processed_index = -1
-        # Single pubsub used for response + control
-        listener_task = None
-        terminate_stream = False
+        current_status = agent_run_data.get('status') if agent_run_data else None
         initial_yield_complete = False
 
         try:
-            # 1. Fetch and yield initial responses from Redis list
-            initial_responses_json = await redis.lrange(response_list_key, 0, -1)
-            initial_responses = []
-            if initial_responses_json:
-                initial_responses = [json.loads(r) for r in initial_responses_json]
-                logger.debug(f"Sending {len(initial_responses)} initial responses for {agent_run_id}")
-                for response in initial_responses:
-                    yield f"data: {json.dumps(response)}\n\n"
-                last_processed_index = len(initial_responses) - 1
-            initial_yield_complete = True
-
-            # 2. Check run status
-            current_status = agent_run_data.get('status') if agent_run_data else None
-
             if current_status != 'running':
-                logger.debug(f"Agent run {agent_run_id} is not running (status: {current_status}). Ending stream.")
+                # Finished runs are replayed straight from the list without subscribing
+                # Entries are already serialized JSON, so they are passed through without decoding
+                responses_json = await redis.lrange(response_list_key, 0, -1)
+                logger.debug(f"Agent run {agent_run_id} is not running (status: {current_status}). Sending {len(responses_json)} responses and ending stream.")
+                for response_json in responses_json:
+                    yield sse_frame(response_json)
+                initial_yield_complete = True
                 yield f"data: {json.dumps({'type': 'status', 'status': 'completed'})}\n\n"
                 return
-          
+
             structlog.contextvars.bind_contextvars(
                 thread_id=agent_run_data.get('thread_id'),
             )
 
-            # 3. Use a single Pub/Sub connection subscribed to both channels
-            pubsub = await redis.create_pubsub()
-            await pubsub.subscribe(response_channel, control_channel)
-            logger.debug(f"Subscribed to channels: {response_channel}, {control_channel}")
-
-            # Queue to communicate between listeners and the main generator loop
-            message_queue = asyncio.Queue()
-
-            async def listen_messages():
-                listener = pubsub.listen()
-                task = asyncio.create_task(listener.__anext__())
-
-                while not terminate_stream:
-                    done, _ = await asyncio.wait([task], return_when=asyncio.FIRST_COMPLETED)
-                    for finished in done:
-                        try:
-                            message = finished.result()
-                            if message and isinstance(message, dict) and message.get("type") == "message":
-                                channel = message.get("channel")
-                                data = message.get("data")
-                                if isinstance(data, bytes):
-                                    data = data.decode('utf-8')
-
-                                if channel == response_channel and data == "new":
-                                    await message_queue.put({"type": "new_response"})
-                                elif channel == control_channel and data in ["STOP", "END_STREAM", "ERROR"]:
-                                    logger.debug(f"Received control signal '{data}' for {agent_run_id}")
-                                    await message_queue.put({"type": "control", "data": data})
-                                    return  # Stop listening on control signal
-
-                        except StopAsyncIteration:
-                            logger.warning(f"Listener stopped for {agent_run_id}.")
-                            await message_queue.put({"type": "error", "data": "Listener stopped unexpectedly"})
-                            return
-                        except Exception as e:
-                            logger.error(f"Error in listener for {agent_run_id}: {e}")
-                            await message_queue.put({"type": "error", "data": "Listener failed"})
-                            return
-                        finally:
-                            # Resubscribe to the next message if continuing
-                            if not terminate_stream:
-                                task = asyncio.create_task(listener.__anext__())
-
-
-            listener_task = asyncio.create_task(listen_messages())
-
-            # 4. Main loop to process messages from the queue
-            while not terminate_stream:
-                try:
-                    queue_item = await message_queue.get()
-
-                    if queue_item["type"] == "new_response":
-                        # Fetch new responses from Redis list starting after the last processed index
-                        new_start_index = last_processed_index + 1
-                        new_responses_json = await redis.lrange(response_list_key, new_start_index, -1)
-
-                        if new_responses_json:
-                            new_responses = [json.loads(r) for r in new_responses_json]
-                            num_new = len(new_responses)
-                            # logger.debug(f"Received {num_new} new responses for {agent_run_id} (index {new_start_index} onwards)")
-                            for response in new_responses:
-                                yield f"data: {json.dumps(response)}\n\n"
-                                # Check if this response signals completion
-                                if response.get('type') == 'status' and response.get('status') in ['completed', 'failed', 'stopped']:
-                                    logger.debug(f"Detected run completion via status message in stream: {response.get('status')}")
-                                    terminate_stream = True
-                                    break # Stop processing further new responses
-                            last_processed_index += num_new
-                        if terminate_stream: break
-
-                    elif queue_item["type"] == "control":
-                        control_signal = queue_item["data"]
-                        terminate_stream = True # Stop the stream on any control signal
-                        yield f"data: {json.dumps({'type': 'status', 'status': control_signal})}\n\n"
-                        break
-
-                    elif queue_item["type"] == "error":
-                        logger.error(f"Listener error for {agent_run_id}: {queue_item['data']}")
-                        terminate_stream = True
-                        yield f"data: {json.dumps({'type': 'status', 'status': 'error'})}\n\n"
-                        break
-
-                except asyncio.CancelledError:
-                     logger.debug(f"Stream generator main loop cancelled for {agent_run_id}")
-                     terminate_stream = True
-                     break
-                except Exception as loop_err:
-                    logger.error(f"Error in stream generator main loop for {agent_run_id}: {loop_err}", exc_info=True)
-                    terminate_stream = True
-                    yield f"data: {json.dumps({'type': 'status', 'status': 'error', 'message': f'Stream failed: {loop_err}'})}\n\n"
-                    break
+            # Viewers of the same run in this process share one subscription via the hub
+            logger.debug(f"Streaming responses for {agent_run_id} using Redis list {response_list_key} and channel {response_channel}")
+            async for frame in response_hub.stream(agent_run_id):
+                initial_yield_complete = True
+                yield frame
 
+        except asyncio.CancelledError:
+            logger.debug(f"Stream generator cancelled for {agent_run_id}")
         except Exception as e:
-            logger.error(f"Error setting up stream for agent run {agent_run_id}: {e}", exc_info=True)
-            # Only yield error if initial yield didn't happen
-            if not initial_yield_complete:
-                 yield f"data: {json.dumps({'type': 'status', 'status': 'error', 'message': f'Failed to start stream: {e}'})}\n\n"
+            logger.error(f"Error streaming agent run {agent_run_id}: {e}", exc_info=True)
+            message = f'Stream failed: {e}' if initial_yield_complete else f'Failed to start stream: {e}'
+            yield f"data: {json.dumps({'type': 'status', 'status': 'error', 'message': message})}\n\n"
         finally:
-            terminate_stream = True
-            # Graceful shutdown order: unsubscribe → close → cancel
-            try:
-                if 'pubsub' in locals() and pubsub:
-                    await pubsub.unsubscribe(response_channel, control_channel)
-                    await pubsub.close()
-            except Exception as e:
-                logger.debug(f"Error during pubsub cleanup for {agent_run_id}: {e}")
-
-            if listener_task:
-                listener_task.cancel()
-                try:
-                    await listener_task  # Reap inner tasks & swallow their errors
-                except asyncio.CancelledError:
-                    pass
-                except Exception as e:
-                    logger.debug(f"listener_task ended with: {e}")
-            # Wait briefly for tasks to cancel
-            await asyncio.sleep(0.1)
             logger.debug(f"Streaming cleanup complete for agent run: {agent_run_id}")
 
-    return StreamingResponse(stream_generator(agent_run_data), media_type="text/event-stream", headers={
-        "Cache-Control": "no-cache, no-transform", "Connection": "keep-alive",
-        "X-Accel-Buffering": "no", "Content-Type": "text/event-stream",
-        "Access-Control-Allow-Origin": "*"
-    })
+    return StreamingResponse(stream_generator(agent_run_data), media_type="text/event-stream", headers=stream_headers)
 
 
 
@@ -641,7 +572,8 @@ async def initiate_agent_with_files(
     enable_prompt_caching: Optional[bool] = Form(False),
     agent_id: Optional[str] = Form(None),  # Add agent_id parameter
     files: List[UploadFile] = File(default=[]),
-    user_id: str = Depends(verify_and_get_user_id_from_jwt)
+    user_id: str = Depends(verify_and_get_user_id_from_jwt),
+    _read_scope = Depends(request_read_scope)
 ):
     """
     Initiate a new agent session with optional file attachments.
@@ -679,14 +611,14 @@ async def initiate_agent_with_files(
     if agent_id:
         logger.debug(f"[AGENT INITIATE] Querying for specific agent: {agent_id}")
         # Get agent
-        agent_result = await client.table('agents').select('*').eq('agent_id', agent_id).eq('account_id', account_id).execute()
-        logger.debug(f"[AGENT INITIATE] Query result: found {len(agent_result.data) if agent_result.data else 0} agents")
+        agent_data = await get_row(client, 'agents', agent_id, AGENT_CONFIG.select)
+        if agent_data and agent_data.get('account_id') != account_id:
+            agent_data = None
+        logger.debug(f"[AGENT INITIATE] Query result: found {1 if agent_data else 0} agents")
         
-        if not agent_result.data:
+        if not agent_data:
             raise HTTPException(status_code=404, detail="Agent not found or access denied")
         
-        agent_data = agent_result.data[0]
-        
         # Use versioning system to get current version
         version_data = None
         if agent_data.get('current_version_id'):
@@ -714,11 +646,12 @@ async def initiate_agent_with_files(
     else:
         logger.debug(f"[AGENT INITIATE] No agent_id provided, querying for default agent")
         # Try to get default agent for the account
-        default_agent_result = await client.table('agents').select('*').eq('account_id', account_id).eq('is_default', True).execute()
+        default_agent_result = await client.table('agents').select(AGENT_CONFIG.select).eq('account_id', account_id).eq('is_default', True).execute()
         logger.debug(f"[AGENT INITIATE] Default agent query result: found {len(default_agent_result.data) if default_agent_result.data else 0} default agents")
         
         if default_agent_result.data:
             agent_data = default_agent_result.data[0]
+            remember('agents', agent_data)
             
             # Use versioning system to get current version
             version_data = None
@@ -821,28 +754,36 @@ async def initiate_agent_with_files(
         if files:
             # 3. Create Sandbox (lazy): only create now if files were uploaded and need the
             try:
-                sandbox_pass = str(uuid.uuid4())
-                sandbox = await create_sandbox(sandbox_pass, project_id)
-                sandbox_id = sandbox.id
-                logger.info(f"Created new sandbox {sandbox_id} for project {project_id}")
-
-                # Get preview links
-                vnc_link = await sandbox.get_preview_link(6080)
-                website_link = await sandbox.get_preview_link(8080)
-                vnc_url = vnc_link.url if hasattr(vnc_link, 'url') else str(vnc_link).split("url='")[1].split("'")[0]
-                website_url = website_link.url if hasattr(website_link, 'url') else str(website_link).split("url='")[1].split("'")[0]
-                token = None
-                if hasattr(vnc_link, 'token'):
-                    token = vnc_link.token
-                elif "token='" in str(vnc_link):
-                    token = str(vnc_link).split("token='")[1].split("'")[0]
-
-                # Update project with sandbox info
-                update_result = await client.table('projects').update({
-                    'sandbox': {
+                # Claim a warm sandbox if the pool has one; create one otherwise
+                claimed = await sandbox_pool.claim(project_id) if sandbox_pool.enabled else None
+                if claimed is not None:
+                    sandbox, pooled = claimed
+                    sandbox_info = pooled.project_record()
+                    sandbox_id = sandbox.id
+                else:
+                    sandbox_pass = str(uuid.uuid4())
+                    sandbox = await create_sandbox(sandbox_pass, project_id)
+                    sandbox_id = sandbox.id
+                    logger.info(f"Created new sandbox {sandbox_id} for project {project_id}")
+
+                    # Get preview links
+                    vnc_link = await sandbox.get_preview_link(6080)
+                    website_link = await sandbox.get_preview_link(8080)
+                    vnc_url = vnc_link.url if hasattr(vnc_link, 'url') else str(vnc_link).split("url='")[1].split("'")[0]
+                    website_url = website_link.url if hasattr(website_link, 'url') else str(website_link).split("url='")[1].split("'")[0]
+                    token = None
+                    if hasattr(vnc_link, 'token'):
+                        token = vnc_link.token
+                    elif "token='" in str(vnc_link):
+                        token = str(vnc_link).split("token='")[1].split("'")[0]
+                    sandbox_info = {
                         'id': sandbox_id, 'pass': sandbox_pass, 'vnc_preview': vnc_url,
                         'sandbox_url': website_url, 'token': token
                     }
+
+                # Update project with sandbox info
+                update_result = await client.table('projects').update({
+                    'sandbox': sandbox_info
                 }).eq('project_id', project_id).execute()
 
                 if not update_result.data:
@@ -981,11 +922,15 @@ async def initiate_agent_with_files(
         )
 
         # Register run in Redis
-        instance_key = f"active_run:{utils.instance_id}:{agent_run_id}"
         try:
-            await redis.set(instance_key, "running", ex=redis.REDIS_KEY_TTL)
+            await active_runs.register(utils.instance_id, agent_run_id)
+        except Exception as e:
+            logger.warning(f"Failed to register agent run {agent_run_id} in Redis: {str(e)}")
+
+        try:
+            await running_runs.register(account_id, agent_run_id)
         except Exception as e:
-            logger.warning(f"Failed to register agent run in Redis ({instance_key}): {str(e)}")
+            logger.warning(f"Failed to count agent run {agent_run_id} against account {account_id}: {str(e)}")
 
         request_id = structlog.contextvars.get_contextvars().get('request_id')
 
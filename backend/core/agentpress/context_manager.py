@@ -6,14 +6,46 @@ reaching the context window limitations of LLM models.
 """
 
 import json
-from typing import List, Dict, Any, Optional, Union
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Set, Union
 
-from litellm.utils import token_counter
 from core.services.supabase import DBConnection
 from core.utils.logger import logger
 from core.ai_models import model_manager
+from core.agentpress.token_cache import token_cache
 
 DEFAULT_TOKEN_THRESHOLD = 120000
+DEFAULT_COMPRESSION_THRESHOLD = 1024
+DEFAULT_MAX_MESSAGES = 320
+DEFAULT_MIN_MESSAGES_TO_KEEP = 10
+
+
+@dataclass
+class CompressionPlan:
+    """Deterministic description of how a message list is reduced to fit a token budget.
+
+    Indices refer to positions in the (meta-stripped) message list the plan was built for.
+    """
+    budget: int
+    tokens_before: int
+    tokens_after: int
+    messages_before: int
+    messages_after: int = 0
+    truncate: Dict[int, str] = field(default_factory=dict)
+    compress: Dict[int, str] = field(default_factory=dict)
+    drop: Set[int] = field(default_factory=set)
+
+    @property
+    def is_noop(self) -> bool:
+        return not (self.truncate or self.compress or self.drop)
+
+    def summary(self) -> str:
+        return (
+            f"{self.tokens_before} -> {self.tokens_after} tokens (budget {self.budget}), "
+            f"{self.messages_before} -> {self.messages_after} messages "
+            f"(truncated {len(self.truncate)}, compressed {len(self.compress)}, dropped {len(self.drop)})"
+        )
+
 
 class ContextManager:
     """Manages thread context including token counting and summarization."""
@@ -88,79 +120,6 @@ class ContextManager:
             else:
                 return msg_content
   
-    def compress_tool_result_messages(self, messages: List[Dict[str, Any]], llm_model: str, max_tokens: Optional[int], token_threshold: int = 1000) -> List[Dict[str, Any]]:
-        """Compress the tool result messages except the most recent one."""
-        uncompressed_total_token_count = token_counter(model=llm_model, messages=messages)
-        max_tokens_value = max_tokens or (100 * 1000)
-
-        if uncompressed_total_token_count > max_tokens_value:
-            _i = 0  # Count the number of ToolResult messages
-            for msg in reversed(messages):  # Start from the end and work backwards
-                if not isinstance(msg, dict):
-                    continue  # Skip non-dict messages
-                if self.is_tool_result_message(msg):  # Only compress ToolResult messages
-                    _i += 1  # Count the number of ToolResult messages
-                    msg_token_count = token_counter(messages=[msg])  # Count the number of tokens in the message
-                    if msg_token_count > token_threshold:  # If the message is too long
-                        if _i > 1:  # If this is not the most recent ToolResult message
-                            message_id = msg.get('message_id')  # Get the message_id
-                            if message_id:
-                                msg["content"] = self.compress_message(msg["content"], message_id, token_threshold * 3)
-                            else:
-                                logger.warning(f"UNEXPECTED: Message has no message_id {str(msg)[:100]}")
-                        else:
-                            msg["content"] = self.safe_truncate(msg["content"], int(max_tokens_value * 2))
-        return messages
-
-    def compress_user_messages(self, messages: List[Dict[str, Any]], llm_model: str, max_tokens: Optional[int], token_threshold: int = 1000) -> List[Dict[str, Any]]:
-        """Compress the user messages except the most recent one."""
-        uncompressed_total_token_count = token_counter(model=llm_model, messages=messages)
-        max_tokens_value = max_tokens or (100 * 1000)
-
-        if uncompressed_total_token_count > max_tokens_value:
-            _i = 0  # Count the number of User messages
-            for msg in reversed(messages):  # Start from the end and work backwards
-                if not isinstance(msg, dict):
-                    continue  # Skip non-dict messages
-                if msg.get('role') == 'user':  # Only compress User messages
-                    _i += 1  # Count the number of User messages
-                    msg_token_count = token_counter(messages=[msg])  # Count the number of tokens in the message
-                    if msg_token_count > token_threshold:  # If the message is too long
-                        if _i > 1:  # If this is not the most recent User message
-                            message_id = msg.get('message_id')  # Get the message_id
-                            if message_id:
-                                msg["content"] = self.compress_message(msg["content"], message_id, token_threshold * 3)
-                            else:
-                                logger.warning(f"UNEXPECTED: Message has no message_id {str(msg)[:100]}")
-                        else:
-                            msg["content"] = self.safe_truncate(msg["content"], int(max_tokens_value * 2))
-        return messages
-
-    def compress_assistant_messages(self, messages: List[Dict[str, Any]], llm_model: str, max_tokens: Optional[int], token_threshold: int = 1000) -> List[Dict[str, Any]]:
-        """Compress the assistant messages except the most recent one."""
-        uncompressed_total_token_count = token_counter(model=llm_model, messages=messages)
-        max_tokens_value = max_tokens or (100 * 1000)
-        
-        if uncompressed_total_token_count > max_tokens_value:
-            _i = 0  # Count the number of Assistant messages
-            for msg in reversed(messages):  # Start from the end and work backwards
-                if not isinstance(msg, dict):
-                    continue  # Skip non-dict messages
-                if msg.get('role') == 'assistant':  # Only compress Assistant messages
-                    _i += 1  # Count the number of Assistant messages
-                    msg_token_count = token_counter(messages=[msg])  # Count the number of tokens in the message
-                    if msg_token_count > token_threshold:  # If the message is too long
-                        if _i > 1:  # If this is not the most recent Assistant message
-                            message_id = msg.get('message_id')  # Get the message_id
-                            if message_id:
-                                msg["content"] = self.compress_message(msg["content"], message_id, token_threshold * 3)
-                            else:
-                                logger.warning(f"UNEXPECTED: Message has no message_id {str(msg)[:100]}")
-                        else:
-                            msg["content"] = self.safe_truncate(msg["content"], int(max_tokens_value * 2))
-                            
-        return messages
-
     def remove_meta_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Remove meta messages from the messages."""
         result: List[Dict[str, Any]] = []
@@ -188,135 +147,169 @@ class ContextManager:
                 result.append(msg)
         return result
 
-    def compress_messages(self, messages: List[Dict[str, Any]], llm_model: str, max_tokens: Optional[int] = 41000, token_threshold: int = 4096, max_iterations: int = 5) -> List[Dict[str, Any]]:
-        """Compress the messages.
-        
-        Args:
-            messages: List of messages to compress
-            llm_model: Model name for token counting
-            max_tokens: Maximum allowed tokens
-            token_threshold: Token threshold for individual message compression (must be a power of 2)
-            max_iterations: Maximum number of compression iterations
-        """
-        # Get model-specific token limits from constants
+    def get_token_budget(self, llm_model: str) -> int:
+        """Input token budget for a model: its context window minus an output/safety reserve."""
         context_window = model_manager.get_context_window(llm_model)
         
         # Reserve tokens for output generation and safety margin
         if context_window >= 1_000_000:  # Very large context models (Gemini)
-            max_tokens = context_window - 300_000  # Large safety margin for huge contexts
+            return context_window - 300_000  # Large safety margin for huge contexts
         elif context_window >= 400_000:  # Large context models (GPT-5)
-            max_tokens = context_window - 64_000  # Reserve for output + margin
+            return context_window - 64_000  # Reserve for output + margin
         elif context_window >= 200_000:  # Medium context models (Claude Sonnet)
-            max_tokens = context_window - 32_000  # Reserve for output + margin
+            return context_window - 32_000  # Reserve for output + margin
         elif context_window >= 100_000:  # Standard large context models
-            max_tokens = context_window - 16_000  # Reserve for output + margin
+            return context_window - 16_000  # Reserve for output + margin
         else:  # Smaller context models
-            max_tokens = context_window - 8_000   # Reserve for output + margin
+            return context_window - 8_000   # Reserve for output + margin
+
+    def message_category(self, msg: Dict[str, Any]) -> Optional[str]:
+        """Compression category of a message: 'tool', 'user', 'assistant' or None."""
+        if not isinstance(msg, dict):
+            return None
+        if self.is_tool_result_message(msg):
+            return 'tool'
+        role = msg.get('role')
+        if role in ('user', 'assistant'):
+            return role
+        return None
+
+    def plan_compression(
+        self,
+        messages: List[Dict[str, Any]],
+        token_counts: List[int],
+        llm_model: str,
+        budget: int,
+        token_threshold: int = DEFAULT_COMPRESSION_THRESHOLD,
+        max_messages: int = DEFAULT_MAX_MESSAGES,
+        min_messages_to_keep: int = DEFAULT_MIN_MESSAGES_TO_KEEP
+    ) -> CompressionPlan:
+        """Decide in one pass which messages to truncate, compress or drop to fit the budget.
         
-        # logger.debug(f"Model {llm_model}: context_window={context_window}, effective_limit={max_tokens}")
+        Args:
+            messages: Messages to plan for (after meta removal)
+            token_counts: Precomputed token count for each message
+            llm_model: Model name for token counting of replacement contents
+            budget: Maximum allowed tokens for the messages
+            token_threshold: Messages above this many tokens may be compressed to an expand-message stub
+            max_messages: Maximum number of messages to keep
+            min_messages_to_keep: Number of most recent messages that are never dropped
+        """
+        total = sum(token_counts)
+        plan = CompressionPlan(budget=budget, tokens_before=total, tokens_after=total, messages_before=len(messages))
+        if total <= budget and len(messages) <= max_messages:
+            plan.messages_after = len(messages)
+            return plan
 
-        result = messages
-        result = self.remove_meta_messages(result)
+        counts = list(token_counts)
 
-        uncompressed_total_token_count = token_counter(model=llm_model, messages=result)
+        # The most recent message of each category is never stubbed, only truncated if oversized
+        latest: Dict[str, int] = {}
+        for i, msg in enumerate(messages):
+            category = self.message_category(msg)
+            if category:
+                latest[category] = i
+        protected = set(latest.values())
 
-        result = self.compress_tool_result_messages(result, llm_model, max_tokens, token_threshold)
-        result = self.compress_user_messages(result, llm_model, max_tokens, token_threshold)
-        result = self.compress_assistant_messages(result, llm_model, max_tokens, token_threshold)
+        if total > budget:
+            truncate_length = min(int(budget * 2), 100000)
+            for i in sorted(protected):
+                content = messages[i].get('content')
+                if counts[i] > token_threshold and isinstance(content, str) and len(content) > truncate_length:
+                    new_content = self.safe_truncate(content, truncate_length)
+                    new_count = token_cache.count_message({**messages[i], 'content': new_content}, llm_model)
+                    total -= counts[i] - new_count
+                    counts[i] = new_count
+                    plan.truncate[i] = new_content
 
-        compressed_token_count = token_counter(model=llm_model, messages=result)
+        # Stub the largest compressible messages first until the budget is met
+        candidates = [
+            i for i, msg in enumerate(messages)
+            if i not in protected
+            and counts[i] > token_threshold
+            and isinstance(msg.get('content'), str)
+            and msg.get('message_id')
+            and self.message_category(msg)
+        ]
+        candidates.sort(key=lambda i: (-counts[i], i))
+        for i in candidates:
+            if total <= budget:
+                break
+            msg = messages[i]
+            new_content = self.compress_message(msg['content'], msg['message_id'], token_threshold * 3)
+            if new_content == msg['content']:
+                continue
+            new_count = token_cache.count_message({**msg, 'content': new_content}, llm_model)
+            if new_count >= counts[i]:
+                continue
+            total -= counts[i] - new_count
+            counts[i] = new_count
+            plan.compress[i] = new_content
 
-        logger.info(f"Context compression: {uncompressed_total_token_count} -> {compressed_token_count} tokens")
+        # Drop messages from the middle outwards, never touching the most recent ones
+        kept = len(messages)
+        if total > budget or kept > max_messages:
+            droppable = max(0, len(messages) - min_messages_to_keep)
+            middle = len(messages) / 2
+            drop_order = sorted(range(droppable), key=lambda i: (abs(i + 0.5 - middle), i))
+            for i in drop_order:
+                if total <= budget and kept <= max_messages:
+                    break
+                total -= counts[i]
+                kept -= 1
+                plan.drop.add(i)
+                plan.truncate.pop(i, None)
+                plan.compress.pop(i, None)
+            if total > budget:
+                logger.warning(f"Cannot compress further: {total} > {budget} tokens with {kept} messages remaining (min: {min_messages_to_keep})")
 
-        if max_iterations <= 0:
-            logger.warning(f"compress_messages: Max iterations reached, omitting messages")
-            result = self.compress_messages_by_omitting_messages(messages, llm_model, max_tokens)
-            return result
+        plan.tokens_after = total
+        plan.messages_after = kept
+        return plan
 
-        if compressed_token_count > max_tokens:
-            logger.warning(f"Further token compression is needed: {compressed_token_count} > {max_tokens}")
-            result = self.compress_messages(messages, llm_model, max_tokens, token_threshold // 2, max_iterations - 1)
+    def apply_plan(self, messages: List[Dict[str, Any]], plan: CompressionPlan) -> List[Dict[str, Any]]:
+        """Build the compressed message list described by a plan."""
+        result = []
+        for i, msg in enumerate(messages):
+            if i in plan.drop:
+                continue
+            if i in plan.truncate:
+                msg = {**msg, 'content': plan.truncate[i]}
+            elif i in plan.compress:
+                msg = {**msg, 'content': plan.compress[i]}
+            result.append(msg)
+        return result
 
-        return self.middle_out_messages(result)
-    
-    def compress_messages_by_omitting_messages(
-            self, 
-            messages: List[Dict[str, Any]], 
-            llm_model: str, 
-            max_tokens: Optional[int] = 41000,
-            removal_batch_size: int = 10,
-            min_messages_to_keep: int = 10
-        ) -> List[Dict[str, Any]]:
-        """Compress the messages by omitting messages from the middle.
+    def compress_messages(
+        self,
+        messages: List[Dict[str, Any]],
+        llm_model: str,
+        token_threshold: int = DEFAULT_COMPRESSION_THRESHOLD,
+        max_messages: int = DEFAULT_MAX_MESSAGES,
+        min_messages_to_keep: int = DEFAULT_MIN_MESSAGES_TO_KEEP
+    ) -> List[Dict[str, Any]]:
+        """Compress the messages to fit the model's context window.
         
         Args:
             messages: List of messages to compress
-            llm_model: Model name for token counting
-            max_tokens: Maximum allowed tokens
-            removal_batch_size: Number of messages to remove per iteration
-            min_messages_to_keep: Minimum number of messages to preserve
+            llm_model: Model name for token counting and context window lookup
+            token_threshold: Messages above this many tokens may be compressed to an expand-message stub
+            max_messages: Maximum number of messages to keep
+            min_messages_to_keep: Number of most recent messages that are never dropped
         """
-        if not messages:
-            return messages
-            
-        result = messages
-        result = self.remove_meta_messages(result)
+        budget = self.get_token_budget(llm_model)
 
-        # Early exit if no compression needed
-        initial_token_count = token_counter(model=llm_model, messages=result)
-        max_allowed_tokens = max_tokens or (100 * 1000)
-        
-        if initial_token_count <= max_allowed_tokens:
-            return result
+        result = self.remove_meta_messages(messages)
+        token_counts = [token_cache.count_message(msg, llm_model) for msg in result]
 
-        # Separate system message (assumed to be first) from conversation messages
-        system_message = messages[0] if messages and isinstance(messages[0], dict) and messages[0].get('role') == 'system' else None
-        conversation_messages = result[1:] if system_message else result
-        
-        safety_limit = 500
-        current_token_count = initial_token_count
-        
-        while current_token_count > max_allowed_tokens and safety_limit > 0:
-            safety_limit -= 1
-            
-            if len(conversation_messages) <= min_messages_to_keep:
-                logger.warning(f"Cannot compress further: only {len(conversation_messages)} messages remain (min: {min_messages_to_keep})")
-                break
-
-            # Calculate removal strategy based on current message count
-            if len(conversation_messages) > (removal_batch_size * 2):
-                # Remove from middle, keeping recent and early context
-                middle_start = len(conversation_messages) // 2 - (removal_batch_size // 2)
-                middle_end = middle_start + removal_batch_size
-                conversation_messages = conversation_messages[:middle_start] + conversation_messages[middle_end:]
-            else:
-                # Remove from earlier messages, preserving recent context
-                messages_to_remove = min(removal_batch_size, len(conversation_messages) // 2)
-                if messages_to_remove > 0:
-                    conversation_messages = conversation_messages[messages_to_remove:]
-                else:
-                    # Can't remove any more messages
-                    break
-
-            # Recalculate token count
-            messages_to_count = ([system_message] + conversation_messages) if system_message else conversation_messages
-            current_token_count = token_counter(model=llm_model, messages=messages_to_count)
+        plan = self.plan_compression(
+            result, token_counts, llm_model, budget,
+            token_threshold=token_threshold,
+            max_messages=max_messages,
+            min_messages_to_keep=min_messages_to_keep
+        )
+        if plan.is_noop:
+            return result
 
-        # Prepare final result
-        final_messages = ([system_message] + conversation_messages) if system_message else conversation_messages
-        final_token_count = token_counter(model=llm_model, messages=final_messages)
-        
-        logger.info(f"Context compression (omit): {initial_token_count} -> {final_token_count} tokens ({len(messages)} -> {len(final_messages)} messages)")
-            
-        return final_messages
-    
-    def middle_out_messages(self, messages: List[Dict[str, Any]], max_messages: int = 320) -> List[Dict[str, Any]]:
-        """Remove messages from the middle of the list, keeping max_messages total."""
-        if len(messages) <= max_messages:
-            return messages
-        
-        # Keep half from the beginning and half from the end
-        keep_start = max_messages // 2
-        keep_end = max_messages - keep_start
-        
-        return messages[:keep_start] + messages[-keep_end:] 
\ No newline at end of file
+        logger.info(f"Context compression: {plan.summary()}")
+        return self.apply_plan(result, plan)
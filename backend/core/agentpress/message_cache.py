@@ -0,0 +1,244 @@
+"""
+In-process message cache for AgentPress threads.
+
+Keeps the parsed LLM messages of recently used threads in memory so that
+repeated calls to ``ThreadManager.get_llm_messages`` (one per auto-continue
+iteration) only fetch rows created since the previous call instead of paging
+through the whole ``messages`` table and re-parsing every ``content`` column.
+
+Only rows created after the cursor are fetched, so a delete in another process
+(e.g. the API's delete-message endpoint) would otherwise stay cached until
+the entry expires. Deleters call ``mark_changed`` to bump a per-thread version
+in Redis; ``get_llm_messages`` reads it with ``get_version`` on every call and
+the cache drops an entry loaded at a different version.
+"""
+
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+from core.services import redis
+from core.utils.logger import logger
+
+DEFAULT_MAX_THREADS = 256
+DEFAULT_ENTRY_TTL = 300  # Full reload after 5 minutes to pick up edits from other processes
+VERSION_KEY_TTL = 3600 * 24
+
+
+def _version_key(thread_id: str) -> str:
+    return f"thread:{thread_id}:messages_version"
+
+
+async def mark_changed(thread_id: str) -> None:
+    """Make every process reload the thread's messages after rows were deleted or rewritten."""
+    message_cache.invalidate(thread_id)
+    try:
+        redis_client = await redis.get_client()
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.incr(_version_key(thread_id))
+            pipe.expire(_version_key(thread_id), VERSION_KEY_TTL)
+            await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to bump message version of thread {thread_id}: {e}")
+
+
+async def get_version(thread_id: str) -> Optional[str]:
+    """The thread's current message version, or None if Redis could not be read."""
+    try:
+        redis_client = await redis.get_client()
+        return await redis_client.get(_version_key(thread_id)) or "0"
+    except Exception as e:
+        logger.warning(f"Failed to read message version of thread {thread_id}: {e}")
+        return None
+
+
+def parse_message_row(row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Parse a ``messages`` row into the LLM message dict used by ThreadManager."""
+    content = row['content']
+    if isinstance(content, str):
+        try:
+            parsed = json.loads(content)
+        except json.JSONDecodeError:
+            logger.error(f"Failed to parse message: {content}")
+            return None
+    elif isinstance(content, dict):
+        parsed = dict(content)
+    else:
+        parsed = content
+    if not isinstance(parsed, dict):
+        logger.error(f"Unexpected message content type for {row.get('message_id')}: {type(parsed)}")
+        return None
+    parsed['message_id'] = row['message_id']
+    return parsed
+
+
+def copy_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy a cached message deeply enough that callers can mutate it.
+
+    Context compression rewrites ``content`` and prompt caching rewrites the
+    blocks of list content in place, so both levels are copied.
+    """
+    copied = dict(message)
+    content = copied.get('content')
+    if isinstance(content, list):
+        copied['content'] = [dict(block) if isinstance(block, dict) else block for block in content]
+    return copied
+
+
+def _estimate_size(row: Dict[str, Any]) -> int:
+    content = row.get('content')
+    if isinstance(content, str):
+        return len(content)
+    try:
+        return len(json.dumps(content))
+    except (TypeError, ValueError):
+        return 0
+
+
+@dataclass
+class _ThreadEntry:
+    messages: List[Dict[str, Any]] = field(default_factory=list)
+    created_at: List[str] = field(default_factory=list)
+    message_ids: Set[str] = field(default_factory=set)
+    cursor: Optional[str] = None
+    version: Optional[str] = None
+    size_bytes: int = 0
+    loaded_at: float = field(default_factory=time.monotonic)
+
+
+class ThreadMessageCache:
+    """LRU-bounded cache of parsed LLM messages keyed by thread_id."""
+
+    def __init__(self, max_threads: int = DEFAULT_MAX_THREADS, ttl: float = DEFAULT_ENTRY_TTL):
+        self.max_threads = max_threads
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, _ThreadEntry]" = OrderedDict()
+        self._bytes_held = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._rows_fetched = 0
+        self._version_reloads = 0
+
+    def get_cursor(self, thread_id: str, version: Optional[str] = None) -> Optional[str]:
+        """Return the ``created_at`` to resume fetching from, or None if the thread must be fully loaded.
+
+        An entry loaded at another ``version`` (or when the version was unknown)
+        is dropped.
+        """
+        entry = self._entries.get(thread_id)
+        if entry is None:
+            self._misses += 1
+            return None
+        if version is None or entry.version != version:
+            self._drop(thread_id)
+            self._misses += 1
+            self._version_reloads += 1
+            return None
+        if time.monotonic() - entry.loaded_at > self.ttl:
+            self._drop(thread_id)
+            self._misses += 1
+            return None
+        self._entries.move_to_end(thread_id)
+        self._hits += 1
+        return entry.cursor
+
+    def merge_rows(self, thread_id: str, rows: List[Dict[str, Any]], reset: bool = False, version: Optional[str] = None) -> None:
+        """Merge freshly fetched rows (ordered by created_at) and advance the fetch cursor."""
+        if reset:
+            self._drop(thread_id)
+        entry = self._entries.get(thread_id)
+        if entry is None:
+            entry = _ThreadEntry(version=version)
+            self._entries[thread_id] = entry
+        self._entries.move_to_end(thread_id)
+
+        self._rows_fetched += len(rows)
+        for row in rows:
+            if row.get('created_at') and (entry.cursor is None or row['created_at'] > entry.cursor):
+                entry.cursor = row['created_at']
+            self._append(entry, row)
+        self._evict()
+
+    def add_row(self, thread_id: str, row: Dict[str, Any]) -> None:
+        """Extend a cached thread with a row just written by this process.
+
+        The fetch cursor is deliberately not advanced, so rows written by other
+        processes in the meantime are still picked up by the next fetch.
+        """
+        entry = self._entries.get(thread_id)
+        if entry is None:
+            return
+        self._append(entry, row)
+        self._evict()
+
+    def get_messages(self, thread_id: str) -> List[Dict[str, Any]]:
+        """Return copies of the cached messages for a thread in created_at order."""
+        entry = self._entries.get(thread_id)
+        if entry is None:
+            return []
+        return [copy_message(message) for message in entry.messages]
+
+    def invalidate(self, thread_id: str) -> None:
+        """Drop a thread so the next read reloads it from the database."""
+        self._drop(thread_id)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes_held = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self._hits + self._misses
+        return {
+            'threads': len(self._entries),
+            'max_threads': self.max_threads,
+            'bytes_held': self._bytes_held,
+            'hits': self._hits,
+            'misses': self._misses,
+            'hit_rate': (self._hits / total) if total else 0.0,
+            'evictions': self._evictions,
+            'rows_fetched': self._rows_fetched,
+            'version_reloads': self._version_reloads,
+        }
+
+    def _append(self, entry: _ThreadEntry, row: Dict[str, Any]) -> None:
+        message_id = row.get('message_id')
+        if not message_id or message_id in entry.message_ids:
+            return
+        size = _estimate_size(row)
+        message = parse_message_row(row)
+        if message is None:
+            return
+
+        created_at = row.get('created_at') or ''
+        entry.message_ids.add(message_id)
+        entry.size_bytes += size
+        self._bytes_held += size
+
+        # Rows usually arrive in order; fall back to an ordered insert otherwise
+        if not entry.created_at or created_at >= entry.created_at[-1]:
+            entry.messages.append(message)
+            entry.created_at.append(created_at)
+        else:
+            index = len(entry.created_at)
+            while index > 0 and entry.created_at[index - 1] > created_at:
+                index -= 1
+            entry.messages.insert(index, message)
+            entry.created_at.insert(index, created_at)
+
+    def _drop(self, thread_id: str) -> None:
+        entry = self._entries.pop(thread_id, None)
+        if entry is not None:
+            self._bytes_held -= entry.size_bytes
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.max_threads:
+            thread_id, entry = self._entries.popitem(last=False)
+            self._bytes_held -= entry.size_bytes
+            self._evictions += 1
+            logger.debug(f"Evicted thread {thread_id} from message cache")
+
+
+message_cache = ThreadMessageCache()
@@ -36,6 +36,7 @@ Based on Anthropic documentation and mathematical optimization (Sept 2025).
 
 from typing import Dict, Any, List, Optional
 from core.utils.logger import logger
+from core.agentpress.token_cache import token_cache
 
 
 def get_resolved_model_id(model_name: str) -> str:
@@ -80,7 +81,10 @@ def estimate_token_count(text: str, model: str = "claude-3-5-sonnet-20240620") -
         return int(word_count * 1.3)
 
 def get_message_token_count(message: Dict[str, Any], model: str = "claude-3-5-sonnet-20240620") -> int:
-    """Get estimated token count for a message."""
+    """Get estimated token count for a message, memoized per message content."""
+    return token_cache.get_or_count('text', model, message, lambda: _count_message_tokens(message, model))
+
+def _count_message_tokens(message: Dict[str, Any], model: str) -> int:
     content = message.get('content', '')
     if isinstance(content, list):
         total_tokens = 0
@@ -18,7 +18,7 @@ from dataclasses import dataclass
 from core.utils.logger import logger
 from core.agentpress.tool import ToolResult
 from core.agentpress.tool_registry import ToolRegistry
-from core.agentpress.xml_tool_parser import XMLToolParser
+from core.agentpress.xml_tool_parser import XMLToolParser, StreamingXMLScanner
 from core.agentpress.error_processor import ErrorProcessor
 from langfuse.client import StatefulTraceClient
 from core.services.langfuse import langfuse
@@ -223,7 +223,7 @@ class ResponseProcessor:
         continuous_state = continuous_state or {}
         accumulated_content = continuous_state.get('accumulated_content', "")
         tool_calls_buffer = {}
-        current_xml_content = accumulated_content   # equal to accumulated_content if auto-continuing, else blank
+        xml_scanner = StreamingXMLScanner(accumulated_content)   # resumes from accumulated_content if auto-continuing
         xml_chunks_buffer = []
         pending_tool_executions = []
         yielded_tool_indices = set() # Stores indices of tools whose *status* has been yielded
@@ -368,8 +368,6 @@ class ResponseProcessor:
                         # print(chunk_content, end='', flush=True)
                         # logger.debug(f"About to concatenate chunk_content (type={type(chunk_content)}) to accumulated_content (type={type(accumulated_content)})")
                         accumulated_content += chunk_content
-                        # logger.debug(f"About to concatenate chunk_content (type={type(chunk_content)}) to current_xml_content (type={type(current_xml_content)})")
-                        current_xml_content += chunk_content
 
                         if not (config.max_xml_tool_calls > 0 and xml_tool_call_count >= config.max_xml_tool_calls):
                             # Yield ONLY content chunk (don't save)
@@ -389,9 +387,8 @@ class ResponseProcessor:
 
                         # --- Process XML Tool Calls (if enabled and limit not reached) ---
                         if config.xml_tool_calling and not (config.max_xml_tool_calls > 0 and xml_tool_call_count >= config.max_xml_tool_calls):
-                            xml_chunks = self._extract_xml_chunks(current_xml_content)
+                            xml_chunks = xml_scanner.feed(chunk_content)
                             for xml_chunk in xml_chunks:
-                                current_xml_content = current_xml_content.replace(xml_chunk, "", 1)
                                 xml_chunks_buffer.append(xml_chunk)
                                 result = self._parse_xml_tool_call(xml_chunk)
                                 if result:
@@ -677,9 +674,7 @@ class ResponseProcessor:
                  # Gather XML tool calls from buffer (up to limit)
                 parsed_xml_data = []
                 if config.xml_tool_calling:
-                    # Reparse remaining content just in case (should be empty if processed correctly)
-                    xml_chunks = self._extract_xml_chunks(current_xml_content)
-                    xml_chunks_buffer.extend(xml_chunks)
+                    # Complete blocks were already collected by the streaming scanner
                     # Process only chunks not already handled in the stream loop
                     remaining_limit = config.max_xml_tool_calls - xml_tool_call_count if config.max_xml_tool_calls > 0 else len(xml_chunks_buffer)
                     xml_chunks_to_process = xml_chunks_buffer[:remaining_limit] # Ensure limit is respected
@@ -1245,8 +1240,7 @@ class ResponseProcessor:
                     
                     # Find the earliest occurrence of any registered tool function name
                     # Check for available function names
-                    available_functions = self.tool_registry.get_available_functions()
-                    for func_name in available_functions.keys():
+                    for func_name in self.tool_registry.get_function_names():
                         # Convert function name to potential tag name (underscore to dash)
                         tag_name = func_name.replace('_', '-')
                         start_pattern = f'<{tag_name}'
@@ -1389,16 +1383,15 @@ class ResponseProcessor:
 
             # Get available functions from tool registry
             logger.debug(f"🔍 Looking up tool function: {function_name}")
-            available_functions = self.tool_registry.get_available_functions()
-            # logger.debug(f"📋 Available functions: {list(available_functions.keys())}")
+            # logger.debug(f"📋 Available functions: {self.tool_registry.get_function_names()}")
 
-            # Look up the function by name
-            tool_fn = available_functions.get(function_name)
+            # Look up the function by name; the tool is instantiated on first use
+            tool_fn = self.tool_registry.get_function(function_name)
             if not tool_fn:
                 logger.error(f"❌ Tool function '{function_name}' not found in registry")
-                # logger.error(f"❌ Available functions: {list(available_functions.keys())}")
+                # logger.error(f"❌ Available functions: {self.tool_registry.get_function_names()}")
                 span.end(status_message="tool_not_found", level="ERROR")
-                return ToolResult(success=False, output=f"Tool function '{function_name}' not found. Available: {list(available_functions.keys())}")
+                return ToolResult(success=False, output=f"Tool function '{function_name}' not found. Available: {self.tool_registry.get_function_names()}")
 
             logger.debug(f"✅ Found tool function for '{function_name}'")
             # logger.debug(f"🔧 Tool function type: {type(tool_fn)}")
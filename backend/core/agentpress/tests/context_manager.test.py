@@ -0,0 +1,142 @@
+"""Tests for the single-pass context compression planner."""
+
+import json
+
+import pytest
+
+from core.agentpress.context_manager import ContextManager
+from core.agentpress.token_cache import token_cache
+
+MODEL = "test-model"
+THRESHOLD = 256
+
+
+def fake_count(message, model=None):
+    content = message.get('content')
+    if not isinstance(content, str):
+        content = json.dumps(content)
+    return len(content) // 4 + 4
+
+
+def synthetic_thread(turns: int = 60):
+    """A user/assistant/tool conversation with a mix of small and oversized messages."""
+    messages = []
+    for turn in range(turns):
+        user_size = 4000 if turn % 7 == 3 else 120
+        assistant_size = 6000 if turn % 5 == 1 else 300
+        tool_size = 9000 + 500 * (turn % 4) if turn % 3 == 0 else 200
+        messages.append({'role': 'user', 'content': f"u{turn} " + "q" * user_size, 'message_id': f"user-{turn}"})
+        messages.append({'role': 'assistant', 'content': f"a{turn} " + "r" * assistant_size, 'message_id': f"assistant-{turn}"})
+        messages.append({'role': 'tool', 'content': f"ToolResult(t{turn}) " + "x" * tool_size, 'message_id': f"tool-{turn}"})
+    # Keep the latest message of every category small, so none of them is truncated
+    messages.append({'role': 'user', 'content': "latest question", 'message_id': "user-last"})
+    messages.append({'role': 'tool', 'content': "ToolResult(last) ok", 'message_id': "tool-last"})
+    messages.append({'role': 'assistant', 'content': "latest answer", 'message_id': "assistant-last"})
+    return messages
+
+
+def legacy_first_pass(manager: ContextManager, messages, max_tokens: int, token_threshold: int):
+    """What the recursive compressor produced when its first pass met the budget.
+
+    Per category (tool results, then user, then assistant), every message but
+    the most recent one above ``token_threshold`` was replaced by an
+    expand-message stub, as long as the thread was still over ``max_tokens``.
+    """
+    result = [dict(msg) for msg in manager.remove_meta_messages(messages)]
+    categories = (
+        manager.is_tool_result_message,
+        lambda msg: msg.get('role') == 'user',
+        lambda msg: msg.get('role') == 'assistant',
+    )
+    for in_category in categories:
+        if sum(fake_count(msg) for msg in result) <= max_tokens:
+            continue
+        seen = 0
+        for msg in reversed(result):
+            if not in_category(msg):
+                continue
+            seen += 1
+            if fake_count(msg) > token_threshold:
+                if seen > 1:
+                    msg['content'] = manager.compress_message(msg['content'], msg['message_id'], token_threshold * 3)
+                else:
+                    msg['content'] = manager.safe_truncate(msg['content'], int(max_tokens * 2))
+    return result
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(token_cache, 'count_message', fake_count)
+    return ContextManager()
+
+
+def compress(manager, messages, budget, **kwargs):
+    counts = [fake_count(msg) for msg in messages]
+    plan = manager.plan_compression(messages, counts, MODEL, budget, token_threshold=THRESHOLD, **kwargs)
+    return plan, manager.apply_plan(messages, plan)
+
+
+class TestPlanCompression:
+    """Budget, ordering and compatibility of the compression planner."""
+
+    @pytest.mark.unit
+    def test_under_budget_is_noop(self, manager):
+        messages = synthetic_thread(5)
+        plan, result = compress(manager, messages, budget=10**9)
+        assert plan.is_noop
+        assert result == messages
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("budget", [150_000, 60_000, 20_000, 5_000, 1_000])
+    def test_result_fits_budget(self, manager, budget):
+        messages = synthetic_thread()
+        plan, result = compress(manager, messages, budget)
+        total = sum(fake_count(msg) for msg in result)
+        assert total == plan.tokens_after
+        assert total <= budget
+        assert plan.messages_after == len(result)
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("budget", [60_000, 5_000])
+    def test_preserves_order_and_recent_messages(self, manager, budget):
+        messages = synthetic_thread()
+        _, result = compress(manager, messages, budget, min_messages_to_keep=10)
+        ids = [msg['message_id'] for msg in messages]
+        kept = [msg['message_id'] for msg in result]
+        assert kept == sorted(kept, key=ids.index)
+        assert kept[-10:] == ids[-10:]
+        assert [msg['content'] for msg in result[-3:]] == [msg['content'] for msg in messages[-3:]]
+
+    @pytest.mark.unit
+    def test_caps_message_count(self, manager):
+        messages = synthetic_thread(150)
+        plan, result = compress(manager, messages, budget=10**9, max_messages=100)
+        assert len(result) == 100
+        assert result[-1]['message_id'] == "assistant-last"
+
+    @pytest.mark.unit
+    def test_does_not_mutate_input(self, manager):
+        messages = synthetic_thread()
+        snapshot = [dict(msg) for msg in messages]
+        compress(manager, messages, budget=5_000)
+        assert messages == snapshot
+
+    @pytest.mark.unit
+    def test_matches_recursive_compressor(self, manager):
+        messages = synthetic_thread()
+        # The budget the old first pass lands on exactly: every stub is needed to meet it
+        fully_stubbed = legacy_first_pass(manager, messages, max_tokens=0, token_threshold=THRESHOLD)
+        budget = sum(fake_count(msg) for msg in fully_stubbed)
+        expected = legacy_first_pass(manager, messages, max_tokens=budget, token_threshold=THRESHOLD)
+        assert expected == fully_stubbed
+
+        plan, result = compress(manager, manager.remove_meta_messages(messages), budget)
+        assert not plan.drop
+        assert result == expected
+
+    @pytest.mark.unit
+    def test_compress_messages_uses_model_budget(self, manager, monkeypatch):
+        monkeypatch.setattr(ContextManager, 'get_token_budget', lambda self, model: 20_000)
+        result = manager.compress_messages(synthetic_thread(), MODEL, token_threshold=THRESHOLD)
+        assert sum(fake_count(msg) for msg in result) <= 20_000
+        assert result[-1]['message_id'] == "assistant-last"
@@ -9,6 +9,7 @@ from core.agentpress.prompt_caching import apply_anthropic_caching_strategy, val
 from core.agentpress.tool import Tool
 from core.agentpress.tool_registry import ToolRegistry
 from core.agentpress.context_manager import ContextManager
+from core.agentpress.message_cache import message_cache, get_version as get_messages_version
 from core.agentpress.response_processor import ResponseProcessor, ProcessorConfig
 from core.agentpress.error_processor import ErrorProcessor
 from core.services.supabase import DBConnection
@@ -17,6 +18,8 @@ from langfuse.client import StatefulGenerationClient, StatefulTraceClient
 from core.services.langfuse import langfuse
 from datetime import datetime, timezone
 from core.billing.billing_integration import billing_integration
+from core.billing.usage_metering import usage_meter, UsageRecord
+from core.utils.config import config
 
 ToolChoice = Literal["auto", "required", "none"]
 
@@ -84,7 +87,7 @@ class ThreadManager:
     ):
         """Add a message to the thread in the database."""
         # logger.debug(f"Adding message of type '{type}' to thread {thread_id}")
-        client = await self.db.client
+        client = await self.db.client_for('messages')
 
         data_to_insert = {
             'thread_id': thread_id,
@@ -105,6 +108,9 @@ class ThreadManager:
 
             if result.data and len(result.data) > 0 and 'message_id' in result.data[0]:
                 saved_message = result.data[0]
+
+                if is_llm_message:
+                    message_cache.add_row(thread_id, saved_message)
                 
                 # Handle billing for assistant response end messages
                 if type == "assistant_response_end" and isinstance(content, dict):
@@ -141,20 +147,35 @@ class ThreadManager:
             # DEBUG: Log what we detected
             logger.info(f"🔍 CACHE DETECTION: cache_read={cache_read_tokens}, cache_creation={cache_creation_tokens}, prompt={prompt_tokens}")
             
+            if prompt_tokens <= 0 and completion_tokens <= 0:
+                return
+
+            if cache_read_tokens > 0:
+                cache_hit_percentage = (cache_read_tokens / prompt_tokens * 100) if prompt_tokens > 0 else 0
+                logger.info(f"🎯 CACHE HIT: {cache_read_tokens}/{prompt_tokens} tokens ({cache_hit_percentage:.1f}%)")
+            elif cache_creation_tokens > 0:
+                logger.info(f"💾 CACHE WRITE: {cache_creation_tokens} tokens stored for future use")
+            else:
+                logger.debug(f"❌ NO CACHE: All {prompt_tokens} tokens processed fresh")
+
+            if config.BILLING_WRITE_BEHIND:
+                # Settled in batches by the usage meter; the account is resolved there
+                await usage_meter.record(UsageRecord(
+                    message_id=saved_message['message_id'],
+                    thread_id=thread_id,
+                    model=model or "unknown",
+                    prompt_tokens=prompt_tokens,
+                    completion_tokens=completion_tokens,
+                    cache_read_tokens=cache_read_tokens,
+                    cache_creation_tokens=cache_creation_tokens
+                ))
+                return
+
             client = await self.db.client
             thread_row = await client.table('threads').select('account_id').eq('thread_id', thread_id).limit(1).execute()
             user_id = thread_row.data[0]['account_id'] if thread_row.data and len(thread_row.data) > 0 else None
             
-            if user_id and (prompt_tokens > 0 or completion_tokens > 0):
-
-                if cache_read_tokens > 0:
-                    cache_hit_percentage = (cache_read_tokens / prompt_tokens * 100) if prompt_tokens > 0 else 0
-                    logger.info(f"🎯 CACHE HIT: {cache_read_tokens}/{prompt_tokens} tokens ({cache_hit_percentage:.1f}%)")
-                elif cache_creation_tokens > 0:
-                    logger.info(f"💾 CACHE WRITE: {cache_creation_tokens} tokens stored for future use")
-                else:
-                    logger.debug(f"❌ NO CACHE: All {prompt_tokens} tokens processed fresh")
-
+            if user_id:
                 deduct_result = await billing_integration.deduct_usage(
                     account_id=user_id,
                     prompt_tokens=prompt_tokens,
@@ -173,47 +194,41 @@ class ThreadManager:
             logger.error(f"Error handling billing: {str(e)}", exc_info=True)
 
     async def get_llm_messages(self, thread_id: str) -> List[Dict[str, Any]]:
-        """Get all messages for a thread."""
+        """Get all messages for a thread.
+
+        Messages are served from the in-process message cache; only rows created
+        since the previous call are fetched from the database.
+        """
         logger.debug(f"Getting messages for thread {thread_id}")
-        client = await self.db.client
+        client = await self.db.client_for('messages')
 
         try:
-            all_messages = []
+            version = await get_messages_version(thread_id)
+            cursor = message_cache.get_cursor(thread_id, version)
+            new_rows = []
             batch_size = 1000
             offset = 0
             
             while True:
-                result = await client.table('messages').select('message_id, type, content').eq('thread_id', thread_id).eq('is_llm_message', True).order('created_at').range(offset, offset + batch_size - 1).execute()
+                query = client.table('messages').select('message_id, type, content, created_at').eq('thread_id', thread_id).eq('is_llm_message', True)
+                if cursor:
+                    query = query.gte('created_at', cursor)
+                result = await query.order('created_at').range(offset, offset + batch_size - 1).execute()
                 
                 if not result.data:
                     break
                     
-                all_messages.extend(result.data)
+                new_rows.extend(result.data)
                 if len(result.data) < batch_size:
                     break
                 offset += batch_size
 
-            if not all_messages:
-                return []
-
-            messages = []
-            for item in all_messages:
-                if isinstance(item['content'], str):
-                    try:
-                        parsed_item = json.loads(item['content'])
-                        parsed_item['message_id'] = item['message_id']
-                        messages.append(parsed_item)
-                    except json.JSONDecodeError:
-                        logger.error(f"Failed to parse message: {item['content']}")
-                else:
-                    content = item['content']
-                    content['message_id'] = item['message_id']
-                    messages.append(content)
-
-            return messages
+            message_cache.merge_rows(thread_id, new_rows, reset=cursor is None, version=version)
+            return message_cache.get_messages(thread_id)
 
         except Exception as e:
             logger.error(f"Failed to get messages for thread {thread_id}: {str(e)}", exc_info=True)
+            message_cache.invalidate(thread_id)
             return []
     
     async def run_thread(
@@ -310,9 +325,7 @@ class ThreadManager:
             if use_context_manager:
                 logger.debug(f"Context manager enabled, compressing {len(messages)} messages")
                 context_manager = ContextManager()
-                compressed_messages = context_manager.compress_messages(
-                    messages, llm_model, max_tokens=llm_max_tokens
-                )
+                compressed_messages = context_manager.compress_messages(messages, llm_model)
                 logger.debug(f"Context compression completed: {len(messages)} -> {len(compressed_messages)} messages")
                 messages = compressed_messages
             else:
@@ -0,0 +1,84 @@
+"""
+Token count memoization for AgentPress.
+
+Tokenizing a long thread is the most expensive CPU work done before an LLM
+call, and context compression and prompt caching both count the same messages
+several times per run. This module caches per-message token counts keyed by
+(counting method, model, message_id, content hash) so every message is tokenized once
+and list totals become sums of cached values.
+"""
+
+import json
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+from litellm.utils import token_counter
+
+DEFAULT_MAX_ENTRIES = 50_000
+
+_SIMPLE_MESSAGE_KEYS = {'role', 'content', 'message_id'}
+
+
+def message_fingerprint(message: Dict[str, Any]) -> Hashable:
+    """Hash everything in a message that contributes to its token count."""
+    content = message.get('content')
+    if isinstance(content, str) and message.keys() <= _SIMPLE_MESSAGE_KEYS:
+        return (message.get('role'), hash(content))
+    payload = {k: v for k, v in message.items() if k != 'message_id'}
+    return hash(json.dumps(payload, sort_keys=True, default=str))
+
+
+class TokenCountCache:
+    """LRU cache of per-message token counts."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._counts: "OrderedDict[Tuple, int]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def get_or_count(self, kind: str, model: str, message: Dict[str, Any], count: Callable[[], int]) -> int:
+        key = (kind, model, message.get('message_id'), message_fingerprint(message))
+        cached = self._counts.get(key)
+        if cached is not None:
+            self._counts.move_to_end(key)
+            self._hits += 1
+            return cached
+
+        self._misses += 1
+        value = count()
+        self._counts[key] = value
+        if len(self._counts) > self.max_entries:
+            self._counts.popitem(last=False)
+        return value
+
+    def count_message(self, message: Dict[str, Any], model: str) -> int:
+        """Token count of a single chat message for the given model."""
+        if not isinstance(message, dict):
+            return 0
+        return self.get_or_count('chat', model, message, lambda: token_counter(model=model, messages=[message]))
+
+    def count_messages(self, messages: List[Dict[str, Any]], model: str) -> int:
+        """Token count of a message list as the sum of cached per-message counts.
+
+        Each per-message count includes litellm's small per-request overhead, so
+        the total slightly overestimates a single ``token_counter`` call over the
+        whole list, which is the safe direction for context budgeting.
+        """
+        return sum(self.count_message(message, model) for message in messages)
+
+    def clear(self) -> None:
+        self._counts.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self._hits + self._misses
+        return {
+            'entries': len(self._counts),
+            'max_entries': self.max_entries,
+            'hits': self._hits,
+            'misses': self._misses,
+            'hit_rate': (self._hits / total) if total else 0.0,
+        }
+
+
+token_cache = TokenCountCache()
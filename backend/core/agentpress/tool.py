@@ -50,12 +50,26 @@ class Tool(ABC):
     
     Attributes:
         _schemas (Dict[str, List[ToolSchema]]): Registered schemas for tool methods
+        _class_schemas (Dict[str, List[ToolSchema]]): Schemas of the decorated methods
+            of the class, collected once when the subclass is defined
         
     Methods:
         get_schemas: Get all registered tool schemas
+        get_class_schemas: Get the decorated schemas without instantiating the tool
         success_response: Create a successful result
         fail_response: Create a failed result
     """
+
+    _class_schemas: Dict[str, List[ToolSchema]] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        """Collect the schemas of decorated methods once per subclass."""
+        super().__init_subclass__(**kwargs)
+        cls._class_schemas = {
+            name: function.tool_schemas
+            for name, function in inspect.getmembers(cls, predicate=inspect.isfunction)
+            if hasattr(function, 'tool_schemas')
+        }
     
     def __init__(self):
         """Initialize tool with empty schema registry."""
@@ -65,10 +79,16 @@ class Tool(ABC):
 
     def _register_schemas(self):
         """Register schemas from all decorated methods."""
-        for name, method in inspect.getmembers(self, predicate=inspect.ismethod):
-            if hasattr(method, 'tool_schemas'):
-                self._schemas[name] = method.tool_schemas
-                # logger.debug(f"Registered schemas for method '{name}' in {self.__class__.__name__}")
+        self._schemas.update(self.get_class_schemas())
+
+    @classmethod
+    def get_class_schemas(cls) -> Dict[str, List[ToolSchema]]:
+        """Get the schemas declared by decorators on this class.
+        
+        Returns:
+            Dict mapping method names to their schema definitions
+        """
+        return cls._class_schemas
 
     def get_schemas(self) -> Dict[str, List[ToolSchema]]:
         """Get all registered tool schemas.
@@ -1,14 +1,81 @@
-from typing import Dict, Type, Any, List, Optional, Callable
-from core.agentpress.tool import Tool, SchemaType
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, Type, Any, List, Optional, Callable, Mapping, Tuple
+from core.agentpress.tool import Tool, SchemaType, ToolSchema
 from core.utils.logger import logger
 import json
 
+MAX_SNAPSHOTS = 128
+
+RegistrationKey = Tuple[Tuple[Type[Tool], Optional[Tuple[str, ...]]], ...]
+
+
+class _ToolHandle:
+    """Constructs a registered tool on first use.
+
+    All functions registered from one ``register_tool`` call share the handle,
+    and therefore the same tool instance.
+    """
+
+    def __init__(self, tool_class: Type[Tool], kwargs: Dict[str, Any]):
+        self.tool_class = tool_class
+        self.kwargs = kwargs
+        self.instance: Optional[Tool] = None
+
+    def get(self) -> Tool:
+        if self.instance is None:
+            logger.debug(f"Instantiating tool {self.tool_class.__name__} on first use")
+            self.instance = self.tool_class(**self.kwargs)
+        return self.instance
+
+
+@dataclass(frozen=True)
+class ToolSnapshot:
+    """Frozen schema view of a set of registered tool classes.
+
+    Snapshots hold no tool instances, so one snapshot is shared by every run
+    in the process that enables the same tools.
+
+    Attributes:
+        key: The (tool class, function filter) registrations the snapshot was built from
+        openapi_schemas: OpenAPI schemas in registration order
+        usage_examples: Usage examples by function name
+    """
+    key: RegistrationKey
+    openapi_schemas: Tuple[Dict[str, Any], ...]
+    usage_examples: Mapping[str, str]
+
+
+def _build_snapshot(key: RegistrationKey) -> ToolSnapshot:
+    functions: Dict[str, Tuple[Type[Tool], ToolSchema]] = {}
+    for tool_class, function_names in key:
+        for func_name, schema_list in tool_class.get_class_schemas().items():
+            if function_names is None or func_name in function_names:
+                for schema in schema_list:
+                    if schema.schema_type == SchemaType.OPENAPI:
+                        functions[func_name] = (tool_class, schema)
+
+    examples: Dict[str, str] = {}
+    for func_name, (tool_class, _) in functions.items():
+        for schema in tool_class.get_class_schemas().get(func_name, []):
+            if schema.schema_type == SchemaType.USAGE_EXAMPLE:
+                examples[func_name] = schema.schema.get('example', '')
+                break
+
+    return ToolSnapshot(
+        key=key,
+        openapi_schemas=tuple(schema.schema for _, schema in functions.values()),
+        usage_examples=MappingProxyType(examples),
+    )
+
 
 class ToolRegistry:
     """Registry for managing and accessing tools.
     
     Maintains a collection of tool instances and their schemas, allowing for
     selective registration of tool functions and easy access to tool capabilities.
+    Tools registered through ``register_tool`` are instantiated lazily, the
+    first time one of their functions is looked up for execution.
     
     Attributes:
         tools (Dict[str, Dict[str, Any]]): OpenAPI-style tools and schemas
@@ -16,12 +83,17 @@ class ToolRegistry:
     Methods:
         register_tool: Register a tool with optional function filtering
         get_tool: Get a specific tool by name
+        get_function: Get the callable for a tool function
         get_openapi_schemas: Get OpenAPI schemas for function calling
+        get_snapshot: Get the shared schema snapshot of the registered tool classes
     """
+
+    _snapshots: Dict[RegistrationKey, ToolSnapshot] = {}
     
     def __init__(self):
         """Initialize a new ToolRegistry instance."""
         self.tools = {}
+        self._registrations: List[Tuple[Type[Tool], Optional[Tuple[str, ...]]]] = []
         logger.debug("Initialized new ToolRegistry instance")
     
     def register_tool(self, tool_class: Type[Tool], function_names: Optional[List[str]] = None, **kwargs):
@@ -35,10 +107,11 @@ class ToolRegistry:
         Notes:
             - If function_names is None, all functions are registered
             - Handles OpenAPI schema registration
+            - The tool is constructed when one of its functions is first executed
         """
         # logger.debug(f"Registering tool class: {tool_class.__name__}")
-        tool_instance = tool_class(**kwargs)
-        schemas = tool_instance.get_schemas()
+        handle = _ToolHandle(tool_class, kwargs)
+        schemas = tool_class.get_class_schemas()
         
         # logger.debug(f"Available schemas for {tool_class.__name__}: {list(schemas.keys())}")
         
@@ -49,16 +122,47 @@ class ToolRegistry:
                 for schema in schema_list:
                     if schema.schema_type == SchemaType.OPENAPI:
                         self.tools[func_name] = {
-                            "instance": tool_instance,
+                            "instance": None,
+                            "handle": handle,
+                            "tool_class": tool_class,
                             "schema": schema
                         }
                         registered_openapi += 1
                         # logger.debug(f"Registered OpenAPI function {func_name} from {tool_class.__name__}")
         
+        self._registrations.append((tool_class, tuple(function_names) if function_names is not None else None))
         # logger.debug(f"Tool registration complete for {tool_class.__name__}: {registered_openapi} OpenAPI functions")
 
+    def _get_instance(self, tool_info: Dict[str, Any]) -> Tool:
+        instance = tool_info.get('instance')
+        if instance is None:
+            instance = tool_info['handle'].get()
+            tool_info['instance'] = instance
+        return instance
+
+    def get_function(self, function_name: str) -> Optional[Callable]:
+        """Get the callable for a tool function, instantiating its tool if needed.
+
+        Args:
+            function_name: Name of the tool function
+
+        Returns:
+            The bound tool method, or None if no such function is registered
+        """
+        tool_info = self.tools.get(function_name)
+        if not tool_info:
+            return None
+        return getattr(self._get_instance(tool_info), function_name)
+
+    def get_function_names(self) -> List[str]:
+        """Get the names of all registered tool functions without instantiating any tool."""
+        return list(self.tools.keys())
+
     def get_available_functions(self) -> Dict[str, Callable]:
         """Get all available tool functions.
+
+        This instantiates every registered tool; prefer ``get_function`` when
+        only one function is needed.
         
         Returns:
             Dict mapping function names to their implementations
@@ -66,11 +170,8 @@ class ToolRegistry:
         available_functions = {}
         
         # Get OpenAPI tool functions
-        for tool_name, tool_info in self.tools.items():
-            tool_instance = tool_info['instance']
-            function_name = tool_name
-            function = getattr(tool_instance, function_name)
-            available_functions[function_name] = function
+        for tool_name in self.tools:
+            available_functions[tool_name] = self.get_function(tool_name)
             
         # logger.debug(f"Retrieved {len(available_functions)} available functions")
         return available_functions
@@ -87,14 +188,37 @@ class ToolRegistry:
         tool = self.tools.get(tool_name, {})
         if not tool:
             logger.warning(f"Tool not found: {tool_name}")
+        else:
+            self._get_instance(tool)
         return tool
 
+    def get_snapshot(self) -> Optional[ToolSnapshot]:
+        """Get the shared schema snapshot for the registered tool classes.
+
+        Returns:
+            The snapshot, or None if tools were added to ``tools`` directly
+            (e.g. MCP tools), in which case schemas are read from the entries
+        """
+        if any('tool_class' not in tool_info for tool_info in self.tools.values()):
+            return None
+        key: RegistrationKey = tuple(self._registrations)
+        snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            snapshot = _build_snapshot(key)
+            if len(self._snapshots) >= MAX_SNAPSHOTS:
+                self._snapshots.clear()
+            self._snapshots[key] = snapshot
+        return snapshot
+
     def get_openapi_schemas(self) -> List[Dict[str, Any]]:
         """Get OpenAPI schemas for function calling.
         
         Returns:
             List of OpenAPI-compatible schema definitions
         """
+        snapshot = self.get_snapshot()
+        if snapshot is not None:
+            return list(snapshot.openapi_schemas)
         schemas = [
             tool_info['schema'].schema 
             for tool_info in self.tools.values()
@@ -109,12 +233,18 @@ class ToolRegistry:
         Returns:
             Dict mapping function names to their usage examples
         """
+        snapshot = self.get_snapshot()
+        if snapshot is not None:
+            return dict(snapshot.usage_examples)
+
         examples = {}
         
         # Get all registered tools and their schemas
         for tool_name, tool_info in self.tools.items():
-            tool_instance = tool_info['instance']
-            all_schemas = tool_instance.get_schemas()
+            if 'tool_class' in tool_info:
+                all_schemas = tool_info['tool_class'].get_class_schemas()
+            else:
+                all_schemas = tool_info['instance'].get_schemas()
             
             # Look for usage examples for this function
             if tool_name in all_schemas:
@@ -126,4 +256,3 @@ class ToolRegistry:
         
         # logger.debug(f"Retrieved {len(examples)} usage examples")
         return examples
-
@@ -220,6 +220,71 @@ class XMLToolParser:
         return True, None
 
 
+class StreamingXMLScanner:
+    """
+    Incremental scanner for <function_calls> blocks in streamed LLM output.
+    
+    Keeps its position between calls so each streamed delta is examined once,
+    instead of re-searching the whole accumulated response on every chunk.
+    Text outside of blocks is discarded; only a short tail that could hold a
+    partially streamed tag is retained.
+    """
+    
+    START_TAG = '<function_calls>'
+    END_TAG = '</function_calls>'
+    
+    def __init__(self, initial_content: str = ""):
+        """
+        Initialize the scanner.
+        
+        Args:
+            initial_content: Content streamed before this scanner was created
+                (e.g. the partial response carried over by auto-continue)
+        """
+        self._carry = initial_content
+        self._block_parts: Optional[List[str]] = None
+    
+    @property
+    def in_block(self) -> bool:
+        """Whether the scanner is inside an unclosed <function_calls> block."""
+        return self._block_parts is not None
+    
+    def feed(self, text: str) -> List[str]:
+        """
+        Consume a streamed delta.
+        
+        Args:
+            text: The newly streamed text
+            
+        Returns:
+            Complete <function_calls> blocks closed by this delta, in order
+        """
+        blocks = []
+        while True:
+            window = self._carry + text
+            if self._block_parts is None:
+                start = window.find(self.START_TAG)
+                if start == -1:
+                    self._carry = window[-(len(self.START_TAG) - 1):]
+                    return blocks
+                self._block_parts = [self.START_TAG]
+                self._carry = ""
+                text = window[start + len(self.START_TAG):]
+            else:
+                end = window.find(self.END_TAG)
+                if end == -1:
+                    self._block_parts.append(text)
+                    self._carry = window[-(len(self.END_TAG) - 1):]
+                    return blocks
+                # The carry is already part of the block; only take the new text up to the end tag
+                consumed = end + len(self.END_TAG) - len(self._carry)
+                self._block_parts.append(text[:consumed])
+                blocks.append(''.join(self._block_parts))
+                self._block_parts = None
+                self._carry = ""
+                text = text[consumed:]
+
+
 # Convenience function for quick parsing
 def parse_xml_tool_calls(content: str) -> List[XMLToolCall]:
     """
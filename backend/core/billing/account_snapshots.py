@@ -0,0 +1,57 @@
+"""
+Cached per-account balance and subscription tier snapshots.
+
+``AgentRunner`` checks the account balance on every iteration. It changes
+rarely compared to how often it is read, so it is served through
+``Cache.get_or_load``: from process memory, then Redis, then the database,
+with concurrent misses for an account sharing one load. The subscription tier
+is cached the same way by ``SubscriptionService.get_user_subscription_tier``.
+
+Writers (credit deductions, grants, renewals, subscription webhooks) call
+``account_snapshots.invalidate``. It drops the Redis entries, and ``Cache``
+tells every other process to drop its local copy.
+"""
+
+from typing import Any, Dict
+
+from core.utils.cache import Cache
+
+SHARED_BALANCE_TTL = 60    # seconds a balance snapshot lives in Redis
+
+
+def _balance_key(account_id: str) -> str:
+    return f"account_balance:{account_id}"
+
+
+def _tier_key(account_id: str) -> str:
+    # Written by SubscriptionService.get_user_subscription_tier
+    return f"subscription_tier:{account_id}"
+
+
+class AccountSnapshotCache:
+    """Balance reads, and balance and tier invalidation, on top of ``Cache``."""
+
+    async def get_balance(self, account_id: str) -> Dict[str, Any]:
+        """Balance snapshot in the shape of ``CreditManager.get_balance``."""
+        from core.billing.credit_manager import credit_manager
+
+        return await Cache.get_or_load(
+            _balance_key(account_id),
+            lambda: credit_manager.get_balance(account_id),
+            ttl=SHARED_BALANCE_TTL,
+            negative_ttl=0
+        )
+
+    async def invalidate(self, account_id: str, tier: bool = False) -> None:
+        """Drop an account's snapshots in Redis and in every process.
+
+        Args:
+            account_id: The account whose credits or subscription changed
+            tier: Also drop the tier snapshot; balance-only changes leave it cached
+        """
+        await Cache.invalidate(_balance_key(account_id))
+        if tier:
+            await Cache.invalidate(_tier_key(account_id))
+
+
+account_snapshots = AccountSnapshotCache()
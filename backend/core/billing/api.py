@@ -9,7 +9,6 @@ from core.services.supabase import DBConnection
 from core.utils.auth_utils import verify_and_get_user_id_from_jwt
 from core.utils.config import config, EnvMode
 from core.utils.logger import logger
-from core.utils.cache import Cache
 from core.ai_models import model_manager
 from .config import (
     TOKEN_PRICE_MULTIPLIER, 
@@ -17,6 +16,7 @@ from .config import (
     TIERS
 )
 from .credit_manager import credit_manager
+from .account_snapshots import account_snapshots
 from .webhook_service import webhook_service
 from .subscription_service import subscription_service
 from .trial_service import trial_service
@@ -502,7 +502,7 @@ async def cancel_subscription(
             feedback=request.feedback
         )
         
-        await Cache.invalidate(f"subscription_tier:{account_id}")
+        await account_snapshots.invalidate(account_id, tier=True)
         return result
         
     except Exception as e:
@@ -515,7 +515,7 @@ async def reactivate_subscription(
 ) -> Dict:
     try:
         result = await subscription_service.reactivate_subscription(account_id)
-        await Cache.invalidate(f"subscription_tier:{account_id}")
+        await account_snapshots.invalidate(account_id, tier=True)
         return result
         
     except Exception as e:
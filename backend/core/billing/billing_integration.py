@@ -2,6 +2,8 @@ from decimal import Decimal
 from typing import Optional, Dict, Tuple, List
 from core.billing.api import calculate_token_cost
 from core.billing.credit_manager import credit_manager
+from core.billing.account_snapshots import account_snapshots
+from core.billing.subscription_service import subscription_service
 from core.utils.config import config, EnvMode
 from core.utils.logger import logger
 from core.services.supabase import DBConnection
@@ -12,7 +14,7 @@ class BillingIntegration:
         if config.ENV_MODE == EnvMode.LOCAL:
             return True, "Local mode", None
         
-        balance_info = await credit_manager.get_balance(account_id)
+        balance_info = await account_snapshots.get_balance(account_id)
         balance = Decimal(str(balance_info.get('total', 0)))
         
         estimated_cost = Decimal('0.10')
@@ -23,20 +25,14 @@ class BillingIntegration:
         return True, f"Credits available: ${balance:.2f}", None
     
     @staticmethod
-    async def deduct_usage(
-        account_id: str,
+    def calculate_usage_cost(
         prompt_tokens: int,
         completion_tokens: int,
         model: str,
-        message_id: Optional[str] = None,
         cache_read_tokens: int = 0,
         cache_creation_tokens: int = 0
-    ) -> Dict:
-        if config.ENV_MODE == EnvMode.LOCAL:
-            return {'success': True, 'cost': 0, 'new_balance': 999999}
-
+    ) -> Decimal:
         if cache_read_tokens > 0:
-            from decimal import Decimal
             non_cached_prompt_tokens = prompt_tokens - cache_read_tokens
             
             model_lower = model.lower()
@@ -53,8 +49,25 @@ class BillingIntegration:
             cost = cached_cost + non_cached_cost
             
             logger.info(f"[BILLING] Cost breakdown: cached=${cached_cost:.6f} + regular=${non_cached_cost:.6f} = total=${cost:.6f}")
-        else:
-            cost = calculate_token_cost(prompt_tokens, completion_tokens, model)
+            return cost
+        return calculate_token_cost(prompt_tokens, completion_tokens, model)
+
+    @staticmethod
+    async def deduct_usage(
+        account_id: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        model: str,
+        message_id: Optional[str] = None,
+        cache_read_tokens: int = 0,
+        cache_creation_tokens: int = 0
+    ) -> Dict:
+        if config.ENV_MODE == EnvMode.LOCAL:
+            return {'success': True, 'cost': 0, 'new_balance': 999999}
+
+        cost = BillingIntegration.calculate_usage_cost(
+            prompt_tokens, completion_tokens, model, cache_read_tokens, cache_creation_tokens
+        )
         
         if cost <= 0:
             logger.warning(f"Zero cost calculated for {model} with {prompt_tokens}+{completion_tokens} tokens")
@@ -108,7 +121,6 @@ class BillingIntegration:
             return True, "Local development mode", {"local_mode": True}
         
         try:
-            from core.billing.subscription_service import subscription_service
             from core.billing import is_model_allowed
             
             # Get user's subscription tier
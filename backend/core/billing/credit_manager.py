@@ -4,6 +4,7 @@ from datetime import datetime, timezone, timedelta
 from core.services.supabase import DBConnection
 from core.utils.logger import logger
 from core.utils.cache import Cache
+from core.billing.account_snapshots import account_snapshots
 
 
 class CreditManager:
@@ -113,6 +114,7 @@ class CreditManager:
         
         await Cache.invalidate(f"credit_balance:{account_id}")
         await Cache.invalidate(f"credit_summary:{account_id}")
+        await account_snapshots.invalidate(account_id)
         
         return {
             'success': True,
@@ -129,89 +131,45 @@ class CreditManager:
         thread_id: Optional[str] = None,
         message_id: Optional[str] = None
     ) -> Dict:
+        """Deduct credits with one atomic RPC.
+
+        ``use_credits_atomic`` locks the account row, splits the amount between
+        expiring and non-expiring credits, checks the balance, updates it and
+        writes the ledger entry in a single transaction, so concurrent
+        deductions for one account cannot overwrite each other.
+        """
         client = await self.db.client
+        amount = Decimal(str(amount))
         
-        result = await client.from_('credit_accounts').select(
-            'expiring_credits, non_expiring_credits, balance'
-        ).eq('account_id', account_id).execute()
-        
-        if not result.data:
-            return {
-                'success': False,
-                'error': 'No credit account found',
-                'required': float(amount),
-                'available': 0
-            }
-        
-        current = result.data[0]
-        current_expiring = Decimal(str(current.get('expiring_credits', 0)))
-        current_non_expiring = Decimal(str(current.get('non_expiring_credits', 0)))
-        current_total = Decimal(str(current.get('balance', 0)))
-        
-        credit_sum = current_expiring + current_non_expiring
-        if abs(credit_sum - current_total) > Decimal('0.01'):
-            difference = current_total - credit_sum
-            if difference > 0:
-                current_non_expiring += difference
-            else:
-                if current_expiring >= abs(difference):
-                    current_expiring -= abs(difference)
-                else:
-                    remainder = abs(difference) - current_expiring
-                    current_expiring = Decimal('0')
-                    current_non_expiring = max(Decimal('0'), current_non_expiring - remainder)
+        result = await client.rpc('use_credits_atomic', {
+            'p_account_id': account_id,
+            'p_amount': str(amount),
+            'p_description': description,
+            'p_thread_id': thread_id,
+            'p_message_id': message_id
+        }).execute()
+        data = result.data or {}
         
-        if current_total < amount:
+        if not data.get('success'):
             return {
                 'success': False,
-                'error': 'Insufficient credits',
+                'error': data.get('error', 'Credit deduction failed'),
                 'required': float(amount),
-                'available': float(current_total)
+                'available': float(data.get('available', 0))
             }
         
-        if current_expiring >= amount:
-            amount_from_expiring = amount
-            amount_from_non_expiring = Decimal('0')
-        else:
-            amount_from_expiring = current_expiring
-            amount_from_non_expiring = amount - current_expiring
-        
-        new_expiring = current_expiring - amount_from_expiring
-        new_non_expiring = current_non_expiring - amount_from_non_expiring
-        new_total = new_expiring + new_non_expiring
-        
-        await client.from_('credit_accounts').update({
-            'expiring_credits': float(new_expiring),
-            'non_expiring_credits': float(new_non_expiring),
-            'balance': float(new_total),
-            'updated_at': datetime.now(timezone.utc).isoformat()
-        }).eq('account_id', account_id).execute()
-        
-        await client.from_('credit_ledger').insert({
-            'account_id': account_id,
-            'amount': float(-amount),
-            'balance_after': float(new_total),
-            'type': 'usage',
-            'description': description,
-            'reference_id': thread_id or message_id,
-            'metadata': {
-                'thread_id': thread_id,
-                'message_id': message_id,
-                'from_expiring': float(amount_from_expiring),
-                'from_non_expiring': float(amount_from_non_expiring)
-            }
-        }).execute()
-        
         await Cache.invalidate(f"credit_balance:{account_id}")
+        await account_snapshots.invalidate(account_id)
         
         return {
             'success': True,
-            'amount_deducted': float(amount),
-            'from_expiring': float(amount_from_expiring),
-            'from_non_expiring': float(amount_from_non_expiring),
-            'new_expiring': float(new_expiring),
-            'new_non_expiring': float(new_non_expiring),
-            'new_total': float(new_total)
+            'amount_deducted': float(data['amount_deducted']),
+            'from_expiring': float(data['from_expiring']),
+            'from_non_expiring': float(data['from_non_expiring']),
+            'new_expiring': float(data['new_expiring']),
+            'new_non_expiring': float(data['new_non_expiring']),
+            'new_total': float(data['new_total']),
+            'transaction_id': data.get('transaction_id')
         }
     
     async def reset_expiring_credits(
@@ -269,6 +227,7 @@ class CreditManager:
         
         await Cache.invalidate(f"credit_balance:{account_id}")
         await Cache.invalidate(f"credit_summary:{account_id}")
+        await account_snapshots.invalidate(account_id)
         
         return {
             'success': True,
@@ -18,6 +18,7 @@ from .config import (
     get_price_type
 )
 from .credit_manager import credit_manager
+from .account_snapshots import account_snapshots
 
 class SubscriptionService:
     def __init__(self):
@@ -282,7 +283,7 @@ class SubscriptionService:
             logger.info(f"Stripe subscription updated, processing subscription change")
             await self.handle_subscription_change(updated_subscription)
 
-            await Cache.invalidate(f"subscription_tier:{account_id}")
+            await account_snapshots.invalidate(account_id, tier=True)
             await Cache.invalidate(f"credit_balance:{account_id}")
             await Cache.invalidate(f"credit_summary:{account_id}")
             
@@ -347,7 +348,7 @@ class SubscriptionService:
             subscription = await stripe.Subscription.retrieve_async(subscription_id)
             await self.handle_subscription_change(subscription)
             
-            await Cache.invalidate(f"subscription_tier:{account_id}")
+            await account_snapshots.invalidate(account_id, tier=True)
             await Cache.invalidate(f"credit_balance:{account_id}")
             await Cache.invalidate(f"credit_summary:{account_id}")
             
@@ -478,6 +479,7 @@ class SubscriptionService:
         
         if subscription.status == 'trialing' and subscription.get('trial_end'):
             await self._handle_trial_subscription(subscription, account_id, new_tier, client)
+            await account_snapshots.invalidate(account_id, tier=True)
             return
         
         billing_anchor = datetime.fromtimestamp(subscription['current_period_start'], tz=timezone.utc)
@@ -536,6 +538,8 @@ class SubscriptionService:
             }).eq('account_id', account_id).execute()
         else:
             await self._grant_initial_subscription_credits(account_id, new_tier, billing_anchor, subscription, client)
+        
+        await account_snapshots.invalidate(account_id, tier=True)
 
     async def _handle_trial_subscription(self, subscription, account_id, new_tier, client):
         if not subscription.get('trial_end'):
@@ -642,11 +646,13 @@ class SubscriptionService:
         Returns:
             Dictionary containing tier information
         """
-        cache_key = f"subscription_tier:{account_id}"
-        cached = await Cache.get(cache_key)
-        if cached:
-            return cached
-        
+        return await Cache.get_or_load(
+            f"subscription_tier:{account_id}",
+            lambda: self._load_subscription_tier(account_id),
+            ttl=60
+        )
+
+    async def _load_subscription_tier(self, account_id: str) -> Dict:
         db = DBConnection()
         client = await db.client
 
@@ -673,7 +679,6 @@ class SubscriptionService:
             'is_trial': trial_status == 'active'
         }
         
-        await Cache.set(cache_key, tier_info, ttl=60)
         return tier_info
 
     async def get_allowed_models_for_user(self, user_id: str, client=None) -> List[str]:
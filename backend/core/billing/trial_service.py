@@ -12,6 +12,7 @@ from .config import (
     TRIAL_CREDITS,
 )
 from .credit_manager import credit_manager
+from .account_snapshots import account_snapshots
 
 class TrialService:
     def __init__(self):
@@ -124,6 +125,7 @@ class TrialService:
                 'description': 'Trial cancelled by user'
             }).execute()
             
+            await account_snapshots.invalidate(account_id, tier=True)
             logger.info(f"[TRIAL CANCEL] Successfully cancelled trial for account {account_id}")
             
             return {
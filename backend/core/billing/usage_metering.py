@@ -0,0 +1,239 @@
+"""
+Write-behind usage metering.
+
+Billing an LLM response inline costs a thread lookup, a balance read, an
+update, a ledger insert and a cache invalidation on the agent's hot path.
+Instead, ``ThreadManager`` appends one usage record per response to the
+Redis Stream ``billing:usage_events`` and moves on. A background settler in
+each worker process reads the stream through a consumer group, prices the
+records, and settles them per account with one ``settle_usage_events`` RPC
+per flush window. The RPC is idempotent on message_id, so a redelivered or
+reclaimed batch never charges twice.
+
+Records stay pending in the stream until their settlement commits. Entries
+left pending by a crashed worker are reclaimed by another worker after
+``CLAIM_IDLE_MS``.
+"""
+
+import asyncio
+import json
+import os
+import socket
+import time
+from dataclasses import asdict, dataclass
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.billing.account_snapshots import account_snapshots
+from core.billing.billing_integration import billing_integration
+from core.services import redis
+from core.services.supabase import DBConnection
+from core.utils.cache import Cache
+from core.utils.config import config, EnvMode
+from core.utils.logger import logger
+
+USAGE_STREAM_KEY = "billing:usage_events"
+SETTLEMENT_GROUP = "billing_settlement"
+
+DEFAULT_FLUSH_INTERVAL = 2.0  # seconds records are collected before a settlement round
+DEFAULT_BATCH_SIZE = 500      # records read per settlement round
+READ_BLOCK_MS = 5000          # must stay below the Redis socket timeout
+CLAIM_IDLE_MS = 60_000        # pending records older than this are taken over from other workers
+
+
+@dataclass
+class UsageRecord:
+    """Token usage of one assistant response."""
+    message_id: str
+    thread_id: str
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    cache_read_tokens: int = 0
+    cache_creation_tokens: int = 0
+    account_id: Optional[str] = None
+
+
+class UsageMeter:
+    """Queues usage records in Redis and settles them in per-account batches."""
+
+    def __init__(self, flush_interval: float = DEFAULT_FLUSH_INTERVAL, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self.db = DBConnection()
+        self._task: Optional[asyncio.Task] = None
+        self._group_ready = False
+
+        self._recorded = 0
+        self._settled = 0
+        self._duplicates = 0
+        self._insufficient = 0
+        self._failed_settlements = 0
+        self._rounds = 0
+        self._last_round_ms = 0.0
+
+    async def record(self, record: UsageRecord) -> None:
+        """Queue a usage record for settlement; returns after one XADD."""
+        if config.ENV_MODE == EnvMode.LOCAL:
+            return
+        await redis.xadd(USAGE_STREAM_KEY, {"usage": json.dumps(asdict(record))})
+        self._recorded += 1
+        self.start()
+
+    def start(self) -> None:
+        """Start the background settler on the running event loop if it is not running."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background settler. Unsettled records stay in the stream."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.settle_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[BILLING] Usage settlement round failed: {e}", exc_info=True)
+                await asyncio.sleep(self.flush_interval)
+
+    async def settle_once(self) -> int:
+        """Run one settlement round and return the number of records acknowledged."""
+        if not self._group_ready:
+            await redis.xgroup_create(USAGE_STREAM_KEY, SETTLEMENT_GROUP)
+            self._group_ready = True
+
+        entries = await self._claim_stale()
+        if not entries:
+            entries = await self._read(block=READ_BLOCK_MS)
+            if not entries:
+                return 0
+            # Let the flush window fill up so each account settles in one call
+            await asyncio.sleep(self.flush_interval)
+            entries += await self._read(count=self.batch_size - len(entries))
+
+        start = time.monotonic()
+        acked = await self._settle(entries)
+        self._rounds += 1
+        self._last_round_ms = (time.monotonic() - start) * 1000
+        return acked
+
+    async def _read(self, block: Optional[int] = None, count: Optional[int] = None) -> List[Tuple[str, Dict[str, str]]]:
+        if count is not None and count <= 0:
+            return []
+        result = await redis.xreadgroup(
+            SETTLEMENT_GROUP, self.consumer, {USAGE_STREAM_KEY: ">"},
+            count=count or self.batch_size, block=block
+        )
+        return result[0][1] if result else []
+
+    async def _claim_stale(self) -> List[Tuple[str, Dict[str, str]]]:
+        result = await redis.xautoclaim(
+            USAGE_STREAM_KEY, SETTLEMENT_GROUP, self.consumer, CLAIM_IDLE_MS, count=self.batch_size
+        )
+        claimed = result[1] if result and len(result) > 1 else []
+        if claimed:
+            logger.warning(f"[BILLING] Reclaimed {len(claimed)} unsettled usage records")
+        return [(entry_id, fields) for entry_id, fields in claimed if fields]
+
+    async def _settle(self, entries: List[Tuple[str, Dict[str, str]]]) -> int:
+        records: List[Tuple[str, UsageRecord]] = []
+        malformed: List[str] = []
+        for entry_id, fields in entries:
+            try:
+                records.append((entry_id, UsageRecord(**json.loads(fields["usage"]))))
+            except (KeyError, TypeError, ValueError) as e:
+                logger.error(f"[BILLING] Dropping malformed usage record {entry_id}: {e}")
+                malformed.append(entry_id)
+        if malformed:
+            await redis.xack_and_delete(USAGE_STREAM_KEY, SETTLEMENT_GROUP, malformed)
+
+        await self._resolve_accounts([record for _, record in records])
+
+        by_account: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+        unbillable: List[str] = []
+        for entry_id, record in records:
+            cost = billing_integration.calculate_usage_cost(
+                record.prompt_tokens, record.completion_tokens, record.model,
+                record.cache_read_tokens, record.cache_creation_tokens
+            )
+            if not record.account_id or cost <= 0:
+                if cost <= 0:
+                    logger.warning(f"Zero cost calculated for {record.model} with {record.prompt_tokens}+{record.completion_tokens} tokens")
+                unbillable.append(entry_id)
+                continue
+            event = asdict(record)
+            event.pop("account_id")
+            event["cost"] = str(cost)
+            by_account.setdefault(record.account_id, []).append((entry_id, event))
+        if unbillable:
+            await redis.xack_and_delete(USAGE_STREAM_KEY, SETTLEMENT_GROUP, unbillable)
+
+        acked = len(malformed) + len(unbillable)
+        client = await self.db.client
+        for account_id, items in by_account.items():
+            entry_ids = [entry_id for entry_id, _ in items]
+            try:
+                result = await client.rpc('settle_usage_events', {
+                    'p_account_id': account_id,
+                    'p_events': [event for _, event in items]
+                }).execute()
+            except Exception as e:
+                # Left pending; retried once the entries become claimable
+                self._failed_settlements += 1
+                logger.error(f"[BILLING] Failed to settle {len(items)} usage records for {account_id}: {e}")
+                continue
+
+            summary = result.data or {}
+            self._settled += summary.get('settled', 0)
+            self._duplicates += summary.get('duplicates', 0)
+            self._insufficient += summary.get('insufficient', 0)
+            if summary.get('success'):
+                logger.info(f"[BILLING] Settled {summary.get('settled', 0)} usage records for {account_id}: "
+                            f"${Decimal(str(summary.get('amount_deducted', 0))):.6f}, new balance ${Decimal(str(summary.get('new_total', 0))):.2f}")
+                if summary.get('insufficient'):
+                    logger.error(f"[BILLING] {summary['insufficient']} usage records for {account_id} exceeded the balance")
+            else:
+                logger.error(f"[BILLING] Failed to deduct credits for user {account_id}: {summary.get('error')}")
+
+            await redis.xack_and_delete(USAGE_STREAM_KEY, SETTLEMENT_GROUP, entry_ids)
+            await Cache.invalidate(f"credit_balance:{account_id}")
+            await account_snapshots.invalidate(account_id)
+            acked += len(entry_ids)
+        return acked
+
+    async def _resolve_accounts(self, records: List[UsageRecord]) -> None:
+        """Fill in account_id from the threads table with one query per round."""
+        thread_ids = list({record.thread_id for record in records if not record.account_id})
+        if not thread_ids:
+            return
+        client = await self.db.client
+        result = await client.table('threads').select('thread_id, account_id').in_('thread_id', thread_ids).execute()
+        accounts = {row['thread_id']: row['account_id'] for row in result.data or []}
+        for record in records:
+            if not record.account_id:
+                record.account_id = accounts.get(record.thread_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'recorded': self._recorded,
+            'settled': self._settled,
+            'duplicates': self._duplicates,
+            'insufficient': self._insufficient,
+            'failed_settlements': self._failed_settlements,
+            'rounds': self._rounds,
+            'last_round_ms': self._last_round_ms,
+            'running': bool(self._task and not self._task.done()),
+        }
+
+
+usage_meter = UsageMeter()
@@ -18,6 +18,7 @@ from .config import (
     get_commitment_duration_months
 )
 from .credit_manager import credit_manager
+from .account_snapshots import account_snapshots
 
 
 class WebhookService:
@@ -175,6 +176,7 @@ class WebhookService:
                     'converted_to_paid': True
                 }).eq('account_id', account_id).is_('ended_at', 'null').execute()
                 
+                await account_snapshots.invalidate(account_id, tier=True)
                 logger.info(f"[WEBHOOK] Successfully converted trial to paid for account {account_id}, tier: {tier_name}, credits: {tier_credits}")
                 return
 
@@ -219,6 +221,7 @@ class WebhookService:
                         'stripe_checkout_session_id': session.get('id')
                     }, on_conflict='account_id').execute()
                     
+                    await account_snapshots.invalidate(account_id, tier=True)
                     logger.info(f"[WEBHOOK] Trial fully activated for account {account_id}")
                 else:
                     logger.info(f"[WEBHOOK] Subscription status: {subscription.status}, not trialing")
@@ -295,6 +298,7 @@ class WebhookService:
                     'ended_at': datetime.now(timezone.utc).isoformat()
                 }).eq('account_id', account_id).is_('ended_at', 'null').execute()
                 
+                await account_snapshots.invalidate(account_id, tier=True)
                 logger.info(f"[WEBHOOK] Marked trial as converted (payment added) for account {account_id}, tier: {tier_name}")
         
         # Handle trial end (transition from trialing to any other status)
@@ -373,6 +377,8 @@ class WebhookService:
                         'type': 'adjustment',
                         'description': 'Trial expired - all access removed'
                     }).execute()
+                
+                await account_snapshots.invalidate(account_id, tier=True)
     
     async def _handle_subscription_deleted(self, event, client):
         subscription = event.data.object
@@ -406,6 +412,7 @@ class WebhookService:
                     'description': 'Trial cancelled - all access removed'
                 }).execute()
                 
+                await account_snapshots.invalidate(account_id, tier=True)
                 logger.info(f"[WEBHOOK] Successfully removed all access for account {account_id} after trial cancellation")
     
     async def _handle_invoice_payment_succeeded(self, event, client):
@@ -742,7 +749,7 @@ class WebhookService:
                 
                 await Cache.invalidate(f"credit_balance:{account_id}")
                 await Cache.invalidate(f"credit_summary:{account_id}")
-                await Cache.invalidate(f"subscription_tier:{account_id}")
+                await account_snapshots.invalidate(account_id, tier=True)
                 
                 logger.info(f"✅ [RENEWAL] Renewed credits for user {account_id}: ${monthly_credits} expiring + "
                            f"${result['non_expiring']:.2f} non-expiring = ${result['total_balance']:.2f} total")
@@ -0,0 +1,121 @@
+"""Shared fixtures for the core test suites."""
+
+import asyncio
+import fnmatch
+
+import pytest
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        method = getattr(self.redis, f"_{name}")
+        return lambda *args, **kwargs: self.ops.append(lambda: method(*args, **kwargs))
+
+    async def execute(self):
+        return [op() for op in self.ops]
+
+
+class FakeRedis:
+    """The subset of redis.asyncio the core services use, kept in memory.
+
+    Every command is implemented once as a synchronous ``_`` method, which
+    pipelines queue. Awaited commands yield to the event loop first, like a
+    round-trip would, so concurrent callers interleave.
+    """
+
+    def __init__(self):
+        self.lists = {}
+        self.zsets = {}
+        self.values = {}
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        method = getattr(self, f"_{name}")
+
+        async def command(*args, **kwargs):
+            await asyncio.sleep(0)
+            return method(*args, **kwargs)
+
+        return command
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+    async def scan_iter(self, match=None, count=None):
+        for key in [*self.lists, *self.zsets, *self.values]:
+            if match is None or fnmatch.fnmatchcase(key, match):
+                yield key
+
+    def _expire(self, key, seconds):
+        return True
+
+    def _delete(self, *keys):
+        return sum(
+            1 for key in keys
+            if any(store.pop(key, None) is not None for store in (self.lists, self.zsets, self.values))
+        )
+
+    def _get(self, key):
+        return self.values.get(key)
+
+    def _set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    def _lpop(self, key):
+        items = self.lists.get(key, [])
+        return items.pop(0) if items else None
+
+    def _rpush(self, key, *values):
+        self.lists.setdefault(key, []).extend(values)
+        return len(self.lists[key])
+
+    def _llen(self, key):
+        return len(self.lists.get(key, []))
+
+    def _lrange(self, key, start, end):
+        items = self.lists.get(key, [])
+        return list(items[start:] if end == -1 else items[start:end + 1])
+
+    def _lrem(self, key, count, value):
+        items = self.lists.get(key, [])
+        if value in items:
+            items.remove(value)
+            return 1
+        return 0
+
+    def _zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    def _zrem(self, key, *members):
+        for member in members:
+            self.zsets.get(key, {}).pop(member, None)
+
+    def _zremrangebyscore(self, key, low, high):
+        high = float(high)
+        self.zsets[key] = {member: score for member, score in self.zsets.get(key, {}).items() if score > high}
+
+    def _zrange(self, key, start, end, withscores=False):
+        items = sorted(self.zsets.get(key, {}).items(), key=lambda item: item[1])
+        return items if withscores else [member for member, _ in items]
+
+    def _zcount(self, key, low, high):
+        return sum(1 for score in self.zsets.get(key, {}).values() if float(low) <= score <= float(high))
+
+
+@pytest.fixture
+def fake_redis():
+    return FakeRedis()
@@ -2,14 +2,15 @@ import json
 import traceback
 import uuid
 from typing import Optional, List, Dict, Any
-from datetime import datetime, timezone, timedelta
 from fastapi import HTTPException
 from .utils.cache import Cache
 from .utils.logger import logger
 from .utils.config import config
 from .utils.auth_utils import verify_and_authorize_thread_access
-from core.services import redis
+from core.services import redis, active_runs
 from core.services.supabase import DBConnection
+from core.services.response_stream import publish_control, expire_response_stream, STREAM_STOPPED_TTL
+from core.services.running_runs import running_runs
 from core.services.llm import make_llm_api_call
 from run_agent_background import update_agent_run_status, _cleanup_redis_response_list
 
@@ -86,17 +87,11 @@ async def cleanup():
     # Use the instance_id to find and clean up this instance's keys
     try:
         if instance_id: # Ensure instance_id is set
-            running_keys = await redis.keys(f"active_run:{instance_id}:*")
-            logger.debug(f"Found {len(running_keys)} running agent runs for instance {instance_id} to clean up")
-
-            for key in running_keys:
-                # Key format: active_run:{instance_id}:{agent_run_id}
-                parts = key.split(":")
-                if len(parts) == 3:
-                    agent_run_id = parts[2]
-                    await stop_agent_run_with_helpers(agent_run_id, error_message=f"Instance {instance_id} shutting down")
-                else:
-                    logger.warning(f"Unexpected key format found: {key}")
+            running_run_ids = await active_runs.get_instance_runs(instance_id)
+            logger.debug(f"Found {len(running_run_ids)} running agent runs for instance {instance_id} to clean up")
+
+            for agent_run_id in running_run_ids:
+                await stop_agent_run_with_helpers(agent_run_id, error_message=f"Instance {instance_id} shutting down")
         else:
             logger.warning("Instance ID not set, cannot clean up instance-specific agent runs.")
 
@@ -136,29 +131,23 @@ async def stop_agent_run_with_helpers(agent_run_id: str, error_message: Optional
     # Send STOP signal to the global control channel
     global_control_channel = f"agent_run:{agent_run_id}:control"
     try:
-        await redis.publish(global_control_channel, "STOP")
+        await publish_control(agent_run_id, "STOP")
         logger.debug(f"Published STOP signal to global channel {global_control_channel}")
     except Exception as e:
         logger.error(f"Failed to publish STOP signal to global channel {global_control_channel}: {str(e)}")
 
     # Find all instances handling this agent run and send STOP to instance-specific channels
     try:
-        instance_keys = await redis.keys(f"active_run:*:{agent_run_id}")
-        logger.debug(f"Found {len(instance_keys)} active instance keys for agent run {agent_run_id}")
-
-        for key in instance_keys:
-            # Key format: active_run:{instance_id}:{agent_run_id}
-            parts = key.split(":")
-            if len(parts) == 3:
-                instance_id_from_key = parts[1]
-                instance_control_channel = f"agent_run:{agent_run_id}:control:{instance_id_from_key}"
-                try:
-                    await redis.publish(instance_control_channel, "STOP")
-                    logger.debug(f"Published STOP signal to instance channel {instance_control_channel}")
-                except Exception as e:
-                    logger.warning(f"Failed to publish STOP signal to instance channel {instance_control_channel}: {str(e)}")
-            else:
-                 logger.warning(f"Unexpected key format found: {key}")
+        instance_ids = await active_runs.get_instances(agent_run_id)
+        logger.debug(f"Found {len(instance_ids)} active instances for agent run {agent_run_id}")
+
+        for instance_id_from_key in instance_ids:
+            instance_control_channel = f"agent_run:{agent_run_id}:control:{instance_id_from_key}"
+            try:
+                await redis.publish(instance_control_channel, "STOP")
+                logger.debug(f"Published STOP signal to instance channel {instance_control_channel}")
+            except Exception as e:
+                logger.warning(f"Failed to publish STOP signal to instance channel {instance_control_channel}: {str(e)}")
 
         # Clean up the response list immediately on stop/fail
         await _cleanup_redis_response_list(agent_run_id)
@@ -427,6 +416,8 @@ async def _cleanup_redis_response_list(agent_run_id: str):
     try:
         response_list_key = f"agent_run:{agent_run_id}:responses"
         await redis.delete(response_list_key)
+        # Keep the stream briefly so connected viewers still receive the STOP entry
+        await expire_response_stream(agent_run_id, STREAM_STOPPED_TTL)
         logger.debug(f"Cleaned up Redis response list for agent run {agent_run_id}")
     except Exception as e:
         logger.warning(f"Failed to clean up Redis response list for {agent_run_id}: {str(e)}")
@@ -476,27 +467,22 @@ async def stop_agent_run(db, agent_run_id: str, error_message: Optional[str] = N
 
     global_control_channel = f"agent_run:{agent_run_id}:control"
     try:
-        await redis.publish(global_control_channel, "STOP")
+        await publish_control(agent_run_id, "STOP")
         logger.debug(f"Published STOP signal to global channel {global_control_channel}")
     except Exception as e:
         logger.error(f"Failed to publish STOP signal to global channel {global_control_channel}: {str(e)}")
 
     try:
-        instance_keys = await redis.keys(f"active_run:*:{agent_run_id}")
-        logger.debug(f"Found {len(instance_keys)} active instance keys for agent run {agent_run_id}")
-
-        for key in instance_keys:
-            parts = key.split(":")
-            if len(parts) == 3:
-                instance_id_from_key = parts[1]
-                instance_control_channel = f"agent_run:{agent_run_id}:control:{instance_id_from_key}"
-                try:
-                    await redis.publish(instance_control_channel, "STOP")
-                    logger.debug(f"Published STOP signal to instance channel {instance_control_channel}")
-                except Exception as e:
-                    logger.warning(f"Failed to publish STOP signal to instance channel {instance_control_channel}: {str(e)}")
-            else:
-                logger.warning(f"Unexpected key format found: {key}")
+        instance_ids = await active_runs.get_instances(agent_run_id)
+        logger.debug(f"Found {len(instance_ids)} active instances for agent run {agent_run_id}")
+
+        for instance_id_from_key in instance_ids:
+            instance_control_channel = f"agent_run:{agent_run_id}:control:{instance_id_from_key}"
+            try:
+                await redis.publish(instance_control_channel, "STOP")
+                logger.debug(f"Published STOP signal to instance channel {instance_control_channel}")
+            except Exception as e:
+                logger.warning(f"Failed to publish STOP signal to instance channel {instance_control_channel}: {str(e)}")
 
         await _cleanup_redis_response_list(agent_run_id)
 
@@ -513,47 +499,22 @@ async def check_agent_run_limit(client, account_id: str) -> Dict[str, Any]:
     Returns:
         Dict with 'can_start' (bool), 'running_count' (int), 'running_thread_ids' (list)
         
-    Note: This function does not use caching to ensure real-time limit checks.
+    Note: Runs are counted from the account's Redis index of running runs in one
+    round-trip. A rejection is confirmed against the database before it is returned.
     """
     try:
-
-        # Calculate 24 hours ago
-        twenty_four_hours_ago = datetime.now(timezone.utc) - timedelta(hours=24)
-        twenty_four_hours_ago_iso = twenty_four_hours_ago.isoformat()
+        running_run_ids = await running_runs.running_run_ids(account_id)
         
-        logger.debug(f"Checking agent run limit for account {account_id} since {twenty_four_hours_ago_iso}")
-        
-        # Get all threads for this account
-        threads_result = await client.table('threads').select('thread_id').eq('account_id', account_id).execute()
-        
-        if not threads_result.data:
-            logger.debug(f"No threads found for account {account_id}")
+        if len(running_run_ids) < config.MAX_PARALLEL_AGENT_RUNS:
             return {
                 'can_start': True,
-                'running_count': 0,
+                'running_count': len(running_run_ids),
                 'running_thread_ids': []
             }
         
-        thread_ids = [thread['thread_id'] for thread in threads_result.data]
-        logger.debug(f"Found {len(thread_ids)} threads for account {account_id}")
-        
-        # Query for running agent runs within the past 24 hours for these threads
-        from .utils.query_utils import batch_query_in
-        
-        running_runs = await batch_query_in(
-            client=client,
-            table_name='agent_runs',
-            select_fields='id, thread_id, started_at',
-            in_field='thread_id',
-            in_values=thread_ids,
-            additional_filters={
-                'status': 'running',
-                'started_at_gte': twenty_four_hours_ago_iso
-            }
-        )
-        
-        running_count = len(running_runs)
-        running_thread_ids = [run['thread_id'] for run in running_runs]
+        running = await running_runs.verify(client, account_id)
+        running_count = len(running)
+        running_thread_ids = [run['thread_id'] for run in running]
         
         logger.debug(f"Account {account_id} has {running_count} running agent runs in the past 24 hours")
         
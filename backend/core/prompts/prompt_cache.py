@@ -0,0 +1,140 @@
+"""
+System prompt assembly cache.
+
+Building an agent's system prompt reads the sample response from disk, runs
+the knowledge base RPC and serializes every tool schema. None of that changes
+between runs of the same agent version, so ``PromptManager`` caches the
+assembled prefix and only appends the date/time block per run. Keeping the
+prefix byte-identical across runs also lets provider-side prompt caching hit.
+
+The cache key covers everything the prefix depends on: agent, version, model
+family, system prompt, registered tools, MCP schemas and a hash of the
+knowledge base context. The knowledge base text itself is cached per agent
+for a short TTL, which bounds how long a knowledge base edit takes to reach
+the prompts built by a worker process.
+"""
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from core.utils.logger import logger
+
+DEFAULT_MAX_PREFIXES = 512
+DEFAULT_KB_TTL = 60  # seconds a knowledge base edit may take to reach new prompts
+
+_MISSING = object()
+
+
+def text_digest(value: str) -> str:
+    """Stable digest of a prompt component, for cache keys."""
+    return hashlib.sha1(value.encode('utf-8')).hexdigest()
+
+
+def knowledge_base_digest(context: Optional[str]) -> Optional[str]:
+    return text_digest(context) if context else None
+
+
+def tool_registry_fingerprint(tool_registry) -> Hashable:
+    """Identify the registered tool set without serializing its schemas.
+
+    Static tool schemas are defined by decorators on the tool class, so the
+    (function, class) pairs determine them. Dynamic MCP schemas are covered
+    separately by ``mcp_schema_fingerprint``.
+    """
+    if tool_registry is None:
+        return None
+    return tuple(sorted(
+        (name, (info.get('tool_class') or type(info['instance'])).__qualname__)
+        for name, info in tool_registry.tools.items()
+    ))
+
+
+def mcp_schema_fingerprint(mcp_wrapper_instance) -> Optional[str]:
+    if mcp_wrapper_instance is None or not getattr(mcp_wrapper_instance, '_initialized', False):
+        return None
+    try:
+        schemas = {
+            name: [schema.schema for schema in schema_list]
+            for name, schema_list in mcp_wrapper_instance.get_schemas().items()
+        }
+        return text_digest(json.dumps(schemas, sort_keys=True, default=str))
+    except Exception as e:
+        logger.debug(f"Could not fingerprint MCP schemas: {e}")
+        return None
+
+
+class SystemPromptCache:
+    """LRU cache of assembled system prompt prefixes plus a TTL cache of KB context."""
+
+    def __init__(self, max_prefixes: int = DEFAULT_MAX_PREFIXES, kb_ttl: float = DEFAULT_KB_TTL):
+        self.max_prefixes = max_prefixes
+        self.kb_ttl = kb_ttl
+        self._prefixes: "OrderedDict[Tuple, str]" = OrderedDict()
+        self._kb_context: Dict[str, Tuple[Optional[str], float]] = {}
+        self._hits = 0
+        self._misses = 0
+        self._kb_fetches = 0
+
+    def get_prefix(self, key: Tuple) -> Optional[str]:
+        prefix = self._prefixes.get(key)
+        if prefix is None:
+            self._misses += 1
+            return None
+        self._prefixes.move_to_end(key)
+        self._hits += 1
+        return prefix
+
+    def set_prefix(self, key: Tuple, prefix: str) -> None:
+        self._prefixes[key] = prefix
+        self._prefixes.move_to_end(key)
+        while len(self._prefixes) > self.max_prefixes:
+            self._prefixes.popitem(last=False)
+
+    async def get_knowledge_base_context(self, client, agent_id: str) -> Optional[str]:
+        """Return the agent's KB context text, calling the RPC at most once per TTL.
+
+        Raises whatever the RPC raises; failures are not cached.
+        """
+        cached, loaded_at = self._kb_context.get(agent_id, (_MISSING, 0.0))
+        if cached is not _MISSING and time.monotonic() - loaded_at <= self.kb_ttl:
+            return cached
+
+        kb_result = await client.rpc('get_agent_knowledge_base_context', {
+            'p_agent_id': agent_id
+        }).execute()
+        self._kb_fetches += 1
+        context = kb_result.data if kb_result.data and kb_result.data.strip() else None
+        self._kb_context.pop(agent_id, None)
+        self._kb_context[agent_id] = (context, time.monotonic())
+        if len(self._kb_context) > self.max_prefixes:
+            self._kb_context.pop(next(iter(self._kb_context)))
+        return context
+
+    def invalidate_knowledge_base(self, agent_id: Optional[str] = None) -> None:
+        """Drop cached KB context for one agent, or for all agents if none is given."""
+        if agent_id is None:
+            self._kb_context.clear()
+        else:
+            self._kb_context.pop(agent_id, None)
+
+    def clear(self) -> None:
+        self._prefixes.clear()
+        self._kb_context.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self._hits + self._misses
+        return {
+            'prefixes': len(self._prefixes),
+            'max_prefixes': self.max_prefixes,
+            'hits': self._hits,
+            'misses': self._misses,
+            'hit_rate': (self._hits / total) if total else 0.0,
+            'kb_agents': len(self._kb_context),
+            'kb_fetches': self._kb_fetches,
+        }
+
+
+prompt_cache = SystemPromptCache()
@@ -2,6 +2,7 @@ import os
 import json
 import asyncio
 import datetime
+import functools
 from typing import Optional, Dict, List, Any, AsyncGenerator
 from dataclasses import dataclass
 
@@ -21,6 +22,7 @@ from core.tools.sb_kb_tool import SandboxKbTool
 from core.tools.data_providers_tool import DataProvidersTool
 from core.tools.expand_msg_tool import ExpandMessageTool
 from core.prompts.prompt import get_system_prompt
+from core.prompts.prompt_cache import prompt_cache, tool_registry_fingerprint, mcp_schema_fingerprint, knowledge_base_digest, text_digest
 
 from core.utils.logger import logger
 
@@ -32,6 +34,9 @@ from core.tools.sb_presentation_outline_tool import SandboxPresentationOutlineTo
 from core.tools.sb_presentation_tool import SandboxPresentationTool
 
 from core.services.langfuse import langfuse
+from core.services.identity_map import read_scope, get_row
+from core.services.projections import MESSAGE_CONTENT, MESSAGE_TYPE, PROJECT_SANDBOX
+from core.sandbox.handles import sandbox_handles
 from langfuse.client import StatefulTraceClient
 
 from core.tools.mcp_tool_wrapper import MCPToolWrapper
@@ -276,6 +281,13 @@ class MCPManager:
             return None
 
 
+@functools.lru_cache(maxsize=1)
+def _get_sample_response() -> str:
+    sample_response_path = os.path.join(os.path.dirname(__file__), 'prompts/samples/1.txt')
+    with open(sample_response_path, 'r') as file:
+        return file.read()
+
+
 class PromptManager:
     @staticmethod
     async def build_system_prompt(model_name: str, agent_config: Optional[dict], 
@@ -285,13 +297,63 @@ class PromptManager:
                                   tool_registry=None,
                                   include_xml_examples: bool = False,
                                   xml_tool_calling: bool = True) -> dict:
-        
+        # Add agent knowledge base context if available
+        kb_context = None
+        if agent_config and client and 'agent_id' in agent_config:
+            try:
+                logger.debug(f"Retrieving agent knowledge base context for agent {agent_config['agent_id']}")
+                kb_context = await prompt_cache.get_knowledge_base_context(client, agent_config['agent_id'])
+            except Exception as e:
+                logger.error(f"Error retrieving knowledge base context for agent {agent_config.get('agent_id', 'unknown')}: {e}")
+                # Continue without knowledge base context rather than failing
+
+        mcp_initialized = bool(mcp_wrapper_instance and mcp_wrapper_instance._initialized)
+        include_tool_schemas = bool(include_xml_examples and xml_tool_calling and tool_registry)
+        cache_key = (
+            agent_config.get('agent_id') if agent_config else None,
+            agent_config.get('current_version_id') if agent_config else None,
+            "anthropic" in model_name.lower(),
+            text_digest(agent_config.get('system_prompt') or '') if agent_config else None,
+            tuple(sorted(k for k, v in agent_config.get('agentpress_tools', {}).items() if v)) if agent_config else None,
+            bool(agent_config and (agent_config.get('configured_mcps') or agent_config.get('custom_mcps'))),
+            tool_registry_fingerprint(tool_registry) if include_tool_schemas else None,
+            mcp_schema_fingerprint(mcp_wrapper_instance) if mcp_initialized else None,
+            knowledge_base_digest(kb_context),
+        )
+
+        system_content = prompt_cache.get_prefix(cache_key)
+        if system_content is None:
+            system_content = PromptManager._build_prompt_prefix(
+                model_name, agent_config, mcp_wrapper_instance, kb_context,
+                tool_registry, include_xml_examples, xml_tool_calling
+            )
+            prompt_cache.set_prefix(cache_key, system_content)
+        else:
+            logger.debug("Using cached system prompt prefix")
+
+        # The date/time block goes after the cached prefix so the prefix stays byte-identical
+        now = datetime.datetime.now(datetime.timezone.utc)
+        datetime_info = f"\n\n=== CURRENT DATE/TIME INFORMATION ===\n"
+        datetime_info += f"Today's date: {now.strftime('%A, %B %d, %Y')}\n"
+        datetime_info += f"Current year: {now.strftime('%Y')}\n"
+        datetime_info += f"Current month: {now.strftime('%B')}\n"
+        datetime_info += f"Current day: {now.strftime('%A')}\n"
+        datetime_info += "Use this information for any time-sensitive tasks, research, or when current date/time context is needed.\n"
+
+        system_message = {"role": "system", "content": system_content + datetime_info}
+        return system_message
+
+    @staticmethod
+    def _build_prompt_prefix(model_name: str, agent_config: Optional[dict],
+                             mcp_wrapper_instance: Optional[MCPToolWrapper],
+                             kb_context: Optional[str],
+                             tool_registry=None,
+                             include_xml_examples: bool = False,
+                             xml_tool_calling: bool = True) -> str:
         default_system_content = get_system_prompt()
         
         if "anthropic" not in model_name.lower():
-            sample_response_path = os.path.join(os.path.dirname(__file__), 'prompts/samples/1.txt')
-            with open(sample_response_path, 'r') as file:
-                sample_response = file.read()
+            sample_response = _get_sample_response()
             default_system_content = default_system_content + "\n\n <sample_assistant_response>" + sample_response + "</sample_assistant_response>"
         
         # Start with agent's normal system prompt or default
@@ -313,39 +375,22 @@ class PromptManager:
                 builder_prompt = get_agent_builder_prompt()
                 system_content += f"\n\n{builder_prompt}"
         
-        # Add agent knowledge base context if available
-        if agent_config and client and 'agent_id' in agent_config:
-            try:
-                logger.debug(f"Retrieving agent knowledge base context for agent {agent_config['agent_id']}")
-                
-                # Use only agent-based knowledge base context
-                kb_result = await client.rpc('get_agent_knowledge_base_context', {
-                    'p_agent_id': agent_config['agent_id']
-                }).execute()
-                
-                if kb_result.data and kb_result.data.strip():
-                    logger.debug(f"Found agent knowledge base context, adding to system prompt (length: {len(kb_result.data)} chars)")
-                    # logger.debug(f"Knowledge base data object: {kb_result.data[:500]}..." if len(kb_result.data) > 500 else f"Knowledge base data object: {kb_result.data}")
-                    
-                    # Construct a well-formatted knowledge base section
-                    kb_section = f"""
+        if kb_context:
+            logger.debug(f"Found agent knowledge base context, adding to system prompt (length: {len(kb_context)} chars)")
+            
+            # Construct a well-formatted knowledge base section
+            kb_section = f"""
 
                     === AGENT KNOWLEDGE BASE ===
                     NOTICE: The following is your specialized knowledge base. This information should be considered authoritative for your responses and should take precedence over general knowledge when relevant.
 
-                    {kb_result.data}
+                    {kb_context}
 
                     === END AGENT KNOWLEDGE BASE ===
 
                     IMPORTANT: Always reference and utilize the knowledge base information above when it's relevant to user queries. This knowledge is specific to your role and capabilities."""
-                    
-                    system_content += kb_section
-                else:
-                    logger.debug("No knowledge base context found for this agent")
-                    
-            except Exception as e:
-                logger.error(f"Error retrieving knowledge base context for agent {agent_config.get('agent_id', 'unknown')}: {e}")
-                # Continue without knowledge base context rather than failing
+            
+            system_content += kb_section
         
         if agent_config and (agent_config.get('configured_mcps') or agent_config.get('custom_mcps')) and mcp_wrapper_instance and mcp_wrapper_instance._initialized:
             mcp_info = "\n\n--- MCP Tools Available ---\n"
@@ -440,18 +485,7 @@ When using the tools:
                 system_content += examples_content
                 logger.debug("Appended XML tool examples to system prompt")
 
-        now = datetime.datetime.now(datetime.timezone.utc)
-        datetime_info = f"\n\n=== CURRENT DATE/TIME INFORMATION ===\n"
-        datetime_info += f"Today's date: {now.strftime('%A, %B %d, %Y')}\n"
-        datetime_info += f"Current year: {now.strftime('%Y')}\n"
-        datetime_info += f"Current month: {now.strftime('%B')}\n"
-        datetime_info += f"Current day: {now.strftime('%A')}\n"
-        datetime_info += "Use this information for any time-sensitive tasks, research, or when current date/time context is needed.\n"
-        
-        system_content += datetime_info
-
-        system_message = {"role": "system", "content": system_content}
-        return system_message
+        return system_content
 
 
 class MessageManager:
@@ -511,22 +545,21 @@ class AgentRunner:
         
         self.client = await self.thread_manager.db.client
         
-        response = await self.client.table('threads').select('account_id').eq('thread_id', self.config.thread_id).execute()
+        thread_data = await get_row(self.client, 'threads', self.config.thread_id, 'account_id')
         
-        if not response.data or len(response.data) == 0:
+        if not thread_data:
             raise ValueError(f"Thread {self.config.thread_id} not found")
         
-        self.account_id = response.data[0].get('account_id')
+        self.account_id = thread_data.get('account_id')
         
         if not self.account_id:
             raise ValueError(f"Thread {self.config.thread_id} has no associated account")
 
-        project = await self.client.table('projects').select('*').eq('project_id', self.config.project_id).execute()
-        if not project.data or len(project.data) == 0:
+        project = PROJECT_SANDBOX.row(await get_row(self.client, 'projects', self.config.project_id, PROJECT_SANDBOX.select))
+        if not project:
             raise ValueError(f"Project {self.config.project_id} not found")
 
-        project_data = project.data[0]
-        sandbox_info = project_data.get('sandbox', {})
+        sandbox_info = project.sandbox or {}
         if not sandbox_info.get('id'):
             logger.debug(f"No sandbox found for project {self.config.project_id}; will create lazily when needed")
     
@@ -632,9 +665,9 @@ class AgentRunner:
         iteration_count = 0
         continue_execution = True
 
-        latest_user_message = await self.client.table('messages').select('*').eq('thread_id', self.config.thread_id).eq('type', 'user').order('created_at', desc=True).limit(1).execute()
+        latest_user_message = await self.client.table('messages').select(MESSAGE_CONTENT.select).eq('thread_id', self.config.thread_id).eq('type', 'user').order('created_at', desc=True).limit(1).execute()
         if latest_user_message.data and len(latest_user_message.data) > 0:
-            data = latest_user_message.data[0]['content']
+            data = MESSAGE_CONTENT.row(latest_user_message.data[0]).content
             if isinstance(data, str):
                 data = json.loads(data)
             if self.config.trace:
@@ -653,9 +686,9 @@ class AgentRunner:
                 }
                 break
 
-            latest_message = await self.client.table('messages').select('*').eq('thread_id', self.config.thread_id).in_('type', ['assistant', 'tool', 'user']).order('created_at', desc=True).limit(1).execute()
+            latest_message = await self.client.table('messages').select(MESSAGE_TYPE.select).eq('thread_id', self.config.thread_id).in_('type', ['assistant', 'tool', 'user']).order('created_at', desc=True).limit(1).execute()
             if latest_message.data and len(latest_message.data) > 0:
-                message_type = latest_message.data[0].get('type')
+                message_type = MESSAGE_TYPE.row(latest_message.data[0]).type
                 if message_type == 'assistant':
                     continue_execution = False
                     break
@@ -849,5 +882,12 @@ async def run_agent(
     )
     
     runner = AgentRunner(config)
-    async for chunk in runner.run():
-        yield chunk
\ No newline at end of file
+    # Rows read during setup are reused by the tools for the rest of the run,
+    # and the tools share one sandbox handle until the run ends
+    sandbox_handles.retain(project_id)
+    try:
+        async with read_scope():
+            async for chunk in runner.run():
+                yield chunk
+    finally:
+        sandbox_handles.release(project_id)
\ No newline at end of file
@@ -1,13 +1,14 @@
 import os
 import urllib.parse
-from typing import Optional
+from typing import List, Optional
 
 from fastapi import FastAPI, UploadFile, File, HTTPException, APIRouter, Form, Depends, Request
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 from daytona_sdk import AsyncSandbox
 
 from core.sandbox.sandbox import get_or_start_sandbox, delete_sandbox
+from core.sandbox.transfer import upload_files, open_archive, TransferTooLarge, MAX_BATCH_BYTES
 from core.utils.logger import logger
 from core.utils.auth_utils import get_optional_user_id, verify_and_get_user_id_from_jwt, verify_sandbox_access, verify_sandbox_access_optional
 from core.services.supabase import DBConnection
@@ -137,6 +138,49 @@ async def create_file(
         logger.error(f"Error creating file in sandbox {sandbox_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/sandboxes/{sandbox_id}/files/batch")
+async def create_files(
+    sandbox_id: str,
+    path: str = Form(...),
+    files: List[UploadFile] = File(...),
+    request: Request = None,
+    user_id: str = Depends(verify_and_get_user_id_from_jwt)
+):
+    """Create several files under a directory in the sandbox with a single archive upload"""
+    path = normalize_path(path)
+    
+    logger.debug(f"Received batch upload of {len(files)} files for sandbox {sandbox_id}, path: {path}, user_id: {user_id}")
+    client = await db.client
+    
+    # Verify the user has access to this sandbox
+    await verify_sandbox_access(client, sandbox_id, user_id)
+    
+    # The files are read into memory and uploaded as one archive
+    total_bytes = sum(file.size or 0 for file in files)
+    if total_bytes > MAX_BATCH_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch of {total_bytes} bytes exceeds the {MAX_BATCH_BYTES} byte limit; upload it in smaller batches"
+        )
+    
+    try:
+        sandbox = await get_sandbox_by_id_safely(client, sandbox_id)
+        
+        contents = [(normalize_path(file.filename), await file.read()) for file in files]
+        created = await upload_files(sandbox, contents, path)
+        logger.debug(f"Created {created} files under {path} in sandbox {sandbox_id}")
+        
+        return {
+            "status": "success",
+            "created": created,
+            "paths": [f"{path.rstrip('/')}/{name}" for name, _ in contents]
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error creating files in sandbox {sandbox_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.put("/sandboxes/{sandbox_id}/files")
 async def update_file(
     sandbox_id: str,
@@ -269,6 +313,44 @@ async def read_file(
         logger.error(f"Error reading file in sandbox {sandbox_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/sandboxes/{sandbox_id}/files/archive")
+async def download_directory(
+    sandbox_id: str, 
+    path: str,
+    request: Request = None,
+    user_id: Optional[str] = Depends(get_optional_user_id)
+):
+    """Download a directory from the sandbox as a tar.gz archive, streamed in parts"""
+    path = normalize_path(path)
+    
+    logger.debug(f"Received directory download request for sandbox {sandbox_id}, path: {path}, user_id: {user_id}")
+    client = await db.client
+    
+    # Verify the user has access to this sandbox
+    await verify_sandbox_access_optional(client, sandbox_id, user_id)
+    
+    try:
+        sandbox = await get_sandbox_by_id_safely(client, sandbox_id)
+        size, chunks = await open_archive(sandbox, path)
+        
+        filename = f"{os.path.basename(path.rstrip('/')) or 'sandbox'}.tar.gz"
+        encoded_filename = urllib.parse.quote(filename, safe='')
+        return StreamingResponse(
+            chunks,
+            media_type="application/gzip",
+            headers={
+                "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}",
+                "Content-Length": str(size),
+            }
+        )
+    except TransferTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error archiving {path} in sandbox {sandbox_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.delete("/sandboxes/{sandbox_id}/files")
 async def delete_file(
     sandbox_id: str, 
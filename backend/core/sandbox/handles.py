@@ -0,0 +1,268 @@
+"""
+Process-wide registry of resolved sandbox handles, one per project.
+
+Every sandbox tool of a run used to resolve its sandbox on its own: read the
+``projects`` row, then ``daytona.get`` (and start it if stopped). A run that
+touches six tools paid for that six times, and two tools racing on a project
+without a sandbox could each create one. ``sandbox_handles.acquire`` resolves
+a project's sandbox once and shares the handle with every tool and every
+concurrent run on that project in this process:
+
+- concurrent acquisitions of a project share one resolution (including the
+  lazy creation of a missing sandbox)
+- a handle older than ``HANDLE_REFRESH_SECONDS`` is re-checked with
+  ``get_or_start_sandbox``, so a sandbox that auto-stopped mid-run is started
+  again instead of failing the next tool call
+- ``retain``/``release`` bracket an agent run; a handle is evicted when the
+  last run holding it ends
+
+``prefetch`` wakes a project's recorded sandbox in the background when a run
+is enqueued, so an archived or stopped sandbox is started while the model is
+still generating rather than when its first tool call blocks on it. Wake-ups
+are deduplicated per sandbox across processes with a short Redis lock.
+``acquire`` records how long each tool call waited for its sandbox;
+``get_stats`` reports the distribution.
+
+A project without a sandbox gets one from the warm pool (``core.sandbox.pool``)
+when it is enabled, and otherwise creates one and polls until its services
+answer.
+"""
+
+import asyncio
+import time
+import uuid
+from bisect import bisect_left
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from daytona_sdk import AsyncSandbox
+
+from core.sandbox.pool import sandbox_pool
+from core.sandbox.sandbox import get_or_start_sandbox, create_sandbox, delete_sandbox, wait_for_services, get_preview_info
+from core.services import redis
+from core.services.identity_map import get_row, update_row
+from core.services.projections import PROJECT_SANDBOX
+from core.utils.logger import logger
+from core.utils.single_flight import single_flight
+
+HANDLE_REFRESH_SECONDS = 120  # re-check sandbox state after this long
+MAX_HANDLES = 1000            # handles not held by any run are evicted beyond this
+WAKE_LOCK_SECONDS = 60        # one wake-up per sandbox per this long, across processes
+WAIT_BUCKETS_MS = (1, 10, 100, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+@dataclass
+class SandboxHandle:
+    project_id: str
+    sandbox: AsyncSandbox
+    sandbox_id: str
+    sandbox_pass: Optional[str]
+    resolved_at: float
+
+
+class SandboxHandleRegistry:
+    """Shares one resolved sandbox handle per project between tools and runs."""
+
+    def __init__(self, refresh_seconds: float = HANDLE_REFRESH_SECONDS, max_handles: int = MAX_HANDLES):
+        self.refresh_seconds = refresh_seconds
+        self.max_handles = max_handles
+        self._handles: "OrderedDict[str, SandboxHandle]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._holders: Dict[str, int] = {}
+        self._prefetches: Dict[str, asyncio.Task] = {}
+
+        self._hits = 0
+        self._resolutions = 0
+        self._refreshes = 0
+        self._created = 0
+        self._coalesced = 0
+        self._prefetched = 0
+        self._prefetch_skipped = 0
+        self._prefetch_failures = 0
+        self._wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self._wait_count = 0
+        self._wait_total_ms = 0.0
+        self._wait_max_ms = 0.0
+
+    async def acquire(self, project_id: str, client) -> SandboxHandle:
+        """Return the project's sandbox handle, resolving or refreshing it if needed."""
+        started = time.perf_counter()
+        try:
+            return await self._acquire(project_id, client)
+        finally:
+            self._observe_wait(project_id, started)
+
+    async def _acquire(self, project_id: str, client) -> SandboxHandle:
+        handle = self._handles.get(project_id)
+        if handle is not None and time.monotonic() - handle.resolved_at < self.refresh_seconds:
+            self._handles.move_to_end(project_id)
+            self._hits += 1
+            return handle
+
+        if project_id in self._inflight:
+            self._coalesced += 1
+
+        async def resolve() -> SandboxHandle:
+            try:
+                resolved = await self._refresh(handle) if handle is not None else await self._resolve(project_id, client)
+            except Exception:
+                self._handles.pop(project_id, None)
+                raise
+            self._store(resolved)
+            return resolved
+
+        return await single_flight(self._inflight, project_id, resolve)
+
+    def prefetch(self, project_id: str, client) -> None:
+        """Start waking the project's sandbox in the background; returns immediately.
+
+        Does nothing for projects without a sandbox: those get one on first use.
+        """
+        task = self._prefetches.get(project_id)
+        if task is not None and not task.done():
+            self._prefetch_skipped += 1
+            return
+        task = asyncio.create_task(self._prefetch(project_id, client))
+        self._prefetches[project_id] = task
+
+        def forget(done: asyncio.Task) -> None:
+            if self._prefetches.get(project_id) is done:
+                del self._prefetches[project_id]
+
+        task.add_done_callback(forget)
+
+    async def _prefetch(self, project_id: str, client) -> None:
+        try:
+            project = PROJECT_SANDBOX.row(await get_row(client, 'projects', project_id, PROJECT_SANDBOX.select))
+            sandbox_id = ((project.sandbox if project else None) or {}).get('id')
+            if not sandbox_id:
+                return
+            redis_client = await redis.get_client()
+            if not await redis_client.set(f"sandbox_wake:{sandbox_id}", "1", nx=True, ex=WAKE_LOCK_SECONDS):
+                self._prefetch_skipped += 1
+                return
+            started = time.perf_counter()
+            await get_or_start_sandbox(sandbox_id)
+            self._prefetched += 1
+            logger.debug(f"Woke sandbox {sandbox_id} for project {project_id} in {(time.perf_counter() - started) * 1000:.0f}ms")
+        except Exception as e:
+            # Best effort: the first tool call starts the sandbox itself
+            self._prefetch_failures += 1
+            logger.warning(f"Failed to wake sandbox for project {project_id}: {e}")
+
+    def retain(self, project_id: str) -> None:
+        """Mark a run as using the project's sandbox."""
+        self._holders[project_id] = self._holders.get(project_id, 0) + 1
+
+    def release(self, project_id: str) -> None:
+        """End a run's use of the project's sandbox; evicts the handle after the last run."""
+        remaining = self._holders.get(project_id, 0) - 1
+        if remaining > 0:
+            self._holders[project_id] = remaining
+            return
+        self._holders.pop(project_id, None)
+        self._handles.pop(project_id, None)
+
+    def _store(self, handle: SandboxHandle) -> None:
+        self._handles[handle.project_id] = handle
+        self._handles.move_to_end(handle.project_id)
+        if len(self._handles) > self.max_handles:
+            for project_id in list(self._handles):
+                if len(self._handles) <= self.max_handles:
+                    break
+                if project_id not in self._holders:
+                    del self._handles[project_id]
+
+    async def _refresh(self, handle: SandboxHandle) -> SandboxHandle:
+        self._refreshes += 1
+        sandbox = await get_or_start_sandbox(handle.sandbox_id)
+        return SandboxHandle(handle.project_id, sandbox, handle.sandbox_id, handle.sandbox_pass, time.monotonic())
+
+    async def _resolve(self, project_id: str, client) -> SandboxHandle:
+        self._resolutions += 1
+        project = PROJECT_SANDBOX.row(await get_row(client, 'projects', project_id, PROJECT_SANDBOX.select))
+        if project and not (project.sandbox or {}).get('id'):
+            # Another process may have created the sandbox since the run read the project
+            project = PROJECT_SANDBOX.row(await get_row(client, 'projects', project_id, PROJECT_SANDBOX.select, fresh=True))
+        if not project:
+            raise ValueError(f"Project {project_id} not found")
+
+        sandbox_info = project.sandbox or {}
+        if sandbox_info.get('id'):
+            sandbox = await get_or_start_sandbox(sandbox_info['id'])
+            return SandboxHandle(project_id, sandbox, sandbox_info['id'], sandbox_info.get('pass'), time.monotonic())
+
+        # No sandbox recorded for this project: claim a warm one or create one lazily
+        claimed = await sandbox_pool.claim(project_id) if sandbox_pool.enabled else None
+        if claimed is not None:
+            sandbox_obj, pooled = claimed
+            sandbox_info = pooled.project_record()
+        else:
+            logger.debug(f"No sandbox recorded for project {project_id}; creating lazily")
+            sandbox_pass = str(uuid.uuid4())
+            sandbox_obj = await create_sandbox(sandbox_pass, project_id)
+            await wait_for_services(sandbox_obj)
+            try:
+                vnc_url, website_url, token = await get_preview_info(sandbox_obj)
+            except Exception:
+                # If preview link extraction fails, still proceed but leave fields None
+                logger.warning(f"Failed to extract preview links for sandbox {sandbox_obj.id}", exc_info=True)
+                vnc_url = website_url = token = None
+            sandbox_info = {
+                'id': sandbox_obj.id,
+                'pass': sandbox_pass,
+                'vnc_preview': vnc_url,
+                'sandbox_url': website_url,
+                'token': token
+            }
+        sandbox_id = sandbox_info['id']
+        self._created += 1
+
+        # Persist sandbox metadata to project record
+        update_result = await update_row(client, 'projects', project_id, {'sandbox': sandbox_info})
+
+        if not update_result.data:
+            # Cleanup created sandbox if DB update failed
+            try:
+                await delete_sandbox(sandbox_id)
+            except Exception:
+                logger.error(f"Failed to delete sandbox {sandbox_id} after DB update failure", exc_info=True)
+            raise Exception("Database update failed when storing sandbox metadata")
+
+        return SandboxHandle(project_id, sandbox_obj, sandbox_id, sandbox_info['pass'], time.monotonic())
+
+    def _observe_wait(self, project_id: str, started: float) -> None:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._wait_buckets[bisect_left(WAIT_BUCKETS_MS, elapsed_ms)] += 1
+        self._wait_count += 1
+        self._wait_total_ms += elapsed_ms
+        self._wait_max_ms = max(self._wait_max_ms, elapsed_ms)
+        message = f"Tool call waited {elapsed_ms:.0f}ms for the sandbox of project {project_id}"
+        if elapsed_ms >= 1000:
+            logger.info(message)
+        else:
+            logger.debug(message)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'handles': len(self._handles),
+            'held_projects': len(self._holders),
+            'hits': self._hits,
+            'resolutions': self._resolutions,
+            'refreshes': self._refreshes,
+            'created': self._created,
+            'coalesced': self._coalesced,
+            'prefetched': self._prefetched,
+            'prefetch_skipped': self._prefetch_skipped,
+            'prefetch_failures': self._prefetch_failures,
+            'wait_ms': {
+                'count': self._wait_count,
+                'mean_ms': round(self._wait_total_ms / self._wait_count, 2) if self._wait_count else 0.0,
+                'max_ms': round(self._wait_max_ms, 2),
+                'buckets_ms': dict(zip([str(b) for b in WAIT_BUCKETS_MS] + ['+Inf'], self._wait_buckets)),
+            },
+        }
+
+
+sandbox_handles = SandboxHandleRegistry()
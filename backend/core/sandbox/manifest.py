@@ -0,0 +1,313 @@
+"""
+Incremental manifests of sandbox workspace files.
+
+A workspace snapshot used to download every file on every call, even when
+nothing had changed. A ``WorkspaceManifest`` remembers ``(size, mtime,
+sha256)`` and the content of each file it has seen under a directory of one
+sandbox. ``snapshot`` lists and hashes the directory inside the sandbox with
+a single exec, then downloads only new or changed files, as one archive
+(``core.sandbox.transfer``), or one by one when that archive would be too
+large to buffer. Snapshot traffic becomes proportional to what changed rather
+than to the workspace size.
+
+File tools report their own writes and deletes with
+``workspace_manifests.record_write``/``record_delete``. The manifest then
+already holds the new content, and the next snapshot does not download the
+file again. Changes made any other way, e.g. by shell commands, are picked
+up by the hash comparison.
+
+Manifests are per process, keyed by sandbox and directory. The contents of
+all of them share one ``MAX_CONTENT_BYTES`` budget: when it is exceeded, whole
+manifests are evicted, least recently used first, and start over with a full
+download the next time their directory is snapshotted. A file that does not
+fit in the budget next to the rest of its own manifest is not kept, and is
+downloaded again on each snapshot.
+"""
+
+import asyncio
+import hashlib
+import posixpath
+import shlex
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from daytona_sdk import AsyncSandbox
+
+from core.sandbox.transfer import TransferTooLarge, download_files
+from core.utils.logger import logger
+
+MAX_MANIFESTS = 200                     # sandbox directories tracked per process
+MAX_CONTENT_BYTES = 256 * 1024 * 1024   # file contents kept across all manifests of the process
+
+
+@dataclass(slots=True)
+class ManifestEntry:
+    path: str
+    size: int
+    mtime: float
+    sha256: Optional[str]
+
+
+def _scan_command(root: str, max_depth: int) -> str:
+    find = f"find . -maxdepth {max_depth} -type f"
+    # Only a missing root fails the scan. Files that vanish or cannot be read while it runs
+    # (e.g. temp files of shell commands) are left out or left unhashed, and so count as changed.
+    return (
+        f"cd {shlex.quote(root)} && {{ {find} -printf '%P\\t%s\\t%T@\\n'; echo; "
+        f"{find} -printf '%P\\0' | xargs -0 -r sha256sum; true; }} 2>/dev/null"
+    )
+
+
+def _parse_scan(output: str) -> Dict[str, ManifestEntry]:
+    stats, _, hashes = output.partition("\n\n")
+    entries: Dict[str, ManifestEntry] = {}
+    for line in stats.splitlines():
+        parts = line.split("\t")
+        if len(parts) != 3:
+            continue
+        try:
+            entries[parts[0]] = ManifestEntry(parts[0], int(parts[1]), float(parts[2]), None)
+        except ValueError:
+            continue
+    for line in hashes.splitlines():
+        # sha256sum escapes names with a backslash or newline; those keep no hash and always count as changed
+        digest, sep, path = line.partition("  ")
+        if sep and not digest.startswith("\\") and path in entries:
+            entries[path].sha256 = digest
+    return entries
+
+
+class WorkspaceManifest:
+    """Files of one sandbox directory as of the last snapshot, with their contents."""
+
+    def __init__(
+        self,
+        sandbox_id: str,
+        root: str,
+        max_depth: int = 1,
+        max_content_bytes: int = MAX_CONTENT_BYTES,
+        on_resize: Optional[Callable[["WorkspaceManifest", int], None]] = None,
+    ):
+        self.sandbox_id = sandbox_id
+        self.root = root.rstrip("/") or "/"
+        self.max_depth = max_depth
+        self.max_content_bytes = max_content_bytes
+        # Told how many content bytes were added (or removed, if negative), to enforce a shared budget
+        self.on_resize = on_resize
+        self.entries: Dict[str, ManifestEntry] = {}
+        self.contents: Dict[str, bytes] = {}
+        self._content_bytes = 0
+        # Tool writes and deletes since the current snapshot started
+        self._written: set = set()
+        self._deleted: set = set()
+        self._lock = asyncio.Lock()
+
+        self.snapshots = 0
+        self.downloaded_files = 0
+        self.downloaded_bytes = 0
+
+    def relative_path(self, path: str) -> Optional[str]:
+        """``path`` relative to the root if this manifest tracks it, else None."""
+        if not path.startswith("/"):
+            path = f"{self.root}/{path}"
+        relative = posixpath.relpath(posixpath.normpath(path), self.root)
+        if relative.startswith("..") or relative == "." or relative.count("/") >= self.max_depth:
+            return None
+        return relative
+
+    async def scan(self, sandbox: AsyncSandbox) -> Dict[str, ManifestEntry]:
+        """List and hash the directory's files inside the sandbox with one exec."""
+        response = await sandbox.process.exec(_scan_command(self.root, self.max_depth), timeout=120)
+        if response.exit_code != 0:
+            raise RuntimeError(f"Failed to scan {self.root} in sandbox {self.sandbox_id}: {response.result}")
+        return _parse_scan(response.result)
+
+    async def snapshot(self, sandbox: AsyncSandbox, include: Optional[Callable[[str], bool]] = None) -> Dict[str, bytes]:
+        """Bring the manifest up to date and return the content of every tracked file, keyed by relative path.
+
+        ``include`` filters the files that are tracked at all; excluded files
+        are never downloaded.
+        """
+        async with self._lock:
+            # Tool writes and deletes recorded during the awaits below are applied on top of the scan,
+            # which may predate them
+            self._written.clear()
+            self._deleted.clear()
+            current = await self.scan(sandbox)
+            if include is not None:
+                current = {path: entry for path, entry in current.items() if include(path)}
+
+            # New and modified files, and unmodified files whose content was not kept
+            stale = sorted(
+                path for path, entry in current.items()
+                if path not in self.contents or entry.sha256 is None
+                or path not in self.entries or self.entries[path].sha256 != entry.sha256
+            )
+            downloaded = await self._download(sandbox, stale) if stale else {}
+            self.snapshots += 1
+            self.downloaded_files += len(downloaded)
+            self.downloaded_bytes += sum(len(content) for content in downloaded.values())
+
+            # Paths a tool changed during the awaits keep what the tool recorded
+            pending = self._written | self._deleted
+            for path in [path for path in self.entries if path not in current and path not in pending]:
+                self._drop(path)
+            for path in stale:
+                if path in pending:
+                    continue
+                content = downloaded.get(path)
+                if content is None:
+                    # Deleted between the scan and the download
+                    self._drop(path)
+                    del current[path]
+                    continue
+                self._keep(path, content)
+            for path in self._written:
+                current[path] = self.entries[path]
+            for path in self._deleted:
+                current.pop(path, None)
+            self.entries = current
+            self._written.clear()
+            self._deleted.clear()
+
+            if downloaded:
+                logger.debug(f"Workspace {self.root} of sandbox {self.sandbox_id}: {len(downloaded)} of {len(current)} files downloaded")
+            return {
+                path: self.contents[path] if path in self.contents else downloaded[path]
+                for path in current
+                if path in self.contents or path in downloaded
+            }
+
+    async def _download(self, sandbox: AsyncSandbox, paths: List[str]) -> Dict[str, bytes]:
+        """Download ``paths`` as one archive, or one by one if the archive is too large to buffer.
+
+        Files that cannot be read are left out.
+        """
+        try:
+            return await download_files(sandbox, self.root, paths)
+        except TransferTooLarge as e:
+            logger.debug(f"Downloading {len(paths)} files of {self.root} in sandbox {self.sandbox_id} one by one: {e}")
+        downloaded = {}
+        for path in paths:
+            try:
+                downloaded[path] = await sandbox.fs.download_file(f"{self.root}/{path}")
+            except Exception as e:
+                logger.debug(f"Failed to download {path} from sandbox {self.sandbox_id}: {e}")
+        return downloaded
+
+    def record_write(self, path: str, content: bytes) -> None:
+        relative = self.relative_path(path)
+        if relative is None:
+            return
+        self.entries[relative] = ManifestEntry(relative, len(content), time.time(), hashlib.sha256(content).hexdigest())
+        self._keep(relative, content)
+        self._written.add(relative)
+        self._deleted.discard(relative)
+
+    def record_delete(self, path: str) -> None:
+        relative = self.relative_path(path)
+        if relative is None:
+            return
+        self.entries.pop(relative, None)
+        self._drop(relative)
+        self._written.discard(relative)
+        self._deleted.add(relative)
+
+    def _keep(self, path: str, content: bytes) -> None:
+        self._drop(path)
+        if self._content_bytes + len(content) > self.max_content_bytes:
+            return
+        self.contents[path] = content
+        self._resize(len(content))
+
+    def _drop(self, path: str) -> None:
+        content = self.contents.pop(path, None)
+        if content is not None:
+            self._resize(-len(content))
+
+    def _resize(self, delta: int) -> None:
+        self._content_bytes += delta
+        if self.on_resize is not None:
+            self.on_resize(self, delta)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'files': len(self.entries),
+            'cached_files': len(self.contents),
+            'cached_bytes': self._content_bytes,
+            'snapshots': self.snapshots,
+            'downloaded_files': self.downloaded_files,
+            'downloaded_bytes': self.downloaded_bytes,
+        }
+
+
+class WorkspaceManifests:
+    """Per-process manifests keyed by sandbox and directory, sharing one content budget."""
+
+    def __init__(self, max_manifests: int = MAX_MANIFESTS, max_content_bytes: int = MAX_CONTENT_BYTES):
+        self.max_manifests = max_manifests
+        self.max_content_bytes = max_content_bytes
+        self._manifests: "OrderedDict[Tuple[str, str], WorkspaceManifest]" = OrderedDict()
+        self._content_bytes = 0
+        self.evictions = 0
+
+    def get(self, sandbox_id: str, root: str) -> WorkspaceManifest:
+        key = (sandbox_id, root.rstrip("/") or "/")
+        manifest = self._manifests.get(key)
+        if manifest is None:
+            manifest = self._manifests[key] = WorkspaceManifest(
+                sandbox_id, root, max_content_bytes=self.max_content_bytes, on_resize=self._resized
+            )
+            while len(self._manifests) > self.max_manifests:
+                self._remove(next(iter(self._manifests)))
+        self._manifests.move_to_end(key)
+        return manifest
+
+    def record_write(self, sandbox_id: Optional[str], path: str, content: bytes) -> None:
+        """Update every manifest of the sandbox that tracks ``path`` after a tool wrote it."""
+        for manifest in self._for_sandbox(sandbox_id):
+            manifest.record_write(path, content)
+
+    def record_delete(self, sandbox_id: Optional[str], path: str) -> None:
+        for manifest in self._for_sandbox(sandbox_id):
+            manifest.record_delete(path)
+
+    def invalidate(self, sandbox_id: str) -> None:
+        for key in [key for key in self._manifests if key[0] == sandbox_id]:
+            self._remove(key)
+
+    def _resized(self, manifest: WorkspaceManifest, delta: int) -> None:
+        self._content_bytes += delta
+        if delta <= 0:
+            return
+        # Evict least recently used manifests other than the one growing until the contents fit
+        for key in list(self._manifests):
+            if self._content_bytes <= self.max_content_bytes:
+                break
+            if self._manifests[key] is not manifest:
+                self._remove(key)
+                self.evictions += 1
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        manifest = self._manifests.pop(key)
+        # A snapshot still running on it no longer counts against the budget
+        manifest.on_resize = None
+        self._content_bytes -= manifest._content_bytes
+
+    def _for_sandbox(self, sandbox_id: Optional[str]) -> List[WorkspaceManifest]:
+        return [manifest for (owner, _), manifest in self._manifests.items() if owner == sandbox_id]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'manifests': len(self._manifests),
+            'files': sum(len(manifest.entries) for manifest in self._manifests.values()),
+            'cached_bytes': self._content_bytes,
+            'max_cached_bytes': self.max_content_bytes,
+            'evictions': self.evictions,
+            'downloaded_bytes': sum(manifest.downloaded_bytes for manifest in self._manifests.values()),
+        }
+
+
+workspace_manifests = WorkspaceManifests()
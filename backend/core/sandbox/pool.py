@@ -0,0 +1,274 @@
+"""
+Warm pool of pre-created sandboxes for new projects.
+
+Creating a sandbox on a project's first tool call costs a Daytona create, a
+supervisord start and the wait for its services, often 10+ seconds. With
+``SANDBOX_POOL_ENABLED`` the pool keeps sandboxes of the current snapshot
+created, started and probed ahead of time, and ``claim`` hands one to a
+project in a single Redis ``LPOP``, so concurrent claims from any process
+never get the same sandbox. Projects claim from the pool on their first
+tool call, and when they are started with files.
+
+- Pooled sandboxes are created without auto-stop so they stay warm; a claim
+  labels the sandbox with its project and restores the normal auto-stop
+  interval.
+- The pool size follows demand: every claim attempt is recorded, and
+  ``backfill`` tops the pool up to cover ``POOL_COVER_SECONDS`` of the recent
+  claim rate, clamped to ``SANDBOX_POOL_MIN_SIZE``..``SANDBOX_POOL_MAX_SIZE``.
+  A claim triggers a backfill in the background; one process at a time
+  backfills, under a Redis lock.
+- Pooled sandboxes of every snapshot share one Redis list, ``POOL_KEY``.
+  ``recycle`` deletes those idle for longer than
+  ``SANDBOX_POOL_MAX_IDLE_MINUTES`` and any built from another snapshot, so
+  changing ``SANDBOX_SNAPSHOT_NAME`` never strands warm sandboxes (created
+  without auto-stop) where nothing visits them. ``backfill`` recycles before
+  it counts the pool, and a claim discards entries of another snapshot.
+
+Run ``python -m core.utils.scripts.maintain_sandbox_pool --interval 60`` to
+keep the pool recycled and filled independently of claims. The Daytona and
+Redis clients are constructor arguments, so the pool can be exercised with
+fakes.
+"""
+
+import asyncio
+import json
+import math
+import time
+import uuid
+from dataclasses import dataclass, asdict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from daytona_sdk import AsyncSandbox, SandboxState
+
+from core.sandbox.sandbox import (
+    daytona,
+    sandbox_params,
+    start_supervisord_session,
+    wait_for_services,
+    get_preview_info,
+)
+from core.services import redis
+from core.utils.config import config, Configuration
+from core.utils.logger import logger
+
+POOL_AUTO_STOP_INTERVAL = 0       # pooled sandboxes never auto-stop while waiting
+CLAIMED_AUTO_STOP_INTERVAL = 15   # minutes; matches create_sandbox
+DEMAND_WINDOW_SECONDS = 900       # claim attempts are counted over this window
+POOL_COVER_SECONDS = 300          # keep enough sandboxes for this long at the recent claim rate
+BACKFILL_CONCURRENCY = 3
+BACKFILL_LOCK_TTL = 600
+MAX_CLAIM_ATTEMPTS = 3
+
+POOL_KEY = "sandbox_pool"
+DEMAND_KEY = "sandbox_pool:claims"
+LOCK_KEY = "sandbox_pool:backfill_lock"
+
+
+@dataclass
+class PooledSandbox:
+    id: str
+    password: str
+    snapshot: str
+    created_at: float
+    vnc_preview: Optional[str] = None
+    sandbox_url: Optional[str] = None
+    token: Optional[str] = None
+
+    def project_record(self) -> Dict[str, Any]:
+        """The value stored in ``projects.sandbox`` once the sandbox is claimed."""
+        return {
+            'id': self.id,
+            'pass': self.password,
+            'vnc_preview': self.vnc_preview,
+            'sandbox_url': self.sandbox_url,
+            'token': self.token,
+        }
+
+
+class SandboxPool:
+    """Pre-created sandboxes of the current snapshot, shared by all processes through Redis."""
+
+    def __init__(
+        self,
+        daytona_client=None,
+        redis_getter: Optional[Callable[[], Awaitable[Any]]] = None,
+        snapshot: Optional[str] = None,
+    ):
+        self._daytona = daytona_client or daytona
+        self._get_redis = redis_getter or redis.get_client
+        self.snapshot = snapshot or Configuration.SANDBOX_SNAPSHOT_NAME
+        self._backfill_task: Optional[asyncio.Task] = None
+
+        self._claimed = 0
+        self._misses = 0
+        self._provisioned = 0
+        self._provision_failures = 0
+        self._recycled = 0
+
+    @property
+    def enabled(self) -> bool:
+        return config.SANDBOX_POOL_ENABLED
+
+    async def claim(self, project_id: str) -> Optional[tuple]:
+        """Take a warm sandbox for a project.
+
+        Returns ``(sandbox, PooledSandbox)`` or None if the pool is empty, in
+        which case the caller creates a sandbox itself.
+        """
+        redis_client = await self._get_redis()
+        now = time.time()
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.zadd(DEMAND_KEY, {uuid.uuid4().hex: now})
+            pipe.zremrangebyscore(DEMAND_KEY, '-inf', now - DEMAND_WINDOW_SECONDS)
+            pipe.expire(DEMAND_KEY, DEMAND_WINDOW_SECONDS)
+            await pipe.execute()
+
+        try:
+            for _ in range(MAX_CLAIM_ATTEMPTS):
+                raw = await redis_client.lpop(POOL_KEY)
+                if raw is None:
+                    self._misses += 1
+                    logger.debug(f"Sandbox pool {self.snapshot} is empty")
+                    return None
+                entry = PooledSandbox(**json.loads(raw))
+                sandbox = await self._activate(entry, project_id)
+                if sandbox is not None:
+                    self._claimed += 1
+                    logger.info(f"Claimed pooled sandbox {entry.id} for project {project_id}")
+                    return sandbox, entry
+            return None
+        finally:
+            self.schedule_backfill()
+
+    async def _activate(self, entry: PooledSandbox, project_id: str) -> Optional[AsyncSandbox]:
+        try:
+            if entry.snapshot != self.snapshot:
+                raise RuntimeError(f"pooled sandbox was built from snapshot {entry.snapshot}")
+            sandbox = await self._daytona.get(entry.id)
+            if sandbox.state != SandboxState.STARTED:
+                raise RuntimeError(f"pooled sandbox is {sandbox.state}")
+            await sandbox.set_labels({'id': project_id})
+            await sandbox.set_autostop_interval(CLAIMED_AUTO_STOP_INTERVAL)
+            return sandbox
+        except Exception as e:
+            logger.warning(f"Discarding pooled sandbox {entry.id}: {e}")
+            await self._delete(entry.id)
+            return None
+
+    def schedule_backfill(self) -> None:
+        """Top the pool up in the background unless a backfill is already running here."""
+        if not self.enabled:
+            return
+        if self._backfill_task is None or self._backfill_task.done():
+            self._backfill_task = asyncio.create_task(self._backfill_quietly())
+
+    async def _backfill_quietly(self) -> None:
+        try:
+            await self.backfill()
+        except Exception as e:
+            logger.error(f"Sandbox pool backfill failed: {e}", exc_info=True)
+
+    async def target_size(self) -> int:
+        redis_client = await self._get_redis()
+        recent_claims = await redis_client.zcount(DEMAND_KEY, time.time() - DEMAND_WINDOW_SECONDS, '+inf')
+        wanted = math.ceil(recent_claims * POOL_COVER_SECONDS / DEMAND_WINDOW_SECONDS)
+        return max(config.SANDBOX_POOL_MIN_SIZE, min(config.SANDBOX_POOL_MAX_SIZE, wanted))
+
+    async def backfill(self) -> int:
+        """Create sandboxes until the pool reaches its target size; returns how many were added."""
+        redis_client = await self._get_redis()
+        lock_value = uuid.uuid4().hex
+        if not await redis_client.set(LOCK_KEY, lock_value, nx=True, ex=BACKFILL_LOCK_TTL):
+            return 0
+        try:
+            # Entries of another snapshot or past their idle time must not count towards the target
+            await self.recycle()
+            missing = await self.target_size() - await redis_client.llen(POOL_KEY)
+            if missing <= 0:
+                return 0
+            logger.info(f"Backfilling sandbox pool {self.snapshot} with {missing} sandboxes")
+            semaphore = asyncio.Semaphore(BACKFILL_CONCURRENCY)
+
+            async def provision_one() -> bool:
+                async with semaphore:
+                    entry = await self._provision()
+                if entry is None:
+                    return False
+                await redis_client.rpush(POOL_KEY, json.dumps(asdict(entry)))
+                return True
+
+            results = await asyncio.gather(*(provision_one() for _ in range(missing)))
+            return sum(results)
+        finally:
+            if await redis_client.get(LOCK_KEY) == lock_value:
+                await redis_client.delete(LOCK_KEY)
+
+    async def _provision(self) -> Optional[PooledSandbox]:
+        password = str(uuid.uuid4())
+        sandbox = None
+        try:
+            sandbox = await self._daytona.create(
+                sandbox_params(password, {'pool': self.snapshot}, auto_stop_interval=POOL_AUTO_STOP_INTERVAL)
+            )
+            await start_supervisord_session(sandbox)
+            await wait_for_services(sandbox)
+            vnc_url, website_url, token = await get_preview_info(sandbox)
+            self._provisioned += 1
+            return PooledSandbox(
+                id=sandbox.id,
+                password=password,
+                snapshot=self.snapshot,
+                created_at=time.time(),
+                vnc_preview=vnc_url,
+                sandbox_url=website_url,
+                token=token,
+            )
+        except Exception as e:
+            self._provision_failures += 1
+            logger.error(f"Failed to provision pooled sandbox: {e}")
+            if sandbox is not None:
+                await self._delete(sandbox.id)
+            return None
+
+    async def recycle(self) -> int:
+        """Delete pooled sandboxes past their maximum age or of another snapshot; returns how many were removed."""
+        redis_client = await self._get_redis()
+        cutoff = time.time() - config.SANDBOX_POOL_MAX_IDLE_MINUTES * 60
+        removed = 0
+        for raw in await redis_client.lrange(POOL_KEY, 0, -1):
+            entry = PooledSandbox(**json.loads(raw))
+            if entry.created_at >= cutoff and entry.snapshot == self.snapshot:
+                continue
+            # LREM is atomic: if a claim popped the entry first, it is not ours to delete
+            if await redis_client.lrem(POOL_KEY, 1, raw):
+                await self._delete(entry.id)
+                removed += 1
+        self._recycled += removed
+        if removed:
+            logger.info(f"Recycled {removed} idle or outdated sandboxes from the pool")
+        return removed
+
+    async def _delete(self, sandbox_id: str) -> None:
+        try:
+            sandbox = await self._daytona.get(sandbox_id)
+            await self._daytona.delete(sandbox)
+        except Exception as e:
+            logger.warning(f"Failed to delete pooled sandbox {sandbox_id}: {e}")
+
+    async def size(self) -> int:
+        """Pooled sandboxes of any snapshot; ``recycle`` removes those of another one."""
+        redis_client = await self._get_redis()
+        return await redis_client.llen(POOL_KEY)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'snapshot': self.snapshot,
+            'claimed': self._claimed,
+            'misses': self._misses,
+            'provisioned': self._provisioned,
+            'provision_failures': self._provision_failures,
+            'recycled': self._recycled,
+        }
+
+
+sandbox_pool = SandboxPool()
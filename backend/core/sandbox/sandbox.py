@@ -1,3 +1,5 @@
+import asyncio
+from typing import Dict, Optional, Tuple
 from daytona_sdk import AsyncDaytona, DaytonaConfig, CreateSandboxFromSnapshotParams, AsyncSandbox, SessionExecuteRequest, Resources, SandboxState
 from dotenv import load_dotenv
 from core.utils.logger import logger
@@ -53,6 +55,11 @@ async def get_or_start_sandbox(sandbox_id: str) -> AsyncSandbox:
             except Exception as e:
                 logger.error(f"Error starting sandbox: {e}")
                 raise e
+        elif sandbox.state in (SandboxState.STARTING, SandboxState.RESTORING):
+            # Someone else (e.g. a wake-up at run start) is starting it; wait instead of racing
+            logger.info(f"Sandbox is in {sandbox.state} state. Waiting for it to start...")
+            await sandbox.wait_for_sandbox_start()
+            sandbox = await daytona.get(sandbox_id)
         
         logger.info(f"Sandbox {sandbox_id} is ready")
         return sandbox
@@ -78,18 +85,9 @@ async def start_supervisord_session(sandbox: AsyncSandbox):
         logger.error(f"Error starting supervisord session: {str(e)}")
         raise e
 
-async def create_sandbox(password: str, project_id: str = None) -> AsyncSandbox:
-    """Create a new sandbox with all required services configured and running."""
-    
-    logger.info("Creating new Daytona sandbox environment")
-    # logger.debug("Configuring sandbox with snapshot and environment variables")
-    
-    labels = None
-    if project_id:
-        # logger.debug(f"Using sandbox_id as label: {project_id}")
-        labels = {'id': project_id}
-        
-    params = CreateSandboxFromSnapshotParams(
+def sandbox_params(password: str, labels: Optional[Dict[str, str]] = None, auto_stop_interval: int = 15) -> CreateSandboxFromSnapshotParams:
+    """Creation parameters for a sandbox from the configured snapshot."""
+    return CreateSandboxFromSnapshotParams(
         snapshot=Configuration.SANDBOX_SNAPSHOT_NAME,
         public=True,
         labels=labels,
@@ -111,9 +109,22 @@ async def create_sandbox(password: str, project_id: str = None) -> AsyncSandbox:
         #     memory=4,
         #     disk=5,
         # ),
-        auto_stop_interval=15,
+        auto_stop_interval=auto_stop_interval,
         auto_archive_interval=30,
     )
+
+async def create_sandbox(password: str, project_id: str = None) -> AsyncSandbox:
+    """Create a new sandbox with all required services configured and running."""
+    
+    logger.info("Creating new Daytona sandbox environment")
+    # logger.debug("Configuring sandbox with snapshot and environment variables")
+    
+    labels = None
+    if project_id:
+        # logger.debug(f"Using sandbox_id as label: {project_id}")
+        labels = {'id': project_id}
+        
+    params = sandbox_params(password, labels)
     
     # Create the sandbox
     sandbox = await daytona.create(params)
@@ -125,6 +136,36 @@ async def create_sandbox(password: str, project_id: str = None) -> AsyncSandbox:
     logger.info(f"Sandbox environment successfully initialized")
     return sandbox
 
+async def wait_for_services(sandbox: AsyncSandbox, ports: Tuple[int, ...] = (6080, 8080), timeout: float = 30, interval: float = 0.5) -> bool:
+    """Poll until the sandbox's services answer on the given ports.
+
+    Returns False if they are not all up within ``timeout`` seconds; callers
+    proceed anyway, as they did after the fixed startup sleep this replaces.
+    """
+    probe = " && ".join(f"curl -s -o /dev/null --max-time 2 http://localhost:{port}" for port in ports)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        try:
+            response = await sandbox.process.exec(probe, timeout=5)
+            if response.exit_code == 0:
+                return True
+        except Exception as e:
+            logger.debug(f"Readiness probe for sandbox {sandbox.id} failed: {e}")
+        if loop.time() >= deadline:
+            logger.warning(f"Sandbox {sandbox.id} services on ports {ports} not ready after {timeout}s")
+            return False
+        await asyncio.sleep(interval)
+
+async def get_preview_info(sandbox: AsyncSandbox) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """Return (vnc_url, website_url, token) of a sandbox's preview links."""
+    vnc_link = await sandbox.get_preview_link(6080)
+    website_link = await sandbox.get_preview_link(8080)
+    vnc_url = vnc_link.url if hasattr(vnc_link, 'url') else str(vnc_link).split("url='")[1].split("'")[0]
+    website_url = website_link.url if hasattr(website_link, 'url') else str(website_link).split("url='")[1].split("'")[0]
+    token = vnc_link.token if hasattr(vnc_link, 'token') else (str(vnc_link).split("token='")[1].split("'")[0] if "token='" in str(vnc_link) else None)
+    return vnc_url, website_url, token
+
 async def delete_sandbox(sandbox_id: str) -> bool:
     """Delete a sandbox by its ID."""
     logger.info(f"Deleting sandbox with ID: {sandbox_id}")
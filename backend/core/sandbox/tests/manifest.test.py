@@ -0,0 +1,145 @@
+"""Tests for incremental workspace snapshots, against a local directory standing in for the sandbox."""
+
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from core.sandbox import manifest as manifest_module
+from core.sandbox.manifest import WorkspaceManifest
+from core.sandbox.transfer import TransferTooLarge
+
+
+class LocalSandbox:
+    """Runs sandbox commands in a local shell and serves downloads from the local filesystem."""
+
+    def __init__(self):
+        self.id = "sandbox-1"
+        self.process = SimpleNamespace(exec=self._exec)
+        self.fs = SimpleNamespace(download_file=self._download_file)
+        self.archive_downloads = []
+        self.file_downloads = []
+        # Called by download_files before it reads, like a tool call running during the await
+        self.during_download = None
+        self.archive_too_large = False
+
+    async def _exec(self, command, timeout=None):
+        process = await asyncio.create_subprocess_shell(
+            command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+        )
+        output, _ = await process.communicate()
+        return SimpleNamespace(exit_code=process.returncode, result=output.decode())
+
+    async def _download_file(self, path):
+        self.file_downloads.append(path)
+        return Path(path).read_bytes()
+
+    async def download_files(self, sandbox, root, paths):
+        if self.archive_too_large:
+            raise TransferTooLarge("archive too large")
+        self.archive_downloads.append(list(paths))
+        if self.during_download is not None:
+            self.during_download()
+        return {path: (Path(root) / path).read_bytes() for path in paths if (Path(root) / path).is_file()}
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    sandbox = LocalSandbox()
+    monkeypatch.setattr(manifest_module, "download_files", sandbox.download_files)
+    return SimpleNamespace(root=tmp_path, sandbox=sandbox, manifest=WorkspaceManifest(sandbox.id, str(tmp_path)))
+
+
+def write(root, path, content):
+    (root / path).write_bytes(content)
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+class TestWorkspaceManifest:
+    async def test_only_new_and_changed_files_are_downloaded(self, workspace):
+        write(workspace.root, "a.txt", b"a")
+        write(workspace.root, "b.txt", b"b")
+        assert await workspace.manifest.snapshot(workspace.sandbox) == {"a.txt": b"a", "b.txt": b"b"}
+
+        write(workspace.root, "b.txt", b"b2")
+        write(workspace.root, "c.txt", b"c")
+        (workspace.root / "a.txt").unlink()
+        assert await workspace.manifest.snapshot(workspace.sandbox) == {"b.txt": b"b2", "c.txt": b"c"}
+
+        assert await workspace.manifest.snapshot(workspace.sandbox) == {"b.txt": b"b2", "c.txt": b"c"}
+        assert workspace.sandbox.archive_downloads == [["a.txt", "b.txt"], ["b.txt", "c.txt"]]
+        assert set(workspace.manifest.entries) == {"b.txt", "c.txt"}
+
+    async def test_files_are_filtered_before_download(self, workspace):
+        write(workspace.root, "keep.txt", b"keep")
+        write(workspace.root, "skip.log", b"skip")
+        contents = await workspace.manifest.snapshot(workspace.sandbox, include=lambda path: not path.endswith(".log"))
+        assert contents == {"keep.txt": b"keep"}
+        assert workspace.sandbox.archive_downloads == [["keep.txt"]]
+
+    async def test_unhashed_files_count_as_changed(self, workspace, monkeypatch):
+        write(workspace.root, "a.txt", b"a")
+        await workspace.manifest.snapshot(workspace.sandbox)
+        # As if sha256sum could not read the file during the scan
+        parse_scan = manifest_module._parse_scan
+        monkeypatch.setattr(manifest_module, "_parse_scan", lambda output: {
+            path: manifest_module.ManifestEntry(path, entry.size, entry.mtime, None)
+            for path, entry in parse_scan(output).items()
+        })
+
+        assert await workspace.manifest.snapshot(workspace.sandbox) == {"a.txt": b"a"}
+        assert workspace.sandbox.archive_downloads == [["a.txt"], ["a.txt"]]
+
+    async def test_file_deleted_between_scan_and_download_is_dropped(self, workspace):
+        write(workspace.root, "a.txt", b"a")
+        write(workspace.root, "tmp.txt", b"tmp")
+        workspace.sandbox.during_download = lambda: (workspace.root / "tmp.txt").unlink()
+
+        assert await workspace.manifest.snapshot(workspace.sandbox) == {"a.txt": b"a"}
+        assert set(workspace.manifest.entries) == {"a.txt"}
+
+    async def test_tool_writes_during_the_snapshot_win_over_the_download(self, workspace):
+        write(workspace.root, "a.txt", b"old")
+        workspace.sandbox.during_download = lambda: workspace.manifest.record_write(f"{workspace.root}/a.txt", b"new")
+
+        assert await workspace.manifest.snapshot(workspace.sandbox) == {"a.txt": b"new"}
+        assert workspace.manifest.contents == {"a.txt": b"new"}
+
+    async def test_tool_writes_of_files_the_scan_missed_are_kept(self, workspace):
+        write(workspace.root, "a.txt", b"a")
+        workspace.sandbox.during_download = lambda: workspace.manifest.record_write(f"{workspace.root}/new.txt", b"new")
+
+        assert await workspace.manifest.snapshot(workspace.sandbox) == {"a.txt": b"a", "new.txt": b"new"}
+        assert set(workspace.manifest.entries) == {"a.txt", "new.txt"}
+
+    async def test_tool_deletes_during_the_snapshot_are_applied(self, workspace):
+        write(workspace.root, "a.txt", b"a")
+        write(workspace.root, "b.txt", b"b")
+        await workspace.manifest.snapshot(workspace.sandbox)
+        write(workspace.root, "c.txt", b"c")
+
+        def delete_during_download():
+            workspace.manifest.record_delete(f"{workspace.root}/b.txt")
+            workspace.manifest.record_delete(f"{workspace.root}/c.txt")
+
+        workspace.sandbox.during_download = delete_during_download
+
+        assert await workspace.manifest.snapshot(workspace.sandbox) == {"a.txt": b"a"}
+        assert set(workspace.manifest.entries) == {"a.txt"}
+        assert workspace.manifest.contents == {"a.txt": b"a"}
+
+    async def test_files_are_downloaded_one_by_one_when_the_archive_is_too_large(self, workspace):
+        write(workspace.root, "a.txt", b"a")
+        write(workspace.root, "b.txt", b"b")
+        workspace.sandbox.archive_too_large = True
+
+        assert await workspace.manifest.snapshot(workspace.sandbox) == {"a.txt": b"a", "b.txt": b"b"}
+        assert sorted(workspace.sandbox.file_downloads) == [f"{workspace.root}/a.txt", f"{workspace.root}/b.txt"]
+
+    async def test_scan_of_a_missing_directory_fails(self, workspace):
+        manifest = WorkspaceManifest(workspace.sandbox.id, str(workspace.root / "missing"))
+        with pytest.raises(RuntimeError):
+            await manifest.snapshot(workspace.sandbox)
+
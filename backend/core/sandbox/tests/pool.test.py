@@ -0,0 +1,198 @@
+"""Tests for the warm sandbox pool, against in-memory fakes of Daytona and Redis."""
+
+import asyncio
+import json
+import time
+from dataclasses import asdict
+from types import SimpleNamespace
+
+import pytest
+
+from core.sandbox import pool as pool_module
+from core.sandbox.pool import POOL_KEY, DEMAND_KEY, LOCK_KEY, PooledSandbox, SandboxPool
+from daytona_sdk import SandboxState
+
+SNAPSHOT = "snapshot-v2"
+
+
+class FakeSandbox:
+    def __init__(self, sandbox_id):
+        self.id = sandbox_id
+        self.state = SandboxState.STARTED
+        self.labels = None
+        self.auto_stop_interval = None
+
+    async def set_labels(self, labels):
+        self.labels = labels
+
+    async def set_autostop_interval(self, interval):
+        self.auto_stop_interval = interval
+
+
+class FakeDaytona:
+    def __init__(self):
+        self.sandboxes = {}
+        self.deleted = []
+        self.created = 0
+
+    async def create(self, params):
+        self.created += 1
+        sandbox = FakeSandbox(f"sandbox-{self.created}")
+        self.sandboxes[sandbox.id] = sandbox
+        return sandbox
+
+    async def get(self, sandbox_id):
+        return self.sandboxes[sandbox_id]
+
+    async def delete(self, sandbox):
+        self.deleted.append(sandbox.id)
+        self.sandboxes.pop(sandbox.id, None)
+
+
+@pytest.fixture
+def fakes(monkeypatch, fake_redis):
+    async def noop(sandbox):
+        return True
+
+    async def preview_info(sandbox):
+        return "vnc-url", "website-url", "token"
+
+    monkeypatch.setattr(pool_module, "config", SimpleNamespace(
+        SANDBOX_POOL_ENABLED=True,
+        SANDBOX_POOL_MIN_SIZE=3,
+        SANDBOX_POOL_MAX_SIZE=10,
+        SANDBOX_POOL_MAX_IDLE_MINUTES=60,
+    ))
+    monkeypatch.setattr(pool_module, "sandbox_params", lambda *args, **kwargs: (args, kwargs))
+    monkeypatch.setattr(pool_module, "start_supervisord_session", noop)
+    monkeypatch.setattr(pool_module, "wait_for_services", noop)
+    monkeypatch.setattr(pool_module, "get_preview_info", preview_info)
+
+    daytona = FakeDaytona()
+
+    async def get_redis():
+        return fake_redis
+
+    return SimpleNamespace(redis=fake_redis, daytona=daytona, pool=SandboxPool(daytona, get_redis, SNAPSHOT))
+
+
+def pooled(daytona, snapshot=SNAPSHOT, created_at=None, state=SandboxState.STARTED):
+    """Register a sandbox with the fake Daytona and return its pool entry."""
+    daytona.created += 1
+    sandbox = FakeSandbox(f"existing-{daytona.created}")
+    sandbox.state = state
+    daytona.sandboxes[sandbox.id] = sandbox
+    entry = PooledSandbox(id=sandbox.id, password="pass", snapshot=snapshot, created_at=created_at or time.time())
+    return json.dumps(asdict(entry))
+
+
+async def settle(pool):
+    if pool._backfill_task is not None:
+        await pool._backfill_task
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+class TestSandboxPool:
+    async def test_concurrent_claims_never_share_a_sandbox(self, fakes):
+        assert await fakes.pool.backfill() == 3
+
+        claims = await asyncio.gather(*(fakes.pool.claim(f"project-{i}") for i in range(4)))
+        await settle(fakes.pool)
+
+        claimed = [claim for claim in claims if claim is not None]
+        assert len(claimed) == 3
+        assert len({entry.id for _, entry in claimed}) == 3
+        for (sandbox, entry), project_id in zip(claims[:3], ["project-0", "project-1", "project-2"]):
+            assert sandbox.id == entry.id
+            assert sandbox.labels == {'id': project_id}
+            assert sandbox.auto_stop_interval == pool_module.CLAIMED_AUTO_STOP_INTERVAL
+        assert claims[3] is None
+        assert fakes.pool.get_stats()['misses'] == 1
+
+    async def test_claim_discards_sandboxes_that_are_not_started(self, fakes):
+        stopped = pooled(fakes.daytona, state=SandboxState.STOPPED)
+        ready = pooled(fakes.daytona)
+        fakes.redis.lists[POOL_KEY] = [stopped, ready]
+
+        sandbox, entry = await fakes.pool.claim("project")
+        await settle(fakes.pool)
+
+        assert entry.id == json.loads(ready)['id']
+        assert fakes.daytona.deleted == [json.loads(stopped)['id']]
+
+    async def test_claim_discards_entries_of_another_snapshot(self, fakes):
+        outdated = pooled(fakes.daytona, snapshot="snapshot-v1")
+        ready = pooled(fakes.daytona)
+        fakes.redis.lists[POOL_KEY] = [outdated, ready]
+
+        _, entry = await fakes.pool.claim("project")
+        await settle(fakes.pool)
+
+        assert entry.snapshot == SNAPSHOT
+        assert json.loads(outdated)['id'] in fakes.daytona.deleted
+
+    async def test_claim_gives_up_after_max_attempts(self, fakes):
+        fakes.redis.lists[POOL_KEY] = [
+            pooled(fakes.daytona, state=SandboxState.STOPPED) for _ in range(pool_module.MAX_CLAIM_ATTEMPTS + 1)
+        ]
+
+        assert await fakes.pool.claim("project") is None
+        await settle(fakes.pool)
+        assert len(fakes.daytona.deleted) == pool_module.MAX_CLAIM_ATTEMPTS
+
+    async def test_backfill_sizes_pool_to_recent_demand(self, fakes):
+        now = time.time()
+        fakes.redis.zsets[DEMAND_KEY] = {f"claim-{i}": now - i for i in range(21)}
+        # 21 claims in 15 minutes cover 5 minutes with 7 sandboxes
+        assert await fakes.pool.target_size() == 7
+
+        assert await fakes.pool.backfill() == 7
+        assert await fakes.pool.size() == 7
+        assert await fakes.pool.backfill() == 0
+
+    async def test_backfill_target_is_clamped(self, fakes):
+        assert await fakes.pool.target_size() == 3
+        now = time.time()
+        fakes.redis.zsets[DEMAND_KEY] = {f"claim-{i}": now for i in range(300)}
+        assert await fakes.pool.target_size() == 10
+
+    async def test_backfill_skips_while_another_process_holds_the_lock(self, fakes):
+        fakes.redis.values[LOCK_KEY] = "other-process"
+
+        assert await fakes.pool.backfill() == 0
+        assert fakes.daytona.created == 0
+        assert fakes.redis.values[LOCK_KEY] == "other-process"
+
+    async def test_backfill_does_not_count_outdated_entries(self, fakes):
+        fakes.redis.lists[POOL_KEY] = [pooled(fakes.daytona, snapshot="snapshot-v1") for _ in range(3)]
+
+        assert await fakes.pool.backfill() == 3
+        entries = [json.loads(raw) for raw in fakes.redis.lists[POOL_KEY]]
+        assert [entry['snapshot'] for entry in entries] == [SNAPSHOT] * 3
+        assert len(fakes.daytona.deleted) == 3
+
+    async def test_recycle_deletes_idle_and_outdated_sandboxes(self, fakes):
+        fresh = pooled(fakes.daytona)
+        idle = pooled(fakes.daytona, created_at=time.time() - 61 * 60)
+        outdated = pooled(fakes.daytona, snapshot="snapshot-v1")
+        fakes.redis.lists[POOL_KEY] = [idle, fresh, outdated]
+
+        assert await fakes.pool.recycle() == 2
+        assert fakes.redis.lists[POOL_KEY] == [fresh]
+        assert sorted(fakes.daytona.deleted) == sorted([json.loads(idle)['id'], json.loads(outdated)['id']])
+
+    async def test_recycle_leaves_entries_claimed_meanwhile(self, fakes):
+        idle = pooled(fakes.daytona, created_at=time.time() - 61 * 60)
+        fakes.redis.lists[POOL_KEY] = [idle]
+        original_lrange = fakes.redis.lrange
+
+        async def lrange_then_claimed(key, start, end):
+            items = await original_lrange(key, start, end)
+            fakes.redis.lists[POOL_KEY] = []  # a claim popped the entry after the read
+            return items
+
+        fakes.redis.lrange = lrange_then_claimed
+
+        assert await fakes.pool.recycle() == 0
+        assert fakes.daytona.deleted == []
@@ -0,0 +1,83 @@
+"""
+Registry of the instances handling each active agent run.
+
+Every instance running (or having started) an agent run holds the key
+``active_run:{instance_id}:{agent_run_id}``. Finding those keys used to take a
+``KEYS active_run:*:{id}`` on every stop, which blocks Redis while it walks a
+keyspace holding millions of 24h response keys. The keys are now also
+indexed in the same pipeline as the key itself:
+
+- ``agent_run:{id}:instances``: a set of the instances to signal when a run
+  is stopped; it expires with the run key
+- ``instance:{instance_id}:active_runs``: a sorted set of the runs to stop
+  when an instance shuts down, scored by when each registration expires
+
+An instance id can be registered for a long time (e.g. the trigger executor),
+so the sorted set's own TTL keeps being extended; stale members are dropped
+by score instead, and a run that is never unregistered (its worker died)
+falls out ``REDIS_KEY_TTL`` after its last refresh.
+"""
+
+import time
+from typing import List
+
+from core.services import redis
+
+
+def _active_key(instance_id: str, agent_run_id: str) -> str:
+    return f"active_run:{instance_id}:{agent_run_id}"
+
+
+def _instances_key(agent_run_id: str) -> str:
+    return f"agent_run:{agent_run_id}:instances"
+
+
+def _instance_runs_key(instance_id: str) -> str:
+    return f"instance:{instance_id}:active_runs"
+
+
+async def register(instance_id: str, agent_run_id: str) -> None:
+    """Record that this instance is handling an agent run."""
+    redis_client = await redis.get_client()
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.set(_active_key(instance_id, agent_run_id), "running", ex=redis.REDIS_KEY_TTL)
+        pipe.sadd(_instances_key(agent_run_id), instance_id)
+        pipe.expire(_instances_key(agent_run_id), redis.REDIS_KEY_TTL)
+        now = time.time()
+        pipe.zadd(_instance_runs_key(instance_id), {agent_run_id: now + redis.REDIS_KEY_TTL})
+        pipe.zremrangebyscore(_instance_runs_key(instance_id), '-inf', now)
+        pipe.expire(_instance_runs_key(instance_id), redis.REDIS_KEY_TTL)
+        await pipe.execute()
+
+
+async def refresh(instance_id: str, agent_run_id: str) -> None:
+    """Extend the TTL of a long-running run's registration."""
+    redis_client = await redis.get_client()
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.expire(_active_key(instance_id, agent_run_id), redis.REDIS_KEY_TTL)
+        pipe.expire(_instances_key(agent_run_id), redis.REDIS_KEY_TTL)
+        pipe.zadd(_instance_runs_key(instance_id), {agent_run_id: time.time() + redis.REDIS_KEY_TTL}, xx=True)
+        pipe.expire(_instance_runs_key(instance_id), redis.REDIS_KEY_TTL)
+        await pipe.execute()
+
+
+async def unregister(instance_id: str, agent_run_id: str) -> None:
+    """Remove this instance's registration of an agent run."""
+    redis_client = await redis.get_client()
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.delete(_active_key(instance_id, agent_run_id))
+        pipe.srem(_instances_key(agent_run_id), instance_id)
+        pipe.zrem(_instance_runs_key(instance_id), agent_run_id)
+        await pipe.execute()
+
+
+async def get_instances(agent_run_id: str) -> List[str]:
+    """Ids of the instances registered for an agent run."""
+    redis_client = await redis.get_client()
+    return list(await redis_client.smembers(_instances_key(agent_run_id)))
+
+
+async def get_instance_runs(instance_id: str) -> List[str]:
+    """Ids of the agent runs registered by an instance whose registration has not expired."""
+    redis_client = await redis.get_client()
+    return list(await redis_client.zrangebyscore(_instance_runs_key(instance_id), time.time(), '+inf'))
@@ -0,0 +1,183 @@
+"""
+Request- and run-scoped identity map for hot single-row reads.
+
+Starting an agent reads the same ``threads``, ``agents`` and
+``agent_versions`` rows several times across helpers, and a run re-reads
+``threads`` and ``projects`` in ``AgentRunner.setup`` and again in every
+sandbox tool. Inside a ``read_scope()`` those primary-key reads go through
+``get_row``: the first read of a row hits the database, later reads of
+columns already loaded are served from memory, and concurrent identical reads
+share one query. Writes made through ``update_row`` (or rows recorded with
+``remember``) are merged into the map so later reads see them.
+
+Outside a scope every helper is a plain query, so callers do not need to know
+whether one is active. Scopes are deliberately short-lived (one request, one
+agent run); writes from other processes are not observed within a scope.
+"""
+
+import asyncio
+import copy
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+from core.utils.logger import logger
+from core.utils.single_flight import single_flight
+
+PRIMARY_KEYS = {
+    'threads': 'thread_id',
+    'projects': 'project_id',
+    'agents': 'agent_id',
+    'agent_versions': 'version_id',
+}
+
+ALL_COLUMNS = frozenset('*')
+
+RowKey = Tuple[str, str]
+
+
+def _parse_columns(columns: str) -> Optional[FrozenSet[str]]:
+    """Parse a select list; None for anything the map cannot serve (embeds, casts, aliases)."""
+    if columns.strip() == '*':
+        return ALL_COLUMNS
+    names = [name.strip() for name in columns.split(',')]
+    if any(not name or not name.replace('_', '').isalnum() for name in names):
+        return None
+    return frozenset(names)
+
+
+class ReadScope:
+    """Rows loaded within one request or agent run, keyed by (table, primary key)."""
+
+    def __init__(self):
+        self._rows: Dict[RowKey, Dict[str, Any]] = {}
+        self._complete: set = set()  # rows loaded with select('*')
+        self._missing: set = set()   # rows known not to exist
+        self._inflight: Dict[Tuple[RowKey, FrozenSet[str]], asyncio.Future] = {}
+        self.hits = 0
+        self.loads = 0
+
+    def lookup(self, key: RowKey, columns: FrozenSet[str]) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        if key in self._missing:
+            return True, None
+        row = self._rows.get(key)
+        if row is None:
+            return False, None
+        if key in self._complete:
+            return True, row if columns is ALL_COLUMNS else {c: row.get(c) for c in columns}
+        if columns is not ALL_COLUMNS and columns <= row.keys():
+            return True, {c: row[c] for c in columns}
+        return False, None
+
+    def store(self, key: RowKey, row: Optional[Dict[str, Any]], complete: bool) -> None:
+        if row is None:
+            self._rows.pop(key, None)
+            self._complete.discard(key)
+            self._missing.add(key)
+            return
+        self._missing.discard(key)
+        self._rows.setdefault(key, {}).update(copy.deepcopy(row))
+        if complete:
+            self._complete.add(key)
+
+    def forget(self, key: RowKey) -> None:
+        self._rows.pop(key, None)
+        self._complete.discard(key)
+        self._missing.discard(key)
+
+
+_current_scope: ContextVar[Optional[ReadScope]] = ContextVar('identity_map_scope', default=None)
+
+
+@asynccontextmanager
+async def read_scope():
+    """Open a read scope for the current task and the tasks it spawns.
+
+    Nested scopes reuse the outer one.
+    """
+    if _current_scope.get() is not None:
+        yield _current_scope.get()
+        return
+    scope = ReadScope()
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        try:
+            _current_scope.reset(token)
+        except ValueError:
+            # Async generators may be finalized from another context
+            _current_scope.set(None)
+        logger.debug(f"Read scope closed: {scope.loads} loads, {scope.hits} hits")
+
+
+async def request_read_scope():
+    """FastAPI dependency that wraps a request in a read scope."""
+    async with read_scope() as scope:
+        yield scope
+
+
+async def _fetch(client, table: str, key: str, columns: str) -> Optional[Dict[str, Any]]:
+    result = await client.table(table).select(columns).eq(PRIMARY_KEYS[table], key).execute()
+    return result.data[0] if result.data else None
+
+
+async def get_row(client, table: str, key: str, columns: str = '*', fresh: bool = False) -> Optional[Dict[str, Any]]:
+    """Read one row of a hot table by primary key, through the scope's identity map.
+
+    Returns a copy of the requested columns, or None if the row does not exist.
+    Pass ``fresh=True`` before acting on the absence of a value another process
+    may have written since the row was first read.
+    """
+    scope = _current_scope.get()
+    wanted = _parse_columns(columns)
+    if scope is None or wanted is None or not key:
+        return await _fetch(client, table, key, columns)
+
+    row_key = (table, str(key))
+    if fresh:
+        scope.forget(row_key)
+    found, row = scope.lookup(row_key, wanted)
+    if found:
+        scope.hits += 1
+        return copy.deepcopy(row)
+
+    async def load() -> None:
+        loaded = await _fetch(client, table, key, columns)
+        scope.loads += 1
+        scope.store(row_key, loaded, complete=wanted is ALL_COLUMNS)
+
+    # Join a full-row load already in flight, or an identical one
+    flight = (row_key, ALL_COLUMNS) if (row_key, ALL_COLUMNS) in scope._inflight else (row_key, wanted)
+    await single_flight(scope._inflight, flight, load)
+
+    # A joined load may not have covered these columns (or the row changed since)
+    found, row = scope.lookup(row_key, wanted)
+    if not found:
+        return await _fetch(client, table, key, columns)
+    scope.hits += 1
+    return copy.deepcopy(row)
+
+
+def remember(table: str, row: Optional[Dict[str, Any]], complete: bool = False) -> None:
+    """Record a row obtained by another query (e.g. a filtered select or insert)."""
+    scope = _current_scope.get()
+    if scope is None or not row or row.get(PRIMARY_KEYS[table]) is None:
+        return
+    scope.store((table, str(row[PRIMARY_KEYS[table]])), row, complete)
+
+
+async def update_row(client, table: str, key: str, data: Dict[str, Any]):
+    """Update one row by primary key and merge the change into the identity map.
+
+    Returns the PostgREST response, like ``client.table(table).update(...).execute()``.
+    """
+    result = await client.table(table).update(data).eq(PRIMARY_KEYS[table], key).execute()
+    scope = _current_scope.get()
+    if scope is not None:
+        row_key = (table, str(key))
+        if result.data:
+            scope.store(row_key, result.data[0], complete=True)
+        else:
+            scope.forget(row_key)
+    return result
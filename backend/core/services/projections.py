@@ -0,0 +1,157 @@
+"""
+Named column projections for hot-path queries and the row types they produce.
+
+``messages.content`` and ``metadata`` are large JSONB blobs, yet most
+hot-path reads only need one or two fields: the agent loop checks the *type*
+of the latest message on every iteration, and sandbox tools only need
+``projects.sandbox``. Each use case gets a
+``Projection`` here: its select list is derived from the fields of a slotted
+row dataclass, so the query and the object built from its result cannot drift
+apart.
+
+    result = await client.table('messages').select(MESSAGE_TYPE.select)...execute()
+    latest = MESSAGE_TYPE.row(result.data[0])
+    if latest.type == 'assistant': ...
+
+Add new use cases to ``PROJECTIONS``; see
+``python -m core.utils.scripts.benchmark_projection_bytes`` for the payload
+size of each one against ``select('*')``.
+"""
+
+from dataclasses import dataclass, fields
+from typing import Any, Dict, List, Optional, Tuple
+
+
+@dataclass(slots=True)
+class MessageTypeRow:
+    message_id: str
+    type: str
+    created_at: str
+
+
+@dataclass(slots=True)
+class MessageContentRow:
+    message_id: str
+    content: Any
+
+
+@dataclass(slots=True)
+class MessageRow:
+    message_id: str
+    thread_id: str
+    type: str
+    is_llm_message: bool
+    content: Any
+    metadata: Any
+    agent_id: Optional[str]
+    agent_version_id: Optional[str]
+    created_at: str
+    updated_at: str
+
+
+@dataclass(slots=True)
+class ProjectSandboxRow:
+    project_id: str
+    account_id: str
+    sandbox: Optional[Dict[str, Any]]
+
+
+@dataclass(slots=True)
+class ProjectSummaryRow:
+    project_id: str
+    account_id: str
+    name: Optional[str]
+    description: Optional[str]
+    sandbox: Optional[Dict[str, Any]]
+    is_public: Optional[bool]
+    created_at: str
+    updated_at: str
+
+
+@dataclass(slots=True)
+class ThreadSummaryRow:
+    thread_id: str
+    account_id: str
+    project_id: Optional[str]
+    metadata: Optional[Dict[str, Any]]
+    is_public: Optional[bool]
+    created_at: str
+    updated_at: str
+
+
+@dataclass(slots=True)
+class AgentConfigRow:
+    """The agent columns ``extract_agent_config`` reads, plus ``is_public`` for access checks."""
+    agent_id: str
+    account_id: str
+    name: str
+    description: Optional[str]
+    is_default: Optional[bool]
+    is_public: Optional[bool]
+    metadata: Optional[Dict[str, Any]]
+    current_version_id: Optional[str]
+    profile_image_url: Optional[str]
+    icon_name: Optional[str]
+    icon_color: Optional[str]
+    icon_background: Optional[str]
+
+
+@dataclass(slots=True)
+class AgentRunSummaryRow:
+    id: str
+    status: str
+    started_at: Optional[str]
+    completed_at: Optional[str]
+    error: Optional[str]
+    agent_id: Optional[str]
+    agent_version_id: Optional[str]
+    created_at: str
+
+
+@dataclass(frozen=True)
+class Projection:
+    """A named column set of one table, read into ``row_type`` objects."""
+    name: str
+    table: str
+    row_type: type
+
+    @property
+    def columns(self) -> Tuple[str, ...]:
+        return tuple(f.name for f in fields(self.row_type))
+
+    @property
+    def select(self) -> str:
+        """The select list, for ``client.table(...).select(...)`` or ``get_row``."""
+        return ', '.join(self.columns)
+
+    def row(self, data: Optional[Dict[str, Any]]):
+        if data is None:
+            return None
+        return self.row_type(**{column: data.get(column) for column in self.columns})
+
+    def rows(self, data: Optional[List[Dict[str, Any]]]) -> list:
+        return [self.row(item) for item in data or []]
+
+
+MESSAGE_TYPE = Projection('message_type', 'messages', MessageTypeRow)
+MESSAGE_CONTENT = Projection('message_content', 'messages', MessageContentRow)
+MESSAGE = Projection('message', 'messages', MessageRow)
+PROJECT_SANDBOX = Projection('project_sandbox', 'projects', ProjectSandboxRow)
+PROJECT_SUMMARY = Projection('project_summary', 'projects', ProjectSummaryRow)
+THREAD_SUMMARY = Projection('thread_summary', 'threads', ThreadSummaryRow)
+AGENT_CONFIG = Projection('agent_config', 'agents', AgentConfigRow)
+AGENT_RUN_SUMMARY = Projection('agent_run_summary', 'agent_runs', AgentRunSummaryRow)
+
+PROJECTIONS: Dict[str, Projection] = {
+    projection.name: projection
+    for projection in (
+        MESSAGE_TYPE,
+        MESSAGE_CONTENT,
+        MESSAGE,
+        PROJECT_SANDBOX,
+        PROJECT_SUMMARY,
+        THREAD_SUMMARY,
+        AGENT_CONFIG,
+        AGENT_RUN_SUMMARY,
+    )
+}
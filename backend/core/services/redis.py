@@ -3,7 +3,7 @@ import os
 from dotenv import load_dotenv
 import asyncio
 from core.utils.logger import logger
-from typing import List, Any
+from typing import AsyncIterator, Dict, List, Any
 from core.utils.retry import retry
 
 # Redis client and connection pool
@@ -160,6 +160,87 @@ async def rpush(key: str, *values: Any):
     return await redis_client.rpush(key, *values)
 
 
+async def rpush_and_publish(
+    key: str,
+    values: List[Any],
+    channel: str,
+    message: str,
+    stream_key: str = None,
+    stream_entries: List[Dict[str, Any]] = None,
+    stream_maxlen: int = None,
+    stream_ttl: int = None,
+):
+    """Append values to a list and publish a notification in a single round-trip.
+
+    If stream_key is given, stream_entries are also added to that stream in the same pipeline,
+    trimmed to about stream_maxlen entries and expiring after stream_ttl seconds if given.
+    """
+    redis_client = await get_client()
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.rpush(key, *values)
+        if stream_key:
+            for entry in stream_entries or []:
+                pipe.xadd(stream_key, entry, maxlen=stream_maxlen, approximate=True)
+            if stream_ttl:
+                pipe.expire(stream_key, stream_ttl)
+        pipe.publish(channel, message)
+        return await pipe.execute()
+
+
+# Stream operations
+async def xadd(key: str, fields: Dict[str, Any], maxlen: int = None, nomkstream: bool = False):
+    """Append an entry to a stream, trimming it to about maxlen entries if given.
+
+    With nomkstream, nothing is added (and None returned) if the stream does not exist.
+    """
+    redis_client = await get_client()
+    return await redis_client.xadd(key, fields, maxlen=maxlen, approximate=True, nomkstream=nomkstream)
+
+
+async def xread(streams: Dict[str, str], count: int = None, block: int = None):
+    """Read entries newer than the given IDs from one or more streams."""
+    redis_client = await get_client()
+    return await redis_client.xread(streams, count=count, block=block)
+
+
+async def xrevrange(key: str, max: str = "+", min: str = "-", count: int = None):
+    """Read entries of a stream from newest to oldest."""
+    redis_client = await get_client()
+    return await redis_client.xrevrange(key, max=max, min=min, count=count)
+
+
+async def xgroup_create(key: str, group: str, id: str = "0"):
+    """Create a consumer group (and the stream), ignoring an existing group."""
+    redis_client = await get_client()
+    try:
+        return await redis_client.xgroup_create(key, group, id=id, mkstream=True)
+    except redis.ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+        return False
+
+
+async def xreadgroup(group: str, consumer: str, streams: Dict[str, str], count: int = None, block: int = None):
+    """Read entries for a consumer group; use ">" as the ID for never-delivered entries."""
+    redis_client = await get_client()
+    return await redis_client.xreadgroup(group, consumer, streams, count=count, block=block)
+
+
+async def xautoclaim(key: str, group: str, consumer: str, min_idle_time: int, start_id: str = "0-0", count: int = None):
+    """Claim entries another consumer left pending for at least min_idle_time milliseconds."""
+    redis_client = await get_client()
+    return await redis_client.xautoclaim(key, group, consumer, min_idle_time, start_id=start_id, count=count)
+
+
+async def xack_and_delete(key: str, group: str, ids: List[str]):
+    """Acknowledge entries for a consumer group and remove them from the stream in one round-trip."""
+    redis_client = await get_client()
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.xack(key, group, *ids)
+        pipe.xdel(key, *ids)
+        return await pipe.execute()
+
+
 async def lrange(key: str, start: int, end: int) -> List[str]:
     """Get a range of elements from a list."""
     redis_client = await get_client()
@@ -169,9 +250,20 @@ async def lrange(key: str, start: int, end: int) -> List[str]:
 # Key management
 
 
-async def keys(pattern: str) -> List[str]:
+async def scan_iter(pattern: str, count: int = 500) -> AsyncIterator[str]:
+    """Iterate over the keys matching a pattern with SCAN.
+
+    Unlike KEYS this does not block Redis while it walks the keyspace, but it
+    still visits every key, so keep it off request hot paths.
+    """
+    redis_client = await get_client()
+    async for key in redis_client.scan_iter(match=pattern, count=count):
+        yield key
+
+
+async def exists(key: str) -> bool:
     redis_client = await get_client()
-    return await redis_client.keys(pattern)
+    return bool(await redis_client.exists(key))
 
 
 async def expire(key: str, seconds: int):
@@ -0,0 +1,818 @@
+"""
+Redis transport for agent run responses.
+
+The worker appends every response of an agent run to the Redis list
+``agent_run:{id}:responses`` and notifies viewers on
+``agent_run:{id}:new_response``. ``ResponseStreamWriter`` coalesces those
+writes so a burst of streamed chunks costs one pipelined RPUSH + PUBLISH
+instead of two round-trips per chunk.
+
+With ``AGENT_RUN_STREAM_TRANSPORT=streams`` every response is also appended
+to the Redis Stream ``agent_run:{id}:stream``. Viewers then read with
+``XREAD BLOCK`` and can resume from a ``Last-Event-ID`` instead of replaying
+the whole run. The list + pub/sub path stays in place as the fallback: the
+list is written in both modes, and a run whose stream does not exist (written
+by a worker with streams disabled, or expired) is read from the list. Streams
+are trimmed to about ``STREAM_MAX_LEN`` entries, and every write refreshes a
+``STREAM_TTL`` so the stream of a crashed worker does not stay forever.
+
+Responses are serialized once, in the worker. List entries stay plain JSON
+(other readers decode them), and stream entries hold the ready-to-send SSE
+frame plus an ``end`` marker on terminal statuses, so viewers pass frames
+straight through without a JSON round-trip per viewer.
+
+On the list path, ``ResponseBroadcastHub`` shares one pub/sub subscription
+and one LRANGE per notification between all viewers of a run in this
+process, fanning frames out to per-viewer queues. On the streams path,
+``ResponseStreamHub`` does the same with one blocking XREAD per run, so
+pooled Redis connections scale with the runs being watched rather than
+with their viewers.
+"""
+
+import asyncio
+import json
+import re
+import time
+from collections import deque
+from typing import Any, AsyncGenerator, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from core.services import redis
+from core.utils.config import config
+from core.utils.logger import logger
+
+DEFAULT_FLUSH_INTERVAL = 0.02  # seconds a chunk may wait for more chunks before being written
+DEFAULT_MAX_BATCH_SIZE = 64    # chunks written per round-trip before flushing immediately
+MAX_BUFFERED_RESPONSES = 10_000  # responses held while Redis is unreachable before the run fails
+FLUSH_RETRY_MIN_DELAY = 0.5    # seconds before the first retry of a failed flush, doubled per failure
+FLUSH_RETRY_MAX_DELAY = 8.0
+STREAM_READ_BLOCK_MS = 5000    # must stay below the Redis socket timeout
+STREAM_READ_COUNT = 500
+STREAM_STOPPED_TTL = 60        # keep a stopped run's stream briefly so viewers can read the STOP entry
+STREAM_MAX_LEN = 100_000       # entries kept per run stream (trimmed approximately)
+STREAM_TTL = 3600 * 24         # refreshed on every write, so a crashed worker's stream still expires
+HUB_RING_SIZE = 2000           # recent frames per run kept in memory for viewers that join late
+HUB_VIEWER_QUEUE_SIZE = 1000   # frames a viewer may fall behind before it is evicted
+
+TERMINAL_STATUSES = ('completed', 'failed', 'stopped')
+CONTROL_SIGNALS = ('STOP', 'END_STREAM', 'ERROR')
+
+_STREAM_ID_PATTERN = re.compile(r'^\d+-\d+$')
+# Nested content/metadata are JSON strings (quotes escaped), so these only match top-level keys
+_TERMINAL_MARKERS = tuple(f'"status": "{status}"' for status in TERMINAL_STATUSES)
+
+
+def response_list_key(agent_run_id: str) -> str:
+    return f"agent_run:{agent_run_id}:responses"
+
+
+def response_channel(agent_run_id: str) -> str:
+    return f"agent_run:{agent_run_id}:new_response"
+
+
+def response_stream_key(agent_run_id: str) -> str:
+    return f"agent_run:{agent_run_id}:stream"
+
+
+def control_channel(agent_run_id: str) -> str:
+    return f"agent_run:{agent_run_id}:control"
+
+
+def use_redis_streams() -> bool:
+    return (config.AGENT_RUN_STREAM_TRANSPORT or "list").lower() == "streams"
+
+
+async def publish_control(agent_run_id: str, signal: str) -> None:
+    """Publish a control signal to the run's control channel (and stream, if enabled)."""
+    await redis.publish(control_channel(agent_run_id), signal)
+    if use_redis_streams():
+        # Never create a stream for a run whose worker only writes the list
+        await redis.xadd(response_stream_key(agent_run_id), {"control": signal}, maxlen=STREAM_MAX_LEN, nomkstream=True)
+
+
+async def has_response_stream(agent_run_id: str) -> bool:
+    """Whether viewers of the run should read its Redis Stream rather than the list."""
+    return use_redis_streams() and await redis.exists(response_stream_key(agent_run_id))
+
+
+def sse_frame(payload: str) -> str:
+    """Wrap a serialized response as an SSE data frame."""
+    return f"data: {payload}\n\n"
+
+
+def is_terminal_response(response: Dict[str, Any]) -> bool:
+    return response.get('type') == 'status' and response.get('status') in TERMINAL_STATUSES
+
+
+def is_terminal_payload(payload: str) -> bool:
+    """Check whether a serialized response ends the run, decoding only likely candidates."""
+    if not any(marker in payload for marker in _TERMINAL_MARKERS):
+        return False
+    try:
+        return is_terminal_response(json.loads(payload))
+    except (json.JSONDecodeError, AttributeError):
+        return False
+
+
+async def expire_response_stream(agent_run_id: str, seconds: int) -> None:
+    """Set a TTL on the run's response stream, if streams are enabled."""
+    if use_redis_streams():
+        await redis.expire(response_stream_key(agent_run_id), seconds)
+
+
+class ResponseBufferFull(Exception):
+    """Raised by ``ResponseStreamWriter.write`` when Redis has been unreachable for too long."""
+    pass
+
+
+class ResponseStreamWriter:
+    """Buffers agent run responses and writes them to Redis in batches.
+
+    Writes are flushed when ``max_batch_size`` responses are buffered or
+    ``flush_interval`` seconds after the first buffered response, whichever
+    comes first. A full batch makes ``write`` wait for the flush, which
+    applies backpressure to the producer when Redis is slow.
+
+    A failed flush does not interrupt the run: the responses stay buffered,
+    in order, and only the timer retries them, with exponential backoff up to
+    ``FLUSH_RETRY_MAX_DELAY``, so writes during an outage return immediately.
+    Once ``max_buffered`` responses are waiting, ``write`` raises
+    ``ResponseBufferFull`` and the run fails. ``close`` raises if the
+    buffered responses still cannot be written.
+    """
+
+    def __init__(
+        self,
+        agent_run_id: str,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_buffered: int = MAX_BUFFERED_RESPONSES,
+    ):
+        self.agent_run_id = agent_run_id
+        self.list_key = response_list_key(agent_run_id)
+        self.channel = response_channel(agent_run_id)
+        self.stream_key = response_stream_key(agent_run_id) if use_redis_streams() else None
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        self.max_buffered = max_buffered
+
+        self._buffer: List[str] = []
+        self._stream_entries: List[Dict[str, str]] = []
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._retry_delay = 0.0  # non-zero while flushes are failing
+
+        self._responses_written = 0
+        self._flushes = 0
+        self._failed_flushes = 0
+        self._total_flush_time = 0.0
+        self._max_flush_time = 0.0
+
+    async def write(self, response: Dict[str, Any]) -> None:
+        """Queue a response for the next batched write.
+
+        Raises:
+            ResponseBufferFull: ``max_buffered`` responses could not be written yet
+        """
+        if len(self._buffer) >= self.max_buffered:
+            raise ResponseBufferFull(
+                f"{len(self._buffer)} responses of agent run {self.agent_run_id} could not be written to Redis"
+            )
+        payload = json.dumps(response)
+        self._buffer.append(payload)
+        if self.stream_key:
+            entry = {"frame": sse_frame(payload)}
+            if is_terminal_response(response):
+                entry["end"] = "1"
+            self._stream_entries.append(entry)
+        if len(self._buffer) >= self.max_batch_size and not self._retry_delay:
+            try:
+                await self.flush()
+                return
+            except Exception as e:
+                logger.warning(f"Failed to flush {len(self._buffer)} responses for agent run {self.agent_run_id}, retrying in {self._retry_delay:.1f}s: {e}")
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def flush(self) -> None:
+        """Write all buffered responses with one RPUSH and one PUBLISH."""
+        async with self._lock:
+            if not self._buffer:
+                return
+            batch, self._buffer = self._buffer, []
+            stream_batch, self._stream_entries = self._stream_entries, []
+            start = time.monotonic()
+            try:
+                await redis.rpush_and_publish(
+                    self.list_key, batch, self.channel, "new",
+                    stream_key=self.stream_key, stream_entries=stream_batch,
+                    stream_maxlen=STREAM_MAX_LEN, stream_ttl=STREAM_TTL,
+                )
+            except BaseException as e:
+                # Keep the responses (in order) for the next flush attempt, also when cancelled
+                self._buffer = batch + self._buffer
+                self._stream_entries = stream_batch + self._stream_entries
+                if isinstance(e, Exception):
+                    self._failed_flushes += 1
+                    self._retry_delay = min(max(self._retry_delay * 2, FLUSH_RETRY_MIN_DELAY), FLUSH_RETRY_MAX_DELAY)
+                raise
+            self._retry_delay = 0.0
+            elapsed = time.monotonic() - start
+            self._flushes += 1
+            self._responses_written += len(batch)
+            self._total_flush_time += elapsed
+            self._max_flush_time = max(self._max_flush_time, elapsed)
+
+    async def close(self) -> None:
+        """Stop the pending timer and flush whatever is still buffered.
+
+        A flush the timer has already started is waited for, not cancelled.
+
+        Raises if the buffered responses cannot be written.
+        """
+        if self._timer and not self._timer.done():
+            # Holding the lock, the timer is sleeping or waiting for the lock, never mid-write
+            async with self._lock:
+                self._timer.cancel()
+            try:
+                await self._timer
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    async def _flush_later(self) -> None:
+        while True:
+            await asyncio.sleep(self._retry_delay or self.flush_interval)
+            try:
+                await self.flush()
+                return
+            except Exception as e:
+                logger.warning(f"Failed to flush {len(self._buffer)} responses for agent run {self.agent_run_id}, retrying in {self._retry_delay:.1f}s: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'responses_written': self._responses_written,
+            'buffered': len(self._buffer),
+            'flushes': self._flushes,
+            'failed_flushes': self._failed_flushes,
+            'retry_delay': self._retry_delay,
+            'avg_flush_ms': (self._total_flush_time / self._flushes * 1000) if self._flushes else 0.0,
+            'max_flush_ms': self._max_flush_time * 1000,
+        }
+
+
+def _stream_id(entry_id: str) -> Tuple[int, int]:
+    milliseconds, _, sequence = entry_id.partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+
+def _entry_frame(entry_id: str, fields: Dict[str, str]) -> Optional["Frame"]:
+    """The SSE frame of a stream entry, or None for entries viewers do not see."""
+    control = fields.get("control")
+    if control is not None:
+        return f"id: {entry_id}\n" + _status_frame(control), True
+    frame = fields.get("frame")
+    if frame is None:
+        return None
+    return f"id: {entry_id}\n{frame}", bool(fields.get("end"))
+
+
+async def _read_entries(key: str, last_id: str) -> AsyncGenerator[Tuple[str, "Frame"], None]:
+    """Yield the frames already in a stream after ``last_id``, without blocking."""
+    while True:
+        result = await redis.xread({key: last_id}, count=STREAM_READ_COUNT)
+        entries = result[0][1] if result else []
+        if not entries:
+            return
+        for entry_id, fields in entries:
+            last_id = entry_id
+            frame = _entry_frame(entry_id, fields)
+            if frame is not None:
+                yield entry_id, frame
+
+
+def _resume_id(last_event_id: Optional[str]) -> str:
+    return last_event_id if last_event_id and _STREAM_ID_PATTERN.match(last_event_id) else "0-0"
+
+
+async def stream_response_frames(agent_run_id: str, last_event_id: Optional[str] = None) -> AsyncGenerator[str, None]:
+    """Yield the SSE frames already in a run's Redis Stream, up to its end.
+
+    Live viewers of a running run go through ``response_stream_hub`` instead.
+
+    Args:
+        agent_run_id: The agent run to stream
+        last_event_id: Stream ID of the last frame the client received; frames
+            after it are sent. Invalid or missing IDs replay from the start.
+    """
+    async for _, (frame, end) in _read_entries(response_stream_key(agent_run_id), _resume_id(last_event_id)):
+        yield frame
+        if end:
+            logger.debug(f"Detected run completion via status message in stream for {agent_run_id}")
+            return
+
+
+Frame = Tuple[str, bool]  # (SSE frame, ends the stream)
+
+
+def _status_frame(status: str, message: Optional[str] = None) -> str:
+    response = {'type': 'status', 'status': status}
+    if message:
+        response['message'] = message
+    return sse_frame(json.dumps(response))
+
+
+class HubViewer:
+    """One local viewer of a run, fed by its ``_RunBroadcast``."""
+
+    def __init__(self, agent_run_id: str, queue_size: int):
+        self.agent_run_id = agent_run_id
+        self.queue: "asyncio.Queue[Optional[Frame]]" = asyncio.Queue(maxsize=queue_size)
+        self.backlog: List[Frame] = []
+        self.evicted = False
+
+    async def frames(self) -> AsyncGenerator[str, None]:
+        """Yield the replayed backlog, then live frames until the run ends."""
+        for frame, end in self.backlog:
+            yield frame
+            if end:
+                return
+        self.backlog = []
+
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            frame, end = item
+            yield frame
+            if end:
+                return
+
+
+class _RunBroadcast:
+    """Shared subscription, list cursor and ring buffer for one run."""
+
+    def __init__(self, hub: "ResponseBroadcastHub", agent_run_id: str):
+        self.hub = hub
+        self.agent_run_id = agent_run_id
+        self.list_key = response_list_key(agent_run_id)
+        self.channel = response_channel(agent_run_id)
+        self.control = control_channel(agent_run_id)
+
+        self.viewers: Set[HubViewer] = set()
+        self.ring: Deque[Frame] = deque(maxlen=hub.ring_size)
+        self.next_index = 0  # list index of the next response to fetch
+        self.control_frames = 0  # frames in the ring that are not list entries
+        self.finished = False  # no more frames will be published
+        self.ready = asyncio.Event()
+        self.error: Optional[Exception] = None
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        try:
+            # Subscribe before the initial LRANGE so no notification is missed
+            self._pubsub = await redis.create_pubsub()
+            await self._pubsub.subscribe(self.channel, self.control)
+            await self._fetch()
+            if not self.finished:
+                self._task = asyncio.create_task(self._listen())
+        except Exception as e:
+            self.error = e
+            await self.close()
+        finally:
+            self.ready.set()
+
+    async def _fetch(self) -> None:
+        responses = await redis.lrange(self.list_key, self.next_index, -1)
+        self.hub._fetches += 1
+        self.next_index += len(responses)
+        for payload in responses:
+            end = is_terminal_payload(payload)
+            self._publish((sse_frame(payload), end))
+            if end:
+                logger.debug(f"Detected run completion via status message in stream for {self.agent_run_id}")
+                self.finished = True
+                return
+
+    async def _listen(self) -> None:
+        try:
+            async for message in self._pubsub.listen():
+                if not isinstance(message, dict) or message.get("type") != "message":
+                    continue
+                channel = message.get("channel")
+                data = message.get("data")
+                if isinstance(data, bytes):
+                    data = data.decode('utf-8')
+
+                if channel == self.channel and data == "new":
+                    await self._fetch()
+                elif channel == self.control and data in CONTROL_SIGNALS:
+                    logger.debug(f"Received control signal '{data}' for {self.agent_run_id}")
+                    self._publish_control(_status_frame(data))
+                    self.finished = True
+                if self.finished:
+                    break
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error in broadcast listener for {self.agent_run_id}: {e}")
+            self._publish_control(_status_frame('error'))
+        await self.close()
+
+    def _publish_control(self, frame: str) -> None:
+        self.control_frames += 1
+        self._publish((frame, True))
+
+    def _publish(self, item: Frame) -> None:
+        self.ring.append(item)
+        for viewer in list(self.viewers):
+            try:
+                viewer.queue.put_nowait(item)
+            except asyncio.QueueFull:
+                self._evict(viewer)
+
+    def _evict(self, viewer: HubViewer) -> None:
+        self.viewers.discard(viewer)
+        viewer.evicted = True
+        while not viewer.queue.empty():
+            viewer.queue.get_nowait()
+        viewer.queue.put_nowait((_status_frame('error', 'Viewer fell too far behind; reconnect to resume'), True))
+        self.hub._evictions += 1
+        logger.warning(f"Evicted slow viewer of agent run {self.agent_run_id}")
+        if not self.viewers and not self.finished:
+            # Nobody is left to feed: drop the subscription now so a reconnect opens a fresh one
+            self.hub._forget(self)
+            self._closing = asyncio.create_task(self.close())
+
+    async def add_viewer(self) -> HubViewer:
+        viewer = HubViewer(self.agent_run_id, self.hub.viewer_queue_size)
+        # Snapshot the ring and register in one step so no frame is missed or duplicated
+        ring_start = self.next_index - (len(self.ring) - self.control_frames)
+        viewer.backlog = list(self.ring)
+        if self.finished:
+            viewer.queue.put_nowait(None)
+        else:
+            self.viewers.add(viewer)
+        if ring_start > 0:
+            try:
+                older = await redis.lrange(self.list_key, 0, ring_start - 1)
+            except BaseException:
+                # The caller never gets the viewer, so it cannot unsubscribe it
+                await self.remove_viewer(viewer)
+                raise
+            viewer.backlog = [(sse_frame(payload), is_terminal_payload(payload)) for payload in older] + viewer.backlog
+        return viewer
+
+    async def remove_viewer(self, viewer: HubViewer) -> None:
+        self.viewers.discard(viewer)
+        if not self.viewers:
+            await self.close()
+
+    async def close(self) -> None:
+        self.finished = True
+        self.hub._forget(self)
+        for viewer in list(self.viewers):
+            try:
+                viewer.queue.put_nowait(None)
+            except asyncio.QueueFull:
+                self._evict(viewer)
+        self.viewers.clear()
+
+        task, self._task = self._task, None
+        if task and task is not asyncio.current_task() and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                logger.debug(f"Broadcast listener for {self.agent_run_id} ended with: {e}")
+
+        pubsub, self._pubsub = self._pubsub, None
+        if pubsub:
+            try:
+                await pubsub.unsubscribe(self.channel, self.control)
+                await pubsub.close()
+            except Exception as e:
+                logger.debug(f"Error during pubsub cleanup for {self.agent_run_id}: {e}")
+
+
+class ResponseBroadcastHub:
+    """Per-process fan-out of agent run responses to local viewers.
+
+    The first viewer of a run opens one pub/sub subscription and loads the
+    response list; later viewers replay the in-memory ring buffer (plus an
+    LRANGE for anything older) and then share the live feed. Viewers that
+    fall ``viewer_queue_size`` frames behind are evicted with an error frame
+    instead of holding memory for the whole run. The subscription closes when
+    the run ends or its last viewer leaves.
+    """
+
+    def __init__(self, ring_size: int = HUB_RING_SIZE, viewer_queue_size: int = HUB_VIEWER_QUEUE_SIZE):
+        self.ring_size = ring_size
+        self.viewer_queue_size = viewer_queue_size
+        self._runs: Dict[str, _RunBroadcast] = {}
+        self._subscriptions = 0
+        self._fetches = 0
+        self._evictions = 0
+
+    async def subscribe(self, agent_run_id: str) -> HubViewer:
+        run = self._runs.get(agent_run_id)
+        if run is None:
+            run = _RunBroadcast(self, agent_run_id)
+            self._runs[agent_run_id] = run
+            self._subscriptions += 1
+            await run.start()
+        else:
+            await run.ready.wait()
+        if run.error is not None:
+            raise run.error
+        viewer = await run.add_viewer()
+        if run.finished and not run.viewers:
+            await run.close()
+        return viewer
+
+    async def unsubscribe(self, viewer: HubViewer) -> None:
+        run = self._runs.get(viewer.agent_run_id)
+        if run is not None and viewer in run.viewers:
+            await run.remove_viewer(viewer)
+
+    async def stream(self, agent_run_id: str) -> AsyncGenerator[str, None]:
+        """Yield SSE frames for a running run through the shared subscription."""
+        viewer = await self.subscribe(agent_run_id)
+        try:
+            async for frame in viewer.frames():
+                yield frame
+        finally:
+            await self.unsubscribe(viewer)
+
+    def _forget(self, run: _RunBroadcast) -> None:
+        if self._runs.get(run.agent_run_id) is run:
+            del self._runs[run.agent_run_id]
+
+    def get_stats(self) -> Dict[str, Any]:
+        viewers_per_run = {run_id: len(run.viewers) for run_id, run in self._runs.items()}
+        return {
+            'runs': len(self._runs),
+            'viewers': sum(viewers_per_run.values()),
+            'viewers_per_run': viewers_per_run,
+            'subscriptions_opened': self._subscriptions,
+            'fetches': self._fetches,
+            'evictions': self._evictions,
+        }
+
+
+response_hub = ResponseBroadcastHub()
+
+
+class StreamViewer:
+    """One local viewer of a run's Redis Stream, fed by its ``_RunStreamReader``."""
+
+    def __init__(self, agent_run_id: str, last_id: str, queue_size: int):
+        self.agent_run_id = agent_run_id
+        self.last_id = last_id
+        # Entry IDs are None for frames the reader adds itself (errors, end of run)
+        self.queue: "asyncio.Queue[Optional[Tuple[Optional[str], Frame]]]" = asyncio.Queue(maxsize=queue_size)
+        self.evicted = False
+
+    async def frames(self) -> AsyncGenerator[str, None]:
+        """Yield the entries after ``last_id`` already in the stream, then live frames until the run ends."""
+        async for entry_id, (frame, end) in _read_entries(response_stream_key(self.agent_run_id), self.last_id):
+            self.last_id = entry_id
+            yield frame
+            if end:
+                return
+
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            entry_id, (frame, end) = item
+            if entry_id is not None:
+                # Registered before the backlog read, so the first live entries may repeat it
+                if _stream_id(entry_id) <= _stream_id(self.last_id):
+                    continue
+                self.last_id = entry_id
+            yield frame
+            if end:
+                return
+
+
+class _RunStreamReader:
+    """The one blocking XREAD loop for a run in this process, shared by its viewers."""
+
+    def __init__(
+        self,
+        hub: "ResponseStreamHub",
+        agent_run_id: str,
+        get_status: Optional[Callable[[], Awaitable[Optional[str]]]],
+    ):
+        self.hub = hub
+        self.agent_run_id = agent_run_id
+        self.key = response_stream_key(agent_run_id)
+        self.get_status = get_status
+
+        self.viewers: Set[StreamViewer] = set()
+        self.last_id = "0-0"
+        self.finished = False
+        self.ready = asyncio.Event()
+        self.error: Optional[Exception] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        try:
+            # Start from the newest entry; viewers read anything older themselves
+            latest = await redis.xrevrange(self.key, count=1)
+            if latest:
+                self.last_id = latest[0][0]
+            self._task = asyncio.create_task(self._read())
+        except Exception as e:
+            self.error = e
+            self.hub._forget(self)
+        finally:
+            self.ready.set()
+
+    async def _read(self) -> None:
+        ended_status: Optional[str] = None
+        try:
+            while not self.finished:
+                # Once the run has ended, read what is left without blocking, then stop
+                block = None if ended_status else STREAM_READ_BLOCK_MS
+                result = await redis.xread({self.key: self.last_id}, count=STREAM_READ_COUNT, block=block)
+                entries = result[0][1] if result else []
+                if not entries:
+                    if ended_status:
+                        logger.debug(f"Agent run {self.agent_run_id} is {ended_status} without an end entry in its stream")
+                        self._publish(None, (_status_frame(ended_status), True))
+                        break
+                    ended_status = await self._ended_status()
+                    continue
+                for entry_id, fields in entries:
+                    self.last_id = entry_id
+                    frame = _entry_frame(entry_id, fields)
+                    if frame is None:
+                        continue
+                    self._publish(entry_id, frame)
+                    if frame[1]:
+                        logger.debug(f"Detected run completion via status message in stream for {self.agent_run_id}")
+                        self.finished = True
+                        break
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error in stream reader for {self.agent_run_id}: {e}")
+            self._publish(None, (_status_frame('error', f'Stream failed: {e}'), True))
+        await self.close()
+
+    async def _ended_status(self) -> Optional[str]:
+        """The status to end viewers with if the run is over although no end entry arrived."""
+        if not await redis.exists(self.key):
+            return 'completed'
+        if self.get_status is None:
+            return None
+        try:
+            status = await self.get_status()
+        except Exception as e:
+            logger.warning(f"Failed to check the status of agent run {self.agent_run_id}: {e}")
+            return None
+        if status == 'running':
+            return None
+        return status if status in TERMINAL_STATUSES else 'completed'
+
+    def _publish(self, entry_id: Optional[str], frame: Frame) -> None:
+        for viewer in list(self.viewers):
+            try:
+                viewer.queue.put_nowait((entry_id, frame))
+            except asyncio.QueueFull:
+                self._evict(viewer)
+
+    def _evict(self, viewer: StreamViewer) -> None:
+        self.viewers.discard(viewer)
+        viewer.evicted = True
+        while not viewer.queue.empty():
+            viewer.queue.get_nowait()
+        viewer.queue.put_nowait((None, (_status_frame('error', 'Viewer fell too far behind; reconnect to resume'), True)))
+        self.hub._evictions += 1
+        logger.warning(f"Evicted slow stream viewer of agent run {self.agent_run_id}")
+        if not self.viewers and not self.finished:
+            self.hub._forget(self)
+            self._closing = asyncio.create_task(self.close())
+
+    def add_viewer(self, last_event_id: Optional[str]) -> StreamViewer:
+        viewer = StreamViewer(self.agent_run_id, _resume_id(last_event_id), self.hub.viewer_queue_size)
+        if self.finished:
+            # Everything the viewer can get is already in the stream
+            viewer.queue.put_nowait(None)
+        else:
+            self.viewers.add(viewer)
+        return viewer
+
+    async def remove_viewer(self, viewer: StreamViewer) -> None:
+        self.viewers.discard(viewer)
+        if not self.viewers:
+            await self.close()
+
+    async def close(self) -> None:
+        self.finished = True
+        self.hub._forget(self)
+        for viewer in list(self.viewers):
+            try:
+                viewer.queue.put_nowait(None)
+            except asyncio.QueueFull:
+                self._evict(viewer)
+        self.viewers.clear()
+
+        task, self._task = self._task, None
+        if task and task is not asyncio.current_task() and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                logger.debug(f"Stream reader for {self.agent_run_id} ended with: {e}")
+
+
+class ResponseStreamHub:
+    """Per-process fan-out of agent run Redis Streams to local viewers.
+
+    A blocking XREAD holds a pooled Redis connection for as long as it waits,
+    so viewers do not read live entries themselves: the first viewer of a run
+    starts one reader, which fans entries out to per-viewer queues. Each
+    viewer first reads the entries after its ``Last-Event-ID`` that are
+    already in the stream, without blocking, then follows the live feed.
+
+    The reader stops at the run's end entry. When no entry arrives for
+    ``STREAM_READ_BLOCK_MS``, it also stops if the stream is gone or
+    ``get_status`` reports that the run is no longer running, so a worker
+    that died without an end entry does not keep viewers following until
+    the stream expires. Slow viewers are evicted as in ``ResponseBroadcastHub``.
+    """
+
+    def __init__(self, viewer_queue_size: int = HUB_VIEWER_QUEUE_SIZE):
+        self.viewer_queue_size = viewer_queue_size
+        self._runs: Dict[str, _RunStreamReader] = {}
+        self._readers = 0
+        self._evictions = 0
+
+    async def subscribe(
+        self,
+        agent_run_id: str,
+        last_event_id: Optional[str] = None,
+        get_status: Optional[Callable[[], Awaitable[Optional[str]]]] = None,
+    ) -> StreamViewer:
+        run = self._runs.get(agent_run_id)
+        if run is None:
+            run = _RunStreamReader(self, agent_run_id, get_status)
+            self._runs[agent_run_id] = run
+            self._readers += 1
+            await run.start()
+        else:
+            await run.ready.wait()
+        if run.error is not None:
+            raise run.error
+        return run.add_viewer(last_event_id)
+
+    async def unsubscribe(self, viewer: StreamViewer) -> None:
+        run = self._runs.get(viewer.agent_run_id)
+        if run is not None and viewer in run.viewers:
+            await run.remove_viewer(viewer)
+
+    async def stream(
+        self,
+        agent_run_id: str,
+        last_event_id: Optional[str] = None,
+        get_status: Optional[Callable[[], Awaitable[Optional[str]]]] = None,
+    ) -> AsyncGenerator[str, None]:
+        """Yield SSE frames for a running run through the shared reader.
+
+        Args:
+            agent_run_id: The agent run to stream
+            last_event_id: Stream ID of the last frame the client received
+            get_status: Returns the run's current status from the database
+        """
+        viewer = await self.subscribe(agent_run_id, last_event_id, get_status)
+        try:
+            async for frame in viewer.frames():
+                yield frame
+        finally:
+            await self.unsubscribe(viewer)
+
+    def _forget(self, run: _RunStreamReader) -> None:
+        if self._runs.get(run.agent_run_id) is run:
+            del self._runs[run.agent_run_id]
+
+    def get_stats(self) -> Dict[str, Any]:
+        viewers_per_run = {run_id: len(run.viewers) for run_id, run in self._runs.items()}
+        return {
+            'runs': len(self._runs),
+            'viewers': sum(viewers_per_run.values()),
+            'viewers_per_run': viewers_per_run,
+            'readers_started': self._readers,
+            'evictions': self._evictions,
+        }
+
+
+response_stream_hub = ResponseStreamHub()
@@ -0,0 +1,179 @@
+"""
+Per-account index of running agent runs.
+
+``check_agent_run_limit`` used to list every thread the account ever created
+and count running runs with batched ``IN`` queries over ``agent_runs``, which
+costs dozens of queries for heavy users on every agent start. Instead each
+account has a Redis sorted set of its running run ids, scored by start time:
+
+- ``register`` adds a run when ``start_agent`` (or a trigger) inserts it
+- ``release`` removes it when ``update_agent_run_status`` moves it out of
+  ``running``
+- ``running_run_ids`` trims runs older than the limit window and reads the
+  rest in one round-trip
+
+A run whose release was lost (worker killed, Redis unavailable) would keep
+counting against the account, so a rejection is verified against the database
+before it is returned, and ``reconcile`` rewrites the index from the database
+for every account; run it periodically via
+``python -m core.utils.scripts.reconcile_running_runs``.
+"""
+
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.services.redis import get_client, scan_iter
+from core.utils.logger import logger
+
+RUN_WINDOW_SECONDS = 24 * 3600  # runs started earlier do not count against the limit
+RECONCILE_GRACE_SECONDS = 60    # runs younger than this may not be committed to the DB yet
+RECONCILE_PAGE_SIZE = 1000
+
+
+def _account_key(account_id: str) -> str:
+    return f"account:{account_id}:running_runs"
+
+
+def _owner_key(agent_run_id: str) -> str:
+    return f"agent_run:{agent_run_id}:account"
+
+
+def _timestamp(started_at: Optional[str]) -> float:
+    if not started_at:
+        return time.time()
+    return datetime.fromisoformat(started_at.replace('Z', '+00:00')).timestamp()
+
+
+class RunningRunCounter:
+    """Maintains the running-run sorted set of each account."""
+
+    def __init__(self, window_seconds: int = RUN_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self._registered = 0
+        self._released = 0
+        self._verifications = 0
+        self._reconciled_added = 0
+        self._reconciled_removed = 0
+
+    async def register(self, account_id: str, agent_run_id: str, started_at: Optional[float] = None) -> None:
+        """Count a newly started run against its account."""
+        redis_client = await get_client()
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.zadd(_account_key(account_id), {agent_run_id: started_at or time.time()})
+            pipe.expire(_account_key(account_id), self.window_seconds)
+            pipe.set(_owner_key(agent_run_id), account_id, ex=self.window_seconds)
+            await pipe.execute()
+        self._registered += 1
+
+    async def release(self, agent_run_id: str) -> None:
+        """Stop counting a run; a no-op for runs that were never registered."""
+        redis_client = await get_client()
+        account_id = await redis_client.get(_owner_key(agent_run_id))
+        if not account_id:
+            return
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.zrem(_account_key(account_id), agent_run_id)
+            pipe.delete(_owner_key(agent_run_id))
+            await pipe.execute()
+        self._released += 1
+
+    async def running_run_ids(self, account_id: str) -> List[str]:
+        """Return the ids of the account's runs started within the window."""
+        redis_client = await get_client()
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.zremrangebyscore(_account_key(account_id), '-inf', time.time() - self.window_seconds)
+            pipe.zrange(_account_key(account_id), 0, -1)
+            _, run_ids = await pipe.execute()
+        return run_ids
+
+    async def verify(self, client, account_id: str) -> List[Dict[str, Any]]:
+        """Rebuild one account's index from the database and return its running runs.
+
+        Used before rejecting a start, so a lost release cannot lock an account out.
+        """
+        self._verifications += 1
+        since = (datetime.now(timezone.utc) - timedelta(seconds=self.window_seconds)).isoformat()
+        result = await client.table('agent_runs')\
+            .select('id, thread_id, started_at, threads!inner(account_id)')\
+            .eq('threads.account_id', account_id)\
+            .eq('status', 'running')\
+            .gte('started_at', since)\
+            .execute()
+        runs = result.data or []
+        await self._replace(account_id, {run['id']: _timestamp(run.get('started_at')) for run in runs})
+        return runs
+
+    async def reconcile(self, client) -> Dict[str, int]:
+        """Rewrite the index of every account from the running runs in the database.
+
+        Runs registered in the last ``RECONCILE_GRACE_SECONDS`` are kept even if
+        the database does not show them yet.
+        """
+        since = (datetime.now(timezone.utc) - timedelta(seconds=self.window_seconds)).isoformat()
+        expected: Dict[str, Dict[str, float]] = {}
+        offset = 0
+        while True:
+            result = await client.table('agent_runs')\
+                .select('id, started_at, threads!inner(account_id)')\
+                .eq('status', 'running')\
+                .gte('started_at', since)\
+                .order('started_at')\
+                .range(offset, offset + RECONCILE_PAGE_SIZE - 1)\
+                .execute()
+            rows = result.data or []
+            for row in rows:
+                account_id = row['threads']['account_id']
+                expected.setdefault(account_id, {})[row['id']] = _timestamp(row.get('started_at'))
+            if len(rows) < RECONCILE_PAGE_SIZE:
+                break
+            offset += RECONCILE_PAGE_SIZE
+
+        accounts = set(expected)
+        async for key in scan_iter(_account_key('*')):
+            accounts.add(key.split(':')[1])
+
+        added = removed = 0
+        for account_id in accounts:
+            a, r = await self._replace(account_id, expected.get(account_id, {}))
+            added += a
+            removed += r
+        self._reconciled_added += added
+        self._reconciled_removed += removed
+        logger.info(f"Reconciled running runs for {len(accounts)} accounts: {added} added, {removed} removed")
+        return {'accounts': len(accounts), 'added': added, 'removed': removed}
+
+    async def _replace(self, account_id: str, runs: Dict[str, float]) -> Tuple[int, int]:
+        redis_client = await get_client()
+        key = _account_key(account_id)
+        current = dict(await redis_client.zrange(key, 0, -1, withscores=True))
+        grace_cutoff = time.time() - RECONCILE_GRACE_SECONDS
+        stale = [run_id for run_id, score in current.items() if run_id not in runs and score < grace_cutoff]
+        missing = {run_id: score for run_id, score in runs.items() if run_id not in current}
+        if not stale and not missing:
+            return 0, 0
+        async with redis_client.pipeline(transaction=True) as pipe:
+            if stale:
+                pipe.zrem(key, *stale)
+                pipe.delete(*[_owner_key(run_id) for run_id in stale])
+            if missing:
+                pipe.zadd(key, missing)
+                pipe.expire(key, self.window_seconds)
+                for run_id in missing:
+                    pipe.set(_owner_key(run_id), account_id, ex=self.window_seconds)
+            await pipe.execute()
+        if stale:
+            logger.warning(f"Dropped {len(stale)} stale running runs from the index of account {account_id}")
+        return len(missing), len(stale)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'registered': self._registered,
+            'released': self._released,
+            'verifications': self._verifications,
+            'reconciled_added': self._reconciled_added,
+            'reconciled_removed': self._reconciled_removed,
+        }
+
+
+running_runs = RunningRunCounter()
@@ -1,9 +1,24 @@
 """
 Centralized database connection management for AgentPress using Supabase.
+
+Every Supabase client created here talks to PostgREST through a connection
+pool built from the ``SUPABASE_*`` transport settings (HTTP/2, keep-alive
+pool size, timeouts) instead of the library defaults. The pool is shared by
+every PostgREST client the Supabase client creates, including the ones built
+by ``.schema()`` and after auth events, while each keeps its own headers.
+Workloads listed in ``SUPABASE_CLIENT_WORKLOADS`` get their own client and
+connection pool, so slow admin or reporting queries cannot hold up the
+message hot path. Each pool records per-table request latency; see
+``DBConnection.get_stats``.
 """
 
-from typing import Optional
-from supabase import create_async_client, AsyncClient
+import importlib.util
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Optional, Tuple
+from supabase import AsyncClient
+from postgrest import AsyncPostgrestClient
+import httpx
 from core.utils.logger import logger
 from core.utils.config import config
 import base64
@@ -11,9 +26,150 @@ import uuid
 from datetime import datetime
 import threading
 
+DEFAULT_WORKLOAD = "default"
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec('h2') is not None
+
+
+def _endpoint(path: str) -> str:
+    """Map a PostgREST path (/rest/v1/<table> or /rest/v1/rpc/<fn>) to a metrics label."""
+    parts = [part for part in path.split('/') if part]
+    if len(parts) >= 4 and parts[2] == 'rpc':
+        return f"rpc:{parts[3]}"
+    if len(parts) >= 3:
+        return parts[2]
+    return path
+
+
+class _PooledTransport(httpx.AsyncBaseTransport):
+    """One workload's PostgREST connection pool, with per-endpoint latency histograms.
+
+    Every httpx client of the workload sends through this transport, so they
+    share its connections. Closing one of those clients leaves the pool open;
+    ``aclose_pool`` closes it. Latency is measured until response headers arrive.
+    """
+
+    def __init__(self, workload: str):
+        self.workload = workload
+        self.http2 = config.SUPABASE_HTTP2 and _http2_available()
+        if config.SUPABASE_HTTP2 and not self.http2:
+            logger.warning("SUPABASE_HTTP2 is enabled but the h2 package is not installed; using HTTP/1.1")
+        self._pool = httpx.AsyncHTTPTransport(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=config.SUPABASE_MAX_CONNECTIONS,
+                max_keepalive_connections=config.SUPABASE_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=config.SUPABASE_KEEPALIVE_EXPIRY,
+            ),
+        )
+        self._histograms: Dict[Tuple[str, str], list] = {}
+        self._totals: Dict[Tuple[str, str], Tuple[int, float]] = {}
+        self._in_flight = 0
+        self._requests = 0
+        self._errors = 0
+        self._transport_errors = 0
+
+    def http_client(self) -> httpx.AsyncClient:
+        """A new httpx client sending through this pool, for one PostgREST client."""
+        return httpx.AsyncClient(
+            transport=self,
+            follow_redirects=True,
+            timeout=httpx.Timeout(
+                config.SUPABASE_REQUEST_TIMEOUT,
+                connect=config.SUPABASE_CONNECT_TIMEOUT,
+                pool=config.SUPABASE_POOL_TIMEOUT,
+            ),
+        )
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started_at = time.perf_counter()
+        self._in_flight += 1
+        self._requests += 1
+        try:
+            response = await self._pool.handle_async_request(request)
+        except Exception:
+            self._transport_errors += 1
+            raise
+        finally:
+            self._in_flight -= 1
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        key = (_endpoint(request.url.path), request.method)
+        buckets = self._histograms.setdefault(key, [0] * (len(LATENCY_BUCKETS_MS) + 1))
+        buckets[bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+        count, total = self._totals.get(key, (0, 0.0))
+        self._totals[key] = (count + 1, total + elapsed_ms)
+        if response.status_code >= 500:
+            self._errors += 1
+        return response
+
+    async def aclose(self) -> None:
+        # Called by every httpx client using the pool; the pool outlives them
+        pass
+
+    async def aclose_pool(self) -> None:
+        await self._pool.aclose()
+
+    def get_stats(self) -> Dict[str, Any]:
+        endpoints = {}
+        for (endpoint, method), buckets in self._histograms.items():
+            count, total = self._totals[(endpoint, method)]
+            endpoints[f"{method} {endpoint}"] = {
+                'count': count,
+                'mean_ms': round(total / count, 2) if count else 0.0,
+                'buckets_ms': dict(zip([str(b) for b in LATENCY_BUCKETS_MS] + ['+Inf'], buckets)),
+            }
+        return {
+            'pool': {
+                'http2': self.http2,
+                'max_connections': config.SUPABASE_MAX_CONNECTIONS,
+                'in_flight': self._in_flight,
+                'requests': self._requests,
+            },
+            'server_errors': self._errors,
+            'transport_errors': self._transport_errors,
+            'endpoints': endpoints,
+        }
+
+
+class _PooledPostgrestClient(AsyncPostgrestClient):
+    """PostgREST client whose ``.schema()`` clients use the same connection pool."""
+
+    def __init__(self, base_url: str, *, transport: _PooledTransport, **kwargs):
+        self.transport = transport
+        super().__init__(base_url, http_client=transport.http_client(), **kwargs)
+
+    def schema(self, schema: str) -> "_PooledPostgrestClient":
+        return _PooledPostgrestClient(self.base_url, transport=self.transport, schema=schema, headers=self.headers)
+
+
+class _PooledAsyncClient(AsyncClient):
+    """Supabase client that builds its PostgREST clients on a workload's pool.
+
+    Only PostgREST goes through the pool; auth, storage and functions keep
+    their own httpx clients, since they rewrite the client's base URL.
+    """
+
+    transport: _PooledTransport
+
+    @property
+    def postgrest(self):
+        # Rebuilt after auth events reset _postgrest, like the base property
+        if self._postgrest is None:
+            self._postgrest = _PooledPostgrestClient(
+                self.rest_url,
+                transport=self.transport,
+                schema=self.options.schema,
+                headers=self.options.headers,
+            )
+        return self._postgrest
+
+
 class DBConnection:
     """Thread-safe singleton database connection manager using Supabase."""
-    
+
     _instance: Optional['DBConnection'] = None
     _lock = threading.Lock()
 
@@ -25,6 +181,8 @@ class DBConnection:
                     cls._instance = super().__new__(cls)
                     cls._instance._initialized = False
                     cls._instance._client = None
+                    cls._instance._workload_clients = {}
+                    cls._instance._metrics = {}
         return cls._instance
 
     def __init__(self):
@@ -35,47 +193,61 @@ class DBConnection:
         """Initialize the database connection."""
         if self._initialized:
             return
-                
+
         try:
             supabase_url = config.SUPABASE_URL
             # Use service role key preferentially for backend operations
             supabase_key = config.SUPABASE_SERVICE_ROLE_KEY or config.SUPABASE_ANON_KEY
-            
+
             if not supabase_url or not supabase_key:
                 logger.error("Missing required environment variables for Supabase connection")
                 raise RuntimeError("SUPABASE_URL and a key (SERVICE_ROLE_KEY or ANON_KEY) environment variables must be set.")
 
             # logger.debug("Initializing Supabase connection")
-            
-            # Create Supabase client with timeout configuration
-            self._client = await create_async_client(
-                supabase_url, 
-                supabase_key,
-            )
-            
+
+            self._client = await self._create_client(DEFAULT_WORKLOAD, supabase_url, supabase_key)
+            workloads = [w.strip() for w in (config.SUPABASE_CLIENT_WORKLOADS or "").split(',') if w.strip()]
+            for workload in workloads:
+                if workload != DEFAULT_WORKLOAD:
+                    self._workload_clients[workload] = await self._create_client(workload, supabase_url, supabase_key)
+
             self._initialized = True
             key_type = "SERVICE_ROLE_KEY" if config.SUPABASE_SERVICE_ROLE_KEY else "ANON_KEY"
-            logger.info(f"Database connection initialized with Supabase using {key_type}")
-            
+            logger.info(f"Database connection initialized with Supabase using {key_type}"
+                        f"{f' (dedicated pools: {list(self._workload_clients)})' if self._workload_clients else ''}")
+
         except Exception as e:
             logger.error(f"Database initialization error: {e}")
             raise RuntimeError(f"Failed to initialize database connection: {str(e)}")
 
+    async def _create_client(self, workload: str, supabase_url: str, supabase_key: str) -> AsyncClient:
+        """Create a Supabase client whose PostgREST clients use the workload's tuned pool."""
+        transport = _PooledTransport(workload)
+        client = await _PooledAsyncClient.create(supabase_url, supabase_key)
+        # create() builds no PostgREST client, so every one of them gets the pool
+        client.transport = transport
+        self._metrics[workload] = transport
+        return client
+
     @classmethod
     async def disconnect(cls):
         """Disconnect from the database."""
         if cls._instance and cls._instance._client:
             # logger.debug("Disconnecting from Supabase database")
             try:
+                for transport in cls._instance._metrics.values():
+                    await transport.aclose_pool()
                 # Close Supabase client
                 if hasattr(cls._instance._client, 'close'):
                     await cls._instance._client.close()
-                    
+
             except Exception as e:
                 logger.warning(f"Error during disconnect: {e}")
             finally:
                 cls._instance._initialized = False
                 cls._instance._client = None
+                cls._instance._workload_clients = {}
+                cls._instance._metrics = {}
                 logger.info("Database disconnected successfully")
 
     @property
@@ -88,3 +260,16 @@ class DBConnection:
             logger.error("Database client is None after initialization")
             raise RuntimeError("Database not initialized")
         return self._client
+
+    async def client_for(self, workload: str) -> AsyncClient:
+        """Get the client for a workload, falling back to the default client.
+
+        A workload only has a dedicated client (and connection pool) when it is
+        listed in ``SUPABASE_CLIENT_WORKLOADS``.
+        """
+        default_client = await self.client
+        return self._workload_clients.get(workload, default_client)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Pool utilization and per-endpoint latency histograms for each workload."""
+        return {workload: transport.get_stats() for workload, transport in self._metrics.items()}
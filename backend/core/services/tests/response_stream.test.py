@@ -0,0 +1,71 @@
+"""Tests for the batched agent run response writer, against an in-memory fake of the Redis helpers."""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from core.services import response_stream as response_stream_module
+from core.services.response_stream import ResponseStreamWriter
+
+
+class FakeRedisHelpers:
+    """Records what ``rpush_and_publish`` wrote, taking ``delay`` seconds per call."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.written = []
+
+    async def rpush_and_publish(self, key, values, channel, message, **kwargs):
+        await asyncio.sleep(self.delay)
+        self.written.extend(json.loads(value) for value in values)
+
+
+@pytest.fixture
+def redis_helpers(monkeypatch):
+    helpers = FakeRedisHelpers()
+    monkeypatch.setattr(response_stream_module, "redis", SimpleNamespace(rpush_and_publish=helpers.rpush_and_publish))
+    return helpers
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+class TestResponseStreamWriter:
+    async def test_close_flushes_buffered_responses(self, redis_helpers):
+        writer = ResponseStreamWriter("run-1", flush_interval=10)
+        await writer.write({'type': 'assistant', 'content': 'hello'})
+        await writer.close()
+
+        assert redis_helpers.written == [{'type': 'assistant', 'content': 'hello'}]
+        assert writer.get_stats()['buffered'] == 0
+
+    async def test_close_waits_for_a_flush_the_timer_started(self, redis_helpers):
+        redis_helpers.delay = 0.2
+        writer = ResponseStreamWriter("run-1", flush_interval=0.01)
+        await writer.write({'type': 'assistant', 'content': 'hello'})
+        await asyncio.sleep(0.05)  # the timer is now inside its flush
+        await writer.write({'type': 'status', 'status': 'completed'})
+        await writer.close()
+
+        assert redis_helpers.written == [
+            {'type': 'assistant', 'content': 'hello'},
+            {'type': 'status', 'status': 'completed'},
+        ]
+        assert writer.get_stats()['buffered'] == 0
+
+    async def test_cancelled_flush_keeps_its_batch(self, redis_helpers):
+        redis_helpers.delay = 0.2
+        writer = ResponseStreamWriter("run-1", flush_interval=10)
+        await writer.write({'type': 'assistant', 'content': 'hello'})
+        flush = asyncio.create_task(writer.flush())
+        await asyncio.sleep(0.05)
+        flush.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await flush
+
+        assert writer.get_stats()['buffered'] == 1
+        assert writer.get_stats()['failed_flushes'] == 0
+        redis_helpers.delay = 0.0
+        await writer.close()
+        assert redis_helpers.written == [{'type': 'assistant', 'content': 'hello'}]
@@ -0,0 +1,110 @@
+"""Tests for the per-account index of running agent runs, against in-memory fakes of Redis and Supabase."""
+
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from core.services import redis as redis_module
+from core.services import running_runs as running_runs_module
+from core.services.running_runs import RECONCILE_GRACE_SECONDS, RunningRunCounter
+
+ACCOUNT = "account-1"
+
+
+class FakeQuery:
+    def __init__(self, rows):
+        self.rows = rows
+        self.offset = 0
+        self.limit = None
+
+    def __getattr__(self, name):
+        # select/eq/gte/order filters are applied by the test when building the rows
+        return lambda *args, **kwargs: self
+
+    def range(self, start, end):
+        self.offset, self.limit = start, end - start + 1
+        return self
+
+    async def execute(self):
+        rows = self.rows[self.offset:]
+        return SimpleNamespace(data=rows if self.limit is None else rows[:self.limit])
+
+
+class FakeClient:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def table(self, name):
+        return FakeQuery(self.rows)
+
+
+def running_row(run_id, account_id=ACCOUNT, thread_id="thread-1"):
+    return {'id': run_id, 'thread_id': thread_id, 'started_at': datetime.now(timezone.utc).isoformat(), 'threads': {'account_id': account_id}}
+
+
+@pytest.fixture
+def redis_client(monkeypatch, fake_redis):
+    async def get_client():
+        return fake_redis
+
+    monkeypatch.setattr(running_runs_module, "get_client", get_client)
+    monkeypatch.setattr(redis_module, "get_client", get_client)
+    return fake_redis
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+class TestRunningRunCounter:
+    async def test_register_and_release(self, redis_client):
+        counter = RunningRunCounter()
+        await counter.register(ACCOUNT, "run-1")
+        await counter.register(ACCOUNT, "run-2")
+        assert sorted(await counter.running_run_ids(ACCOUNT)) == ["run-1", "run-2"]
+
+        await counter.release("run-1")
+        assert await counter.running_run_ids(ACCOUNT) == ["run-2"]
+        assert counter.get_stats()['released'] == 1
+
+    async def test_release_of_unregistered_run_is_a_noop(self, redis_client):
+        counter = RunningRunCounter()
+        await counter.release("unknown")
+        assert counter.get_stats()['released'] == 0
+
+    async def test_runs_outside_the_window_are_not_counted(self, redis_client):
+        counter = RunningRunCounter(window_seconds=3600)
+        await counter.register(ACCOUNT, "old", started_at=time.time() - 7200)
+        await counter.register(ACCOUNT, "recent")
+        assert await counter.running_run_ids(ACCOUNT) == ["recent"]
+
+    async def test_verify_rebuilds_the_index_from_the_database(self, redis_client):
+        counter = RunningRunCounter()
+        # A release that was lost long ago, and a run the database has but the index missed
+        await counter.register(ACCOUNT, "lost", started_at=time.time() - RECONCILE_GRACE_SECONDS - 1)
+        runs = await counter.verify(FakeClient([running_row("db-only")]), ACCOUNT)
+
+        assert [run['id'] for run in runs] == ["db-only"]
+        assert await counter.running_run_ids(ACCOUNT) == ["db-only"]
+        assert redis_client.values == {"agent_run:db-only:account": ACCOUNT}
+
+    async def test_verify_keeps_runs_registered_within_the_grace_period(self, redis_client):
+        counter = RunningRunCounter()
+        # Registered by start_agent, but its insert is not visible to the query yet
+        await counter.register(ACCOUNT, "just-started")
+        await counter.verify(FakeClient([]), ACCOUNT)
+        assert await counter.running_run_ids(ACCOUNT) == ["just-started"]
+
+    async def test_reconcile_rewrites_every_account(self, redis_client, monkeypatch):
+        monkeypatch.setattr(running_runs_module, "RECONCILE_PAGE_SIZE", 2)
+        counter = RunningRunCounter()
+        stale_score = time.time() - RECONCILE_GRACE_SECONDS - 1
+        await counter.register("account-2", "finished", started_at=stale_score)
+        rows = [running_row("run-1"), running_row("run-2"), running_row("run-3", account_id="account-3")]
+
+        result = await counter.reconcile(FakeClient(rows))
+
+        assert result == {'accounts': 3, 'added': 3, 'removed': 1}
+        assert sorted(await counter.running_run_ids(ACCOUNT)) == ["run-1", "run-2"]
+        assert await counter.running_run_ids("account-2") == []
+        assert await counter.running_run_ids("account-3") == ["run-3"]
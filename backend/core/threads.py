@@ -7,7 +7,10 @@ from fastapi import APIRouter, HTTPException, Depends, Form, Query
 
 from core.utils.auth_utils import verify_and_get_user_id_from_jwt, verify_and_authorize_thread_access, require_thread_access, AuthorizedThreadAccess
 from core.utils.logger import logger
+from core.utils.pagination import PaginationService
+from core.services.projections import THREAD_SUMMARY, PROJECT_SUMMARY, MESSAGE, AGENT_RUN_SUMMARY
 from core.sandbox.sandbox import create_sandbox, delete_sandbox
+from core.agentpress.message_cache import mark_changed as mark_messages_changed
 
 from .api_models import CreateThreadResponse, MessageCreateRequest
 from . import core_utils as utils
@@ -17,41 +20,43 @@ router = APIRouter()
 @router.get("/threads")
 async def get_user_threads(
     user_id: str = Depends(verify_and_get_user_id_from_jwt),
-    page: Optional[int] = Query(1, ge=1, description="Page number (1-based)"),
-    limit: Optional[int] = Query(1000, ge=1, le=1000, description="Number of items per page (max 1000)")
+    page: Optional[int] = Query(1, ge=1, description="Page number (1-based); ignored when cursor is set"),
+    limit: Optional[int] = Query(1000, ge=1, le=1000, description="Number of items per page (max 1000)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page")
 ):
-    """Get all threads for the current user with associated project data."""
-    logger.debug(f"Fetching threads with project data for user: {user_id} (page={page}, limit={limit})")
+    """Get threads for the current user with associated project data, newest first.
+
+    Pass the returned next_cursor to fetch the following page; cursor pages skip the
+    total count, so their cost does not grow with the number of threads.
+    """
+    logger.debug(f"Fetching threads with project data for user: {user_id} (page={page}, limit={limit}, cursor={bool(cursor)})")
     client = await utils.db.client
     try:
-        offset = (page - 1) * limit
-        
-        # First, get threads for the user
-        threads_result = await client.table('threads').select('*').eq('account_id', user_id).order('created_at', desc=True).execute()
-        
-        if not threads_result.data:
-            logger.debug(f"No threads found for user: {user_id}")
-            return {
-                "threads": [],
-                "pagination": {
-                    "page": page,
-                    "limit": limit,
-                    "total": 0,
-                    "pages": 0
-                }
-            }
-        
-        total_count = len(threads_result.data)
-        
-        # Apply pagination to threads
-        paginated_threads = threads_result.data[offset:offset + limit]
+        query = client.table('threads').select(THREAD_SUMMARY.select).eq('account_id', user_id)
+        try:
+            query = PaginationService.apply_keyset(query, cursor, 'created_at', 'thread_id')
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        total_count = None
+        if cursor:
+            page = None
+            threads_result = await query.limit(limit + 1).execute()
+        else:
+            offset = (page - 1) * limit
+            count_result = await client.table('threads').select('thread_id', count='exact').eq('account_id', user_id).limit(1).execute()
+            total_count = count_result.count or 0
+            threads_result = await query.range(offset, offset + limit).execute()
+
+        paginated_threads, next_cursor = PaginationService.keyset_page(
+            threads_result.data or [], limit, 'created_at', 'thread_id'
+        )
         
         # Extract unique project IDs from threads that have them
-        project_ids = [
+        unique_project_ids = list({
             thread['project_id'] for thread in paginated_threads 
             if thread.get('project_id')
-        ]
-        unique_project_ids = list(set(project_ids)) if project_ids else []
+        })
         
         # Fetch projects if we have project IDs
         projects_by_id = {}
@@ -61,7 +66,7 @@ async def get_user_threads(
             projects_data = await batch_query_in(
                 client=client,
                 table_name='projects',
-                select_fields='*',
+                select_fields=PROJECT_SUMMARY.select,
                 in_field='project_id',
                 in_values=unique_project_ids
             )
@@ -81,6 +86,7 @@ async def get_user_threads(
                 project = projects_by_id[thread['project_id']]
                 project_data = {
                     "project_id": project['project_id'],
+                    "account_id": project.get('account_id'),
                     "name": project.get('name', ''),
                     "description": project.get('description', ''),
                     "sandbox": project.get('sandbox', {}),
@@ -91,6 +97,7 @@ async def get_user_threads(
             
             mapped_thread = {
                 "thread_id": thread['thread_id'],
+                "account_id": thread.get('account_id'),
                 "project_id": thread.get('project_id'),
                 "metadata": thread.get('metadata', {}),
                 "is_public": thread.get('is_public', False),
@@ -100,7 +107,7 @@ async def get_user_threads(
             }
             mapped_threads.append(mapped_thread)
         
-        total_pages = (total_count + limit - 1) // limit if total_count else 0
+        total_pages = (total_count + limit - 1) // limit if total_count else (None if cursor else 0)
         
         logger.debug(f"[API] Mapped threads for frontend: {len(mapped_threads)} threads, {len(projects_by_id)} unique projects")
         
@@ -110,10 +117,14 @@ async def get_user_threads(
                 "page": page,
                 "limit": limit,
                 "total": total_count,
-                "pages": total_pages
+                "pages": total_pages,
+                "next_cursor": next_cursor,
+                "has_more": next_cursor is not None
             }
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching threads for user {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch threads: {str(e)}")
@@ -132,7 +143,7 @@ async def get_thread(
         # No need for manual authorization - it's already done in the dependency!
         
         # Get the thread data
-        thread_result = await client.table('threads').select('*').eq('thread_id', thread_id).execute()
+        thread_result = await client.table('threads').select(THREAD_SUMMARY.select).eq('thread_id', thread_id).execute()
         
         if not thread_result.data:
             raise HTTPException(status_code=404, detail="Thread not found")
@@ -142,13 +153,14 @@ async def get_thread(
         # Get associated project if thread has a project_id
         project_data = None
         if thread.get('project_id'):
-            project_result = await client.table('projects').select('*').eq('project_id', thread['project_id']).execute()
+            project_result = await client.table('projects').select(PROJECT_SUMMARY.select).eq('project_id', thread['project_id']).execute()
             
             if project_result.data:
                 project = project_result.data[0]
                 logger.debug(f"[API] Raw project from DB for thread {thread_id}")
                 project_data = {
                     "project_id": project['project_id'],
+                    "account_id": project.get('account_id'),
                     "name": project.get('name', ''),
                     "description": project.get('description', ''),
                     "sandbox": project.get('sandbox', {}),
@@ -158,11 +170,11 @@ async def get_thread(
                 }
         
         # Get message count for the thread
-        message_count_result = await client.table('messages').select('message_id', count='exact').eq('thread_id', thread_id).execute()
+        message_count_result = await client.table('messages').select('message_id', count='exact').eq('thread_id', thread_id).limit(1).execute()
         message_count = message_count_result.count if message_count_result.count is not None else 0
         
         # Get recent agent runs for the thread
-        agent_runs_result = await client.table('agent_runs').select('*').eq('thread_id', thread_id).order('created_at', desc=True).execute()
+        agent_runs_result = await client.table('agent_runs').select(AGENT_RUN_SUMMARY.select).eq('thread_id', thread_id).order('created_at', desc=True).execute()
         agent_runs_data = []
         if agent_runs_result.data:
             agent_runs_data = [{
@@ -179,6 +191,7 @@ async def get_thread(
         # Map thread data for frontend (matching actual DB structure)
         mapped_thread = {
             "thread_id": thread['thread_id'],
+            "account_id": thread.get('account_id'),
             "project_id": thread.get('project_id'),
             "metadata": thread.get('metadata', {}),
             "is_public": thread.get('is_public', False),
@@ -305,28 +318,43 @@ async def create_thread(
 async def get_thread_messages(
     thread_id: str,
     user_id: str = Depends(verify_and_get_user_id_from_jwt),
-    order: str = Query("desc", description="Order by created_at: 'asc' or 'desc'")
+    order: str = Query("desc", description="Order by created_at: 'asc' or 'desc'"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Return one page of this many messages instead of all of them"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page")
 ):
-    """Get all messages for a thread, fetching in batches of 1000 from the DB to avoid large queries."""
-    logger.debug(f"Fetching all messages for thread: {thread_id}, order={order}")
+    """Get messages for a thread, paged by (created_at, message_id).
+
+    Without limit or cursor every message is returned, read in keyset batches of 1000
+    so each batch costs the same however deep into the thread it starts.
+    """
+    logger.debug(f"Fetching messages for thread: {thread_id}, order={order}, limit={limit}, cursor={bool(cursor)}")
     client = await utils.db.client
     await verify_and_authorize_thread_access(client, thread_id, user_id)
+    desc = order == "desc"
+
+    async def fetch_page(page_cursor: Optional[str], page_size: int):
+        query = client.table('messages').select(MESSAGE.select).eq('thread_id', thread_id)
+        query = PaginationService.apply_keyset(query, page_cursor, 'created_at', 'message_id', desc=desc)
+        messages_result = await query.limit(page_size + 1).execute()
+        return PaginationService.keyset_page(messages_result.data or [], page_size, 'created_at', 'message_id')
+
     try:
+        if limit or cursor:
+            messages, next_cursor = await fetch_page(cursor, limit or 100)
+            return {"messages": messages, "next_cursor": next_cursor}
+
         batch_size = 1000
-        offset = 0
         all_messages = []
+        next_cursor = None
         while True:
-            query = client.table('messages').select('*').eq('thread_id', thread_id)
-            query = query.order('created_at', desc=(order == "desc"))
-            query = query.range(offset, offset + batch_size - 1)
-            messages_result = await query.execute()
-            batch = messages_result.data or []
+            batch, next_cursor = await fetch_page(next_cursor, batch_size)
             all_messages.extend(batch)
-            logger.debug(f"Fetched batch of {len(batch)} messages (offset {offset})")
-            if len(batch) < batch_size:
+            logger.debug(f"Fetched batch of {len(batch)} messages")
+            if not next_cursor:
                 break
-            offset += batch_size
         return {"messages": all_messages}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching messages for thread {thread_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch messages: {str(e)}")
@@ -431,6 +459,8 @@ async def delete_message(
     try:
         # Don't allow users to delete the "status" messages
         await client.table('messages').delete().eq('message_id', message_id).eq('is_llm_message', True).eq('thread_id', thread_id).execute()
+        # Workers cache LLM messages per thread; make them reload without the deleted row
+        await mark_messages_changed(thread_id)
         return {"message": "Message deleted successfully"}
     except Exception as e:
         logger.error(f"Error deleting message {message_id} from thread {thread_id}: {str(e)}")
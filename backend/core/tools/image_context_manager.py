@@ -6,6 +6,7 @@ Handles loading, storing, and removing images from conversation context.
 import json
 from typing import Dict, Any, Optional, List, TYPE_CHECKING
 from core.services.supabase import DBConnection
+from core.agentpress.message_cache import message_cache, mark_changed as mark_messages_changed
 from core.utils.logger import logger
 
 if TYPE_CHECKING:
@@ -68,6 +69,8 @@ class ImageContextManager:
                     'metadata': metadata
                 }).execute()
                 result = db_result.data[0] if db_result.data and len(db_result.data) > 0 else None
+                if result:
+                    message_cache.add_row(thread_id, result)
             
             if result:
                 logger.debug(f"Added image to context: {file_path}")
@@ -95,6 +98,7 @@ class ImageContextManager:
             ).execute()
             
             deleted_count = len(result.data) if result.data else 0
+            await mark_messages_changed(thread_id)
             logger.debug(f"Cleared {deleted_count} images from context")
             return deleted_count
             
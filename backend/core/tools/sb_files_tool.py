@@ -1,5 +1,6 @@
 from core.agentpress.tool import ToolResult, openapi_schema, usage_example
 from core.sandbox.tool_base import SandboxToolsBase
+from core.sandbox.manifest import workspace_manifests
 from core.utils.files_utils import should_exclude_file, clean_path
 from core.agentpress.thread_manager import ThreadManager
 from core.utils.logger import logger
@@ -9,6 +10,7 @@ import json
 import litellm
 import openai
 import asyncio
+from datetime import datetime, timezone
 from typing import Optional
 
 class SandboxFilesTool(SandboxToolsBase):
@@ -42,25 +44,18 @@ class SandboxFilesTool(SandboxToolsBase):
             # Ensure sandbox is initialized
             await self._ensure_sandbox()
             
-            files = await self.sandbox.fs.list_files(self.workspace_path)
-            for file_info in files:
-                rel_path = file_info.name
-                
-                # Skip excluded files and directories
-                if self._should_exclude_file(rel_path) or file_info.is_dir:
-                    continue
-
+            # Only files that changed since the last snapshot are downloaded
+            manifest = workspace_manifests.get(self.sandbox_id, self.workspace_path)
+            contents = await manifest.snapshot(self.sandbox, include=lambda rel_path: not self._should_exclude_file(rel_path))
+            for rel_path, content in contents.items():
+                entry = manifest.entries[rel_path]
                 try:
-                    full_path = f"{self.workspace_path}/{rel_path}"
-                    content = (await self.sandbox.fs.download_file(full_path)).decode()
                     files_state[rel_path] = {
-                        "content": content,
-                        "is_dir": file_info.is_dir,
-                        "size": file_info.size,
-                        "modified": file_info.mod_time
+                        "content": content.decode(),
+                        "is_dir": False,
+                        "size": entry.size,
+                        "modified": datetime.fromtimestamp(entry.mtime, timezone.utc).isoformat()
                     }
-                except Exception as e:
-                    print(f"Error reading file {rel_path}: {e}")
                 except UnicodeDecodeError:
                     print(f"Skipping binary file: {rel_path}")
 
@@ -140,6 +135,7 @@ class SandboxFilesTool(SandboxToolsBase):
             # Write the file content
             await self.sandbox.fs.upload_file(file_contents.encode(), full_path)
             await self.sandbox.fs.set_file_permissions(full_path, permissions)
+            workspace_manifests.record_write(self.sandbox_id, full_path, file_contents.encode())
             
             message = f"File '{file_path}' created successfully."
             
@@ -215,6 +211,7 @@ class SandboxFilesTool(SandboxToolsBase):
             # Perform replacement
             new_content = content.replace(old_str, new_str)
             await self.sandbox.fs.upload_file(new_content.encode(), full_path)
+            workspace_manifests.record_write(self.sandbox_id, full_path, new_content.encode())
             
             # Show snippet around the edit
             replacement_line = content.split(old_str)[0].count('\n')
@@ -284,6 +281,7 @@ class SandboxFilesTool(SandboxToolsBase):
 
             await self.sandbox.fs.upload_file(file_contents.encode(), full_path)
             await self.sandbox.fs.set_file_permissions(full_path, permissions)
+            workspace_manifests.record_write(self.sandbox_id, full_path, file_contents.encode())
             
             message = f"File '{file_path}' completely rewritten successfully."
             
@@ -336,6 +334,7 @@ class SandboxFilesTool(SandboxToolsBase):
                 return self.fail_response(f"File '{file_path}' does not exist")
             
             await self.sandbox.fs.delete_file(full_path)
+            workspace_manifests.record_delete(self.sandbox_id, full_path)
             return self.success_response(f"File '{file_path}' deleted successfully.")
         except Exception as e:
             return self.fail_response(f"Error deleting file: {str(e)}")
@@ -562,6 +561,7 @@ def authenticate_user(username, password):
                 }))
 
             await self.sandbox.fs.upload_file(new_content.encode(), full_path)
+            workspace_manifests.record_write(self.sandbox_id, full_path, new_content.encode())
             
             return ToolResult(success=True, output=json.dumps({
                 "message": f"File '{target_file}' edited successfully.",
@@ -2,6 +2,7 @@ import asyncio
 from typing import Optional, List
 from core.agentpress.tool import ToolResult, openapi_schema, usage_example
 from core.sandbox.tool_base import SandboxToolsBase
+from core.sandbox.transfer import upload_files, member_name
 from core.agentpress.thread_manager import ThreadManager
 from core.utils.config import config
 from knowledge_base.validation import FileNameValidator, ValidationError
@@ -354,46 +355,41 @@ class SandboxKbTool(SandboxToolsBase):
                     "kb_directory": "~/knowledge-base-global"
                 })
             
-            # Create knowledge base directory in sandbox
             kb_dir = "knowledge-base-global"
-            await self.sandbox.process.exec(f"mkdir -p ~/{kb_dir}")
             await self.sandbox.process.exec(f"rm -rf ~/{kb_dir}/*")
             
-            synced_files = 0
             folder_structure = {}
             
-            for assignment in result.data:
-                if not assignment.get('knowledge_base_entries'):
-                    continue
-                    
-                entry = assignment['knowledge_base_entries']
-                folder_name = entry['knowledge_base_folders']['name']
-                filename = entry['filename']
-                file_path = entry['file_path']  # S3 path
-                
-                try:
-                    # Download file from S3
-                    file_response = await client.storage.from_('file-uploads').download(file_path)
-                    
-                    if not file_response:
+            async def kb_files():
+                for assignment in result.data:
+                    if not assignment.get('knowledge_base_entries'):
                         continue
+                        
+                    entry = assignment['knowledge_base_entries']
+                    folder_name = entry['knowledge_base_folders']['name']
+                    filename = entry['filename']
+                    file_path = entry['file_path']  # S3 path
                     
-                    # Create folder structure in sandbox
-                    folder_path = f"~/{kb_dir}/{folder_name}"
-                    await self.sandbox.process.exec(f"mkdir -p '{folder_path}'")
-                    
-                    # Upload file to sandbox
-                    file_destination = f"{kb_dir}/{folder_name}/{filename}"
-                    await self.sandbox.fs.upload_file(file_response, file_destination)
+                    try:
+                        # One bad name would fail the whole archive upload
+                        member_name(f"{folder_name}/{filename}")
+                    except ValueError:
+                        continue
                     
-                    synced_files += 1
+                    try:
+                        # Download file from S3
+                        file_response = await client.storage.from_('file-uploads').download(file_path)
+                    except Exception as e:
+                        continue
                     
-                    if folder_name not in folder_structure:
-                        folder_structure[folder_name] = []
-                    folder_structure[folder_name].append(filename)
+                    if not file_response:
+                        continue
                     
-                except Exception as e:
-                    continue
+                    folder_structure.setdefault(folder_name, []).append(filename)
+                    yield f"{folder_name}/{filename}", file_response
+            
+            # Files are downloaded as upload_files packs them, so at most one batch is held in memory
+            synced_files = await upload_files(self.sandbox, kb_files(), f"~/{kb_dir}")
             
             # Create README
             readme_content = f"""# Global Knowledge Base
@@ -416,8 +412,7 @@ This directory contains your agent's knowledge base files, synced from the cloud
 ## Last Sync:
 Agent ID: {agent_id}
 """
-            
-            await self.sandbox.fs.upload_file(readme_content.encode('utf-8'), f"{kb_dir}/README.md")
+            await upload_files(self.sandbox, [("README.md", readme_content.encode('utf-8'))], f"~/{kb_dir}")
             
             return self.success_response({
                 "message": f"Successfully synced {synced_files} files to knowledge base",
@@ -4,7 +4,8 @@ from datetime import datetime, timezone
 from typing import Dict, Any, Tuple, Optional
 
 from core.services.supabase import DBConnection
-from core.services import redis
+from core.services import active_runs
+from core.services.running_runs import running_runs
 from core.utils.logger import logger, structlog
 from core.utils.config import config, EnvMode
 from run_agent_background import run_agent_background
@@ -406,7 +407,7 @@ class AgentExecutor:
         
         agent_run_id = agent_run.data[0]['id']
         
-        await self._register_agent_run(agent_run_id)
+        await self._register_agent_run(agent_run_id, account_id)
         
         run_agent_background.send(
             agent_run_id=agent_run_id,
@@ -426,10 +427,10 @@ class AgentExecutor:
         logger.debug(f"Started agent execution: {agent_run_id}")
         return agent_run_id
     
-    async def _register_agent_run(self, agent_run_id: str) -> None:
+    async def _register_agent_run(self, agent_run_id: str, account_id: str) -> None:
         try:
-            instance_key = f"active_run:trigger_executor:{agent_run_id}"
-            await redis.set(instance_key, "running", ex=redis.REDIS_KEY_TTL)
+            await active_runs.register("trigger_executor", agent_run_id)
+            await running_runs.register(account_id, agent_run_id)
         except Exception as e:
             logger.warning(f"Failed to register agent run in Redis: {e}")
 
@@ -712,7 +713,7 @@ class WorkflowExecutor:
         
         agent_run_id = agent_run.data[0]['id']
         
-        await self._register_workflow_run(agent_run_id)
+        await self._register_workflow_run(agent_run_id, account_id)
         
         run_agent_background.send(
             agent_run_id=agent_run_id,
@@ -732,11 +733,11 @@ class WorkflowExecutor:
         logger.debug(f"Started workflow agent execution: {agent_run_id}")
         return agent_run_id
     
-    async def _register_workflow_run(self, agent_run_id: str) -> None:
+    async def _register_workflow_run(self, agent_run_id: str, account_id: str) -> None:
         try:
             instance_id = getattr(config, 'INSTANCE_ID', 'default')
-            instance_key = f"active_run:{instance_id}:{agent_run_id}"
-            await redis.set(instance_key, "running", ex=redis.REDIS_KEY_TTL)
+            await active_runs.register(instance_id, agent_run_id)
+            await running_runs.register(account_id, agent_run_id)
         except Exception as e:
             logger.warning(f"Failed to register workflow run in Redis: {e}")
 
@@ -11,6 +11,7 @@ import hashlib
 import hmac
 from core.services.supabase import DBConnection
 from core.services import redis
+from core.services.identity_map import get_row
 
 async def verify_admin_api_key(x_admin_api_key: Optional[str] = Header(None)):
     if not config.KORTIX_ADMIN_API_KEY:
@@ -257,22 +258,19 @@ async def verify_and_get_agent_authorization(client, agent_id: str, user_id: str
 
 async def verify_and_authorize_thread_access(client, thread_id: str, user_id: str):
     try:
-        thread_result = await client.table('threads').select('*').eq('thread_id', thread_id).execute()
+        thread_data = await get_row(client, 'threads', thread_id)
 
-        if not thread_result.data or len(thread_result.data) == 0:
+        if not thread_data:
             raise HTTPException(status_code=404, detail="Thread not found")
-        
-        thread_data = thread_result.data[0]
 
         if thread_data['account_id'] == user_id:
             return True
         
         project_id = thread_data.get('project_id')
         if project_id:
-            project_result = await client.table('projects').select('is_public').eq('project_id', project_id).execute()
-            if project_result.data and len(project_result.data) > 0:
-                if project_result.data[0].get('is_public'):
-                    return True
+            project_data = await get_row(client, 'projects', project_id, 'is_public')
+            if project_data and project_data.get('is_public'):
+                return True
             
         account_id = thread_data.get('account_id')
         if account_id:
@@ -1,26 +1,283 @@
+"""
+Two-level cache: a bounded in-process LRU in front of Redis.
+
+``Cache.get``/``set``/``invalidate`` keep their JSON-over-Redis semantics, but
+values read or written by a process are also kept in its LRU for up to
+``LOCAL_MAX_TTL`` seconds (never longer than their Redis TTL). ``set`` and
+``invalidate`` publish the key on ``INVALIDATION_CHANNEL`` so every other
+process drops its local copy; local copies are only served while this
+process is subscribed, otherwise reads go to Redis.
+
+``get_or_load(key, loader, ttl)`` runs ``loader`` once per key per process
+however many callers miss at the same time, and caches a ``None`` result for
+``negative_ttl`` seconds so absent rows are not re-queried on every call.
+
+Values are serialized as JSON. ``Cache.get_stats()`` returns hit, miss
+and load counters and latency histograms; it is served at
+``/admin/cache-stats``.
+"""
+
+import asyncio
 import json
-from typing import Any
-from core.services.redis import get_client
+import time
+import uuid
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from core.services import redis
+from core.utils.logger import logger
+from core.utils.single_flight import single_flight
+
+KEY_PREFIX = "cache:"
+INVALIDATION_CHANNEL = "cache:invalidated"
+
+DEFAULT_TTL = 15 * 60
+NEGATIVE_TTL = 30          # seconds a None result of a loader is cached
+LOCAL_MAX_TTL = 60.0       # seconds a value is served from process memory at most
+MAX_LOCAL_ENTRIES = 10_000
+LISTEN_POLL_TIMEOUT = 1.0  # must stay below the Redis socket timeout
+RESUBSCRIBE_DELAY = 2.0
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+# Stored in place of a value when a loader returned None; not valid JSON
+_NEGATIVE = "\x00none"
+_MISSING = object()
+
+
+def _is_negative(value: Any) -> bool:
+    return isinstance(value, str) and value == _NEGATIVE
 
 
 class _cache:
+    def __init__(self, max_local_entries: int = MAX_LOCAL_ENTRIES, local_max_ttl: float = LOCAL_MAX_TTL):
+        self.max_local_entries = max_local_entries
+        self.local_max_ttl = local_max_ttl
+        self._local: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        # Bumped on every invalidation so a read that raced with one is not stored
+        self._epochs: Dict[str, int] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._origin = uuid.uuid4().hex
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._subscribed = False
+
+        self._counters = {
+            'local_hits': 0,
+            'redis_hits': 0,
+            'misses': 0,
+            'negative_hits': 0,
+            'loads': 0,
+            'load_errors': 0,
+            'coalesced_loads': 0,
+            'invalidations_published': 0,
+            'invalidations_received': 0,
+        }
+        self._latency: Dict[str, list] = {}
+        self._latency_totals: Dict[str, Tuple[int, float]] = {}
+
     async def get(self, key: str):
-        redis = await get_client()
-        key = f"cache:{key}"
-        result = await redis.get(key)
-        if result:
-            return json.loads(result)
-        return None
-
-    async def set(self, key: str, value: Any, ttl: int = 15 * 60):
-        redis = await get_client()
-        key = f"cache:{key}"
-        await redis.set(key, json.dumps(value), ex=ttl)
+        value = await self._get(key)
+        if value is _MISSING or _is_negative(value):
+            return None
+        return value
+
+    async def set(self, key: str, value: Any, ttl: int = DEFAULT_TTL):
+        self._evict(key)
+        epoch = self._epochs.get(key, 0)
+        redis_client = await redis.get_client()
+        await redis_client.set(f"{KEY_PREFIX}{key}", json.dumps(value) if not _is_negative(value) else value, ex=ttl)
+        await self._publish(key)
+        self._store_local(key, value, ttl, epoch)
 
     async def invalidate(self, key: str):
-        redis = await get_client()
-        key = f"cache:{key}"
-        await redis.delete(key)
+        self._evict(key)
+        redis_client = await redis.get_client()
+        await redis_client.delete(f"{KEY_PREFIX}{key}")
+        await self._publish(key)
+
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: int = DEFAULT_TTL,
+        negative_ttl: int = NEGATIVE_TTL
+    ):
+        """Return the cached value of ``key``, calling ``loader`` on a miss.
+
+        Concurrent misses for the same key in this process share one loader
+        call. A ``None`` result is cached for ``negative_ttl`` seconds (0 to
+        disable). Redis errors degrade to calling the loader.
+        """
+        try:
+            value = await self._get(key)
+        except Exception as e:
+            logger.warning(f"Cache read failed for {key}, loading directly: {e}")
+            return await loader()
+        if _is_negative(value):
+            self._counters['negative_hits'] += 1
+            return None
+        if value is not _MISSING:
+            return value
+
+        if key in self._inflight:
+            self._counters['coalesced_loads'] += 1
+        return await single_flight(self._inflight, key, lambda: self._load(key, loader, ttl, negative_ttl))
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: int, negative_ttl: int):
+        started = time.perf_counter()
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._counters['load_errors'] += 1
+            raise
+        self._observe('load', started)
+        self._counters['loads'] += 1
+
+        if value is not None or negative_ttl:
+            try:
+                await self.set(key, value if value is not None else _NEGATIVE, ttl if value is not None else negative_ttl)
+            except Exception as e:
+                logger.warning(f"Cache write failed for {key}: {e}")
+        return value
+
+    async def _get(self, key: str):
+        self._start()
+        if self._subscribed:
+            cached = self._local.get(key)
+            if cached is not None:
+                if time.monotonic() < cached[1]:
+                    self._local.move_to_end(key)
+                    self._counters['local_hits'] += 1
+                    return cached[0]
+                del self._local[key]
+
+        epoch = self._epochs.get(key, 0)
+        started = time.perf_counter()
+        redis_client = await redis.get_client()
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.get(f"{KEY_PREFIX}{key}")
+            pipe.pttl(f"{KEY_PREFIX}{key}")
+            raw, pttl = await pipe.execute()
+        self._observe('redis_get', started)
+
+        if raw is None:
+            self._counters['misses'] += 1
+            return _MISSING
+        self._counters['redis_hits'] += 1
+        value = raw if _is_negative(raw) else json.loads(raw)
+        self._store_local(key, value, pttl / 1000 if pttl and pttl > 0 else None, epoch)
+        return value
+
+    def _store_local(self, key: str, value: Any, ttl: Optional[float], epoch: int) -> None:
+        if not self._subscribed or self._epochs.get(key, 0) != epoch:
+            return
+        local_ttl = min(ttl, self.local_max_ttl) if ttl else self.local_max_ttl
+        self._local[key] = (value, time.monotonic() + local_ttl)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_local_entries:
+            self._local.popitem(last=False)
+
+    def _evict(self, key: str) -> None:
+        self._epochs[key] = self._epochs.get(key, 0) + 1
+        if len(self._epochs) > self.max_local_entries:
+            self._epochs.clear()
+            self._local.clear()
+        self._local.pop(key, None)
+
+    async def _publish(self, key: str) -> None:
+        try:
+            await redis.publish(INVALIDATION_CHANNEL, json.dumps({"key": key, "origin": self._origin}))
+            self._counters['invalidations_published'] += 1
+        except Exception as e:
+            logger.warning(f"Failed to publish cache invalidation for {key}: {e}")
+
+    def _start(self) -> None:
+        """Start the invalidation listener on the running event loop if it is not running."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # A new event loop (e.g. a script calling asyncio.run again): nothing carries over
+            self._loop = loop
+            self._listener = None
+            self._subscribed = False
+            self._inflight.clear()
+            self._local.clear()
+        if self._listener is None or self._listener.done():
+            self._listener = loop.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener and not self._listener.done():
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        self._listener = None
+        self._subscribed = False
+        self._local.clear()
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = None
+            try:
+                pubsub = await redis.create_pubsub()
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Anything cached before the subscription may have missed an invalidation
+                self._local.clear()
+                self._subscribed = True
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=LISTEN_POLL_TIMEOUT)
+                    if message and message.get("type") == "message":
+                        self._handle_message(message.get("data"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Cache invalidation listener failed, resubscribing: {e}")
+            finally:
+                self._subscribed = False
+                if pubsub is not None:
+                    try:
+                        await pubsub.unsubscribe(INVALIDATION_CHANNEL)
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+            await asyncio.sleep(RESUBSCRIBE_DELAY)
+
+    def _handle_message(self, data: Any) -> None:
+        try:
+            payload = json.loads(data)
+            if payload.get("origin") == self._origin:
+                return
+            self._evict(payload["key"])
+            self._counters['invalidations_received'] += 1
+        except (KeyError, TypeError, AttributeError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring malformed cache invalidation {data!r}: {e}")
+
+    def _observe(self, operation: str, started: float) -> None:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        buckets = self._latency.setdefault(operation, [0] * (len(LATENCY_BUCKETS_MS) + 1))
+        buckets[bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+        count, total = self._latency_totals.get(operation, (0, 0.0))
+        self._latency_totals[operation] = (count + 1, total + elapsed_ms)
+
+    def get_stats(self) -> Dict[str, Any]:
+        latency = {}
+        for operation, buckets in self._latency.items():
+            count, total = self._latency_totals[operation]
+            latency[operation] = {
+                'count': count,
+                'mean_ms': round(total / count, 2) if count else 0.0,
+                'buckets_ms': dict(zip([str(b) for b in LATENCY_BUCKETS_MS] + ['+Inf'], buckets)),
+            }
+        return {
+            **self._counters,
+            'local_entries': len(self._local),
+            'inflight_loads': len(self._inflight),
+            'subscribed': self._subscribed,
+            'latency_ms': latency,
+        }
 
 
 Cache = _cache()
@@ -280,17 +280,34 @@ class Configuration:
     SUPABASE_ANON_KEY: str
     SUPABASE_SERVICE_ROLE_KEY: str
     SUPABASE_JWT_SECRET: str
+    # HTTP transport for the backend's Supabase (PostgREST) clients
+    SUPABASE_HTTP2: bool = False  # needs the h2 package (httpx[http2])
+    SUPABASE_MAX_CONNECTIONS: int = 100
+    SUPABASE_MAX_KEEPALIVE_CONNECTIONS: int = 50
+    SUPABASE_KEEPALIVE_EXPIRY: int = 60  # seconds an idle connection is kept open
+    SUPABASE_CONNECT_TIMEOUT: int = 10
+    SUPABASE_REQUEST_TIMEOUT: int = 60
+    SUPABASE_POOL_TIMEOUT: int = 10  # seconds to wait for a free connection
+    # Comma-separated workloads that get their own client and connection pool, e.g. "messages,admin"
+    SUPABASE_CLIENT_WORKLOADS: str = ""
     
     # Redis configuration
     REDIS_HOST: str
     REDIS_PORT: int = 6379
     REDIS_PASSWORD: Optional[str] = None
     REDIS_SSL: bool = True
+    # Transport for agent run responses: "list" (Redis list + pub/sub) or "streams" (Redis Streams with resume)
+    AGENT_RUN_STREAM_TRANSPORT: str = "list"
     
     # Daytona sandbox configuration
     DAYTONA_API_KEY: str
     DAYTONA_SERVER_URL: str
     DAYTONA_TARGET: str
+    # Warm pool of pre-created sandboxes claimed by new projects
+    SANDBOX_POOL_ENABLED: bool = False
+    SANDBOX_POOL_MIN_SIZE: int = 2
+    SANDBOX_POOL_MAX_SIZE: int = 20
+    SANDBOX_POOL_MAX_IDLE_MINUTES: int = 120  # idle pooled sandboxes older than this are replaced
     
     # Search and other API keys
     TAVILY_API_KEY: str
@@ -305,6 +322,8 @@ class Configuration:
     STRIPE_WEBHOOK_SECRET: Optional[str] = None
     STRIPE_DEFAULT_PLAN_ID: Optional[str] = None
     STRIPE_DEFAULT_TRIAL_DAYS: int = 14
+    # Settle LLM usage through the write-behind metering stream instead of inline per message
+    BILLING_WRITE_BEHIND: bool = False
     
     # Stripe Product IDs
     STRIPE_PRODUCT_ID_PROD: str = 'prod_SCl7AQ2C8kK1CD'
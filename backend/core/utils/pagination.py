@@ -1,8 +1,10 @@
-from typing import List, Dict, Any, Optional, TypeVar, Generic, Callable, Awaitable
+from typing import List, Dict, Any, Optional, TypeVar, Generic, Callable, Awaitable, Tuple
 from pydantic import BaseModel
 from dataclasses import dataclass
+from datetime import datetime
 from core.utils.logger import logger
 import math
+import uuid
 
 T = TypeVar('T')
 
@@ -182,4 +184,55 @@ class PaginationService:
             return json.loads(cursor_json)
         except Exception as e:
             logger.warning(f"Failed to parse cursor: {e}")
-            return None 
\ No newline at end of file
+            return None
+
+    @staticmethod
+    def apply_keyset(
+        query: Any,
+        cursor: Optional[str],
+        sort_field: str,
+        id_field: str,
+        desc: bool = True
+    ) -> Any:
+        """
+        Order a query by (sort_field, id_field) and start it after the cursor position.
+        sort_field must be a timestamp column and id_field a UUID column; together they
+        must be covered by an index for the page cost to be independent of its depth.
+        Raises ValueError for a cursor that was not created for this sort field.
+        """
+        query = query.order(sort_field, desc=desc).order(id_field, desc=desc)
+        if not cursor:
+            return query
+
+        position = PaginationService.parse_cursor(cursor)
+        if not position or position.get('sort_field') != sort_field:
+            raise ValueError("Invalid pagination cursor")
+        try:
+            # Both values are interpolated into the filter, so only accept well-formed ones
+            sort_value = datetime.fromisoformat(position['sort_value'].replace('Z', '+00:00')).isoformat()
+            item_id = str(uuid.UUID(position['id']))
+        except (KeyError, AttributeError, ValueError):
+            raise ValueError("Invalid pagination cursor")
+
+        op = 'lt' if desc else 'gt'
+        return query.or_(
+            f'{sort_field}.{op}."{sort_value}",'
+            f'and({sort_field}.eq."{sort_value}",{id_field}.{op}.{item_id})'
+        )
+
+    @staticmethod
+    def keyset_page(
+        rows: List[Dict[str, Any]],
+        limit: int,
+        sort_field: str,
+        id_field: str
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Split rows fetched with limit + 1 into the page and the cursor of the next one.
+        The cursor is None on the last page.
+        """
+        if len(rows) <= limit:
+            return rows, None
+        page = rows[:limit]
+        last = page[-1]
+        return page, PaginationService.create_cursor(last[id_field], sort_field, last[sort_field])
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark for CreditManager.use_credits.
+
+Fires many parallel deductions at one credit account on a local Supabase
+stack and checks that none were lost: the balance must drop by exactly the
+sum of the successful deductions, and each one must have a ledger entry.
+The deducted amount is credited back afterwards unless --no-restore is given.
+
+Only runs with ENV_MODE=local.
+
+Usage:
+    python -m core.utils.scripts.benchmark_credit_deduction --account-id <uuid> [--concurrency 300] [--amount 0.01]
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from decimal import Decimal
+
+from core.billing.credit_manager import credit_manager
+from core.services.supabase import DBConnection
+from core.utils.config import config, EnvMode
+
+
+async def run_benchmark(account_id: str, concurrency: int, amount: Decimal, restore: bool) -> bool:
+    db = DBConnection()
+    await db.initialize()
+    client = await db.client
+
+    run_id = uuid.uuid4().hex[:8]
+    description = f"benchmark deduction {run_id}"
+
+    before = await credit_manager.get_balance(account_id)
+    initial = Decimal(str(before['total']))
+    print(f"Initial balance: ${initial:.4f} (expiring ${before['expiring']:.4f}, non-expiring ${before['non_expiring']:.4f})")
+    print(f"Firing {concurrency} concurrent deductions of ${amount} ...")
+
+    latencies = []
+
+    async def deduct():
+        start = time.perf_counter()
+        result = await credit_manager.use_credits(account_id, amount, description=description)
+        latencies.append(time.perf_counter() - start)
+        return result
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(deduct() for _ in range(concurrency)), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+
+    errors = [r for r in results if isinstance(r, Exception)]
+    succeeded = [r for r in results if isinstance(r, dict) and r.get('success')]
+    rejected = [r for r in results if isinstance(r, dict) and not r.get('success')]
+
+    after = await credit_manager.get_balance(account_id)
+    final = Decimal(str(after['total']))
+    ledger = await client.from_('credit_ledger').select('id', count='exact')\
+        .eq('account_id', account_id).eq('description', description).execute()
+    ledger_entries = ledger.count or 0
+
+    expected_drop = amount * len(succeeded)
+    actual_drop = initial - final
+    split_consistent = abs(Decimal(str(after['expiring'])) + Decimal(str(after['non_expiring'])) - final) <= Decimal('0.0001')
+
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    print("\n" + "=" * 60)
+    print(f"Elapsed: {elapsed:.2f}s ({concurrency / elapsed:.1f} deductions/s)")
+    if latencies_ms:
+        print(f"Latency: p50 {statistics.median(latencies_ms):.1f} ms, "
+              f"p95 {latencies_ms[int(len(latencies_ms) * 0.95) - 1]:.1f} ms, max {latencies_ms[-1]:.1f} ms")
+    print(f"Succeeded: {len(succeeded)}  Rejected: {len(rejected)}  Errors: {len(errors)}")
+    print(f"Balance drop: ${actual_drop:.4f} (expected ${expected_drop:.4f})")
+    print(f"Ledger entries: {ledger_entries} (expected {len(succeeded)})")
+    print("=" * 60)
+
+    ok = True
+    if abs(actual_drop - expected_drop) > Decimal('0.0001'):
+        print("❌ Lost updates: balance drop does not match successful deductions")
+        ok = False
+    if ledger_entries != len(succeeded):
+        print("❌ Ledger entries do not match successful deductions")
+        ok = False
+    if not split_consistent:
+        print("❌ expiring + non-expiring credits no longer add up to the balance")
+        ok = False
+    for r in rejected:
+        if r.get('error') != 'Insufficient credits':
+            print(f"❌ Unexpected rejection: {r}")
+            ok = False
+            break
+    for e in errors[:5]:
+        print(f"❌ Error: {e}")
+        ok = False
+    if ok:
+        print("✅ No lost updates")
+
+    if restore and actual_drop > 0:
+        await credit_manager.add_credits(
+            account_id, actual_drop, is_expiring=False,
+            description=f"benchmark refund {run_id}", type='adjustment'
+        )
+        print(f"Restored ${actual_drop:.4f}")
+
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrency benchmark for atomic credit deduction")
+    parser.add_argument('--account-id', required=True, help="Existing credit account to deduct from")
+    parser.add_argument('--concurrency', type=int, default=300, help="Number of parallel deductions")
+    parser.add_argument('--amount', type=Decimal, default=Decimal('0.01'), help="Amount per deduction")
+    parser.add_argument('--no-restore', action='store_true', help="Do not credit the deducted amount back")
+    args = parser.parse_args()
+
+    if config.ENV_MODE != EnvMode.LOCAL:
+        print("Refusing to run: this benchmark mutates balances and only runs with ENV_MODE=local")
+        sys.exit(1)
+
+    ok = asyncio.run(run_benchmark(args.account_id, args.concurrency, args.amount, not args.no_restore))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
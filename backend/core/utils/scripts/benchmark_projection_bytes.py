@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Payload size of hot-path queries with select('*') versus their projections.
+
+Replays the reads one agent iteration makes against an existing thread (the
+latest-message type check, the project sandbox lookup) and the reads made
+when a run starts, once with select('*') and once with the registered
+projection, and prints the JSON payload bytes and latency of each.
+
+Usage:
+    python -m core.utils.scripts.benchmark_projection_bytes --thread-id <uuid> [--repeat 20]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+from core.services.projections import MESSAGE_CONTENT, MESSAGE_TYPE, PROJECT_SANDBOX, AGENT_CONFIG
+from core.services.supabase import DBConnection
+
+
+def _payload_bytes(data) -> int:
+    return len(json.dumps(data, default=str, separators=(',', ':')).encode('utf-8'))
+
+
+async def _measure(build_query, columns: str, repeat: int):
+    latencies = []
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = await build_query(columns).execute()
+        latencies.append((time.perf_counter() - started) * 1000)
+        size = _payload_bytes(result.data)
+    return size, statistics.median(latencies)
+
+
+async def run_benchmark(thread_id: str, repeat: int) -> bool:
+    db = DBConnection()
+    await db.initialize()
+    client = await db.client
+
+    thread = await client.table('threads').select('project_id, account_id').eq('thread_id', thread_id).execute()
+    if not thread.data:
+        print(f"Thread {thread_id} not found")
+        return False
+    project_id = thread.data[0]['project_id']
+    account_id = thread.data[0]['account_id']
+
+    per_iteration = [
+        ("latest message type", MESSAGE_TYPE, lambda columns: client.table('messages').select(columns)
+            .eq('thread_id', thread_id).in_('type', ['assistant', 'tool', 'user'])
+            .order('created_at', desc=True).limit(1)),
+        ("project sandbox", PROJECT_SANDBOX, lambda columns: client.table('projects').select(columns)
+            .eq('project_id', project_id)),
+    ]
+    per_run = [
+        ("latest user message", MESSAGE_CONTENT, lambda columns: client.table('messages').select(columns)
+            .eq('thread_id', thread_id).eq('type', 'user').order('created_at', desc=True).limit(1)),
+        ("default agent", AGENT_CONFIG, lambda columns: client.table('agents').select(columns)
+            .eq('account_id', account_id).eq('is_default', True)),
+    ]
+
+    print(f"{'query':<22} {'projection':<18} {'* bytes':>10} {'proj bytes':>10} {'* ms':>8} {'proj ms':>8}")
+    totals = {}
+    for scope, queries in (("per iteration", per_iteration), ("per run", per_run)):
+        before_total = after_total = 0
+        for label, projection, build_query in queries:
+            before, before_ms = await _measure(build_query, '*', repeat)
+            after, after_ms = await _measure(build_query, projection.select, repeat)
+            before_total += before
+            after_total += after
+            print(f"{label:<22} {projection.name:<18} {before:>10} {after:>10} {before_ms:>8.1f} {after_ms:>8.1f}")
+        totals[scope] = (before_total, after_total)
+
+    print()
+    for scope, (before_total, after_total) in totals.items():
+        saved = 100 * (1 - after_total / before_total) if before_total else 0.0
+        print(f"Bytes {scope}: {before_total} -> {after_total} ({saved:.0f}% less)")
+
+    await DBConnection.disconnect()
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare select('*') and projected payload sizes on hot-path queries")
+    parser.add_argument('--thread-id', required=True, help="An existing thread with messages")
+    parser.add_argument('--repeat', type=int, default=20, help="Runs per query for the median latency")
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run_benchmark(args.thread_id, args.repeat)) else 1)
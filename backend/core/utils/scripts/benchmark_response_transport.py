@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Load test of the agent run response transports with N concurrent viewers.
+
+For each viewer count, a synthetic run writes ``--responses`` streamed chunks
+through ``ResponseStreamWriter`` while N viewers follow it, once over the list
++ pub/sub path (``ResponseBroadcastHub``) and once over Redis Streams
+(``ResponseStreamHub``). Prints the time until every viewer received the
+terminal status, the median and p99 delivery lag of the last frame, and the
+Redis commands processed per run. Keys of the synthetic runs are deleted
+afterwards.
+
+Usage:
+    python -m core.utils.scripts.benchmark_response_transport [--viewers 1 10 100] [--responses 2000] [--chunk 200]
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+
+from core.services import redis
+from core.services.response_stream import (
+    ResponseBroadcastHub,
+    ResponseStreamHub,
+    ResponseStreamWriter,
+    response_list_key,
+    response_stream_key,
+)
+from core.utils.config import config
+
+
+async def _commands_processed() -> int:
+    redis_client = await redis.get_client()
+    return int((await redis_client.info('stats'))['total_commands_processed'])
+
+
+async def _follow(frames) -> float:
+    """Consume a viewer's frames; returns when the terminal status arrived."""
+    async for _ in frames:
+        pass
+    return time.perf_counter()
+
+
+async def _run(transport: str, viewers: int, responses: int, chunk: int):
+    config.AGENT_RUN_STREAM_TRANSPORT = transport
+    agent_run_id = f"benchmark-{uuid.uuid4().hex[:12]}"
+    writer = ResponseStreamWriter(agent_run_id)
+    hub = ResponseBroadcastHub() if transport == "list" else ResponseStreamHub()
+    content = "x" * chunk
+    try:
+        # Viewers connect once the run has written its first response, as the API does
+        await writer.write({'type': 'status', 'status': 'running'})
+        await writer.flush()
+        commands_before = await _commands_processed()
+        tasks = [asyncio.create_task(_follow(hub.stream(agent_run_id))) for _ in range(viewers)]
+        await asyncio.sleep(0.1)
+
+        started = time.perf_counter()
+        for i in range(responses):
+            await writer.write({'type': 'assistant', 'sequence': i, 'content': content})
+            if i % 50 == 0:
+                await asyncio.sleep(0)
+        await writer.write({'type': 'status', 'status': 'completed'})
+        written = time.perf_counter()
+        await writer.close()
+
+        finished = await asyncio.gather(*tasks)
+        commands = await _commands_processed() - commands_before
+        lags = sorted((end - written) * 1000 for end in finished)
+        p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))]
+        return max(finished) - started, statistics.median(lags), p99, commands
+    finally:
+        await redis.delete(response_list_key(agent_run_id))
+        await redis.delete(response_stream_key(agent_run_id))
+
+
+async def run_benchmark(viewer_counts, responses: int, chunk: int) -> bool:
+    await redis.initialize_async()
+    transport = config.AGENT_RUN_STREAM_TRANSPORT
+    print(f"{'transport':<10} {'viewers':>8} {'total s':>8} {'lag p50 ms':>11} {'lag p99 ms':>11} {'commands':>9}")
+    try:
+        for viewers in viewer_counts:
+            for mode in ("list", "streams"):
+                total, p50, p99, commands = await _run(mode, viewers, responses, chunk)
+                print(f"{mode:<10} {viewers:>8} {total:>8.2f} {p50:>11.1f} {p99:>11.1f} {commands:>9}")
+    finally:
+        config.AGENT_RUN_STREAM_TRANSPORT = transport
+        await redis.close()
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test agent run response transports with concurrent viewers")
+    parser.add_argument('--viewers', type=int, nargs='+', default=[1, 10, 100], help="Concurrent viewers per run")
+    parser.add_argument('--responses', type=int, default=2000, help="Streamed responses per run")
+    parser.add_argument('--chunk', type=int, default=200, help="Characters of content per response")
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run_benchmark(args.viewers, args.responses, args.chunk)) else 1)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Per-file versus bulk archive transfer against a live sandbox.
+
+Writes a synthetic workspace of N small files (default 100 and 1000) into a
+scratch directory of the sandbox, once with one ``fs.upload_file`` per file
+and once with ``upload_files``, reads it back once with one
+``fs.download_file`` per file and once with ``download_files``, and prints
+the wall time of each. The scratch directory is removed afterwards.
+
+Usage:
+    python -m core.utils.scripts.benchmark_sandbox_transfer --sandbox-id <id> [--files 100 1000] [--size 2048]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+from core.sandbox.sandbox import get_or_start_sandbox
+from core.sandbox.transfer import upload_files, download_files
+
+
+def _workspace(count: int, size: int):
+    # Spread files over folders like a small project; random bytes keep gzip honest
+    return [(f"dir{i % 20}/file{i}.txt", os.urandom(size // 2).hex().encode()) for i in range(count)]
+
+
+async def _timed(coro) -> float:
+    started = time.perf_counter()
+    await coro
+    return time.perf_counter() - started
+
+
+async def _per_file_upload(sandbox, files, root):
+    for folder in sorted({path.rsplit('/', 1)[0] for path, _ in files}):
+        await sandbox.process.exec(f"mkdir -p {root}/{folder}")
+    for path, content in files:
+        await sandbox.fs.upload_file(content, f"{root}/{path}")
+
+
+async def _per_file_download(sandbox, files, root):
+    for path, _ in files:
+        await sandbox.fs.download_file(f"{root}/{path}")
+
+
+async def run_benchmark(sandbox_id: str, counts, size: int) -> bool:
+    sandbox = await get_or_start_sandbox(sandbox_id)
+    scratch = f"/tmp/transfer-benchmark-{uuid.uuid4().hex[:8]}"
+
+    print(f"{'files':>6} {'upload 1x1 s':>13} {'upload bulk s':>14} {'download 1x1 s':>15} {'download bulk s':>16}")
+    try:
+        for count in counts:
+            files = _workspace(count, size)
+            single_root, bulk_root = f"{scratch}/single-{count}", f"{scratch}/bulk-{count}"
+
+            upload_single = await _timed(_per_file_upload(sandbox, files, single_root))
+            upload_bulk = await _timed(upload_files(sandbox, files, bulk_root))
+            download_single = await _timed(_per_file_download(sandbox, files, single_root))
+
+            started = time.perf_counter()
+            downloaded = await download_files(sandbox, bulk_root, [path for path, _ in files])
+            download_bulk = time.perf_counter() - started
+            if downloaded != dict(files):
+                print(f"Bulk round-trip of {count} files returned different content")
+                return False
+
+            print(f"{count:>6} {upload_single:>13.2f} {upload_bulk:>14.2f} {download_single:>15.2f} {download_bulk:>16.2f}")
+    finally:
+        await sandbox.process.exec(f"rm -rf {scratch}")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-file and bulk archive transfer with a sandbox")
+    parser.add_argument('--sandbox-id', required=True, help="A sandbox to write scratch files into")
+    parser.add_argument('--files', type=int, nargs='+', default=[100, 1000], help="Workspace sizes to measure")
+    parser.add_argument('--size', type=int, default=2048, help="Bytes per file")
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run_benchmark(args.sandbox_id, args.files, args.size)) else 1)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Incremental versus full re-parse scanning of streamed XML tool calls.
+
+Streams a synthetic assistant response (prose, then <function_calls> blocks
+with large parameters) in small deltas and collects the complete blocks
+twice: once with ``StreamingXMLScanner``, and once the way the streaming loop
+used to, by re-running the block search over the whole accumulated buffer
+after every delta (including the per-delta fallback search for legacy tags
+of every registered function name). Prints the wall time of each and checks
+that both found the same blocks.
+
+Usage:
+    python -m core.utils.scripts.benchmark_xml_scanner [--sizes 10000 100000 250000] [--delta 16] [--tools 60]
+"""
+
+import argparse
+import sys
+import time
+from typing import List
+
+from core.agentpress.xml_tool_parser import StreamingXMLScanner
+
+START_TAG = '<function_calls>'
+END_TAG = '</function_calls>'
+
+
+def _response(size: int, blocks: int = 3) -> str:
+    # Prose between blocks and one large parameter per block, like a file write
+    prose = "Let me look at the project files and update them accordingly. " * 20
+    body = "x = compute(value) + 1\n" * max(1, size // (blocks * 24))
+    parts = []
+    for i in range(blocks):
+        parts.append(prose)
+        parts.append(
+            f'{START_TAG}\n<invoke name="create_file">\n'
+            f'<parameter name="file_path">src/module_{i}.py</parameter>\n'
+            f'<parameter name="file_contents">{body}</parameter>\n'
+            f'</invoke>\n{END_TAG}'
+        )
+    parts.append(prose)
+    return ''.join(parts)
+
+
+def _extract_blocks(content: str, tag_names: List[str]) -> List[str]:
+    """The block search the streaming loop used to run over the whole buffer."""
+    chunks = []
+    pos = 0
+    while pos < len(content):
+        start = content.find(START_TAG, pos)
+        if start == -1:
+            break
+        end = content.find(END_TAG, start)
+        if end == -1:
+            break
+        pos = end + len(END_TAG)
+        chunks.append(content[start:pos])
+    if not chunks:
+        # Legacy fallback: look for an opening tag of every registered function
+        for tag_name in tag_names:
+            content.find(f'<{tag_name}', 0)
+    return chunks
+
+
+def _full_reparse(deltas: List[str], tag_names: List[str]) -> List[str]:
+    buffer = ""
+    found = []
+    for delta in deltas:
+        buffer += delta
+        for chunk in _extract_blocks(buffer, tag_names):
+            buffer = buffer.replace(chunk, "", 1)
+            found.append(chunk)
+    return found
+
+
+def _incremental(deltas: List[str]) -> List[str]:
+    scanner = StreamingXMLScanner()
+    found = []
+    for delta in deltas:
+        found.extend(scanner.feed(delta))
+    return found
+
+
+def _timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def run_benchmark(sizes: List[int], delta: int, tools: int) -> bool:
+    tag_names = [f"tool-function-{i}" for i in range(tools)]
+    print(f"{'bytes':>10} {'deltas':>8} {'blocks':>7} {'re-parse s':>11} {'incremental s':>14} {'speedup':>8}")
+    for size in sizes:
+        content = _response(size)
+        deltas = [content[i:i + delta] for i in range(0, len(content), delta)]
+        expected, reparse_s = _timed(_full_reparse, deltas, tag_names)
+        found, incremental_s = _timed(_incremental, deltas)
+        if found != expected:
+            print(f"Scanners disagree on a {len(content)} byte response: {len(found)} vs {len(expected)} blocks")
+            return False
+        speedup = reparse_s / incremental_s if incremental_s else float('inf')
+        print(f"{len(content):>10} {len(deltas):>8} {len(found):>7} {reparse_s:>11.3f} {incremental_s:>14.4f} {speedup:>7.0f}x")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare incremental and full re-parse scanning of streamed XML tool calls")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 250_000], help="Approximate response sizes in bytes")
+    parser.add_argument('--delta', type=int, default=16, help="Characters per streamed delta")
+    parser.add_argument('--tools', type=int, default=60, help="Registered function names searched by the legacy fallback")
+    args = parser.parse_args()
+    sys.exit(0 if run_benchmark(args.sizes, args.delta, args.tools) else 1)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Keep the warm sandbox pool recycled and filled.
+
+Deletes pooled sandboxes idle past SANDBOX_POOL_MAX_IDLE_MINUTES, then
+creates sandboxes until the pool reaches its demand-based target size. Claims
+also trigger a backfill, so this only needs to run when traffic is low or
+after a snapshot change; schedule it every minute or two.
+
+Usage:
+    python -m core.utils.scripts.maintain_sandbox_pool [--interval SECONDS]
+"""
+
+import argparse
+import asyncio
+
+from core.sandbox.pool import sandbox_pool
+from core.services import redis
+from core.utils.logger import logger
+
+
+async def main(interval: float):
+    try:
+        while True:
+            try:
+                recycled = await sandbox_pool.recycle()
+                added = await sandbox_pool.backfill()
+                size = await sandbox_pool.size()
+                print(f"Sandbox pool {sandbox_pool.snapshot}: {recycled} recycled, {added} added, {size} ready")
+            except Exception as e:
+                logger.error(f"Sandbox pool maintenance failed: {e}", exc_info=True)
+                if not interval:
+                    raise
+            if not interval:
+                break
+            await asyncio.sleep(interval)
+    finally:
+        await redis.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recycle and backfill the warm sandbox pool")
+    parser.add_argument('--interval', type=float, default=0, help="Repeat every N seconds instead of running once")
+    args = parser.parse_args()
+    asyncio.run(main(args.interval))
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Reconcile the per-account running agent run index in Redis with the database.
+
+Drops runs the database no longer shows as running (lost releases) and adds
+running runs that were never registered. Safe to run while the API and
+workers are serving traffic; schedule it every few minutes.
+
+Usage:
+    python -m core.utils.scripts.reconcile_running_runs [--interval SECONDS]
+"""
+
+import argparse
+import asyncio
+
+from core.services import redis
+from core.services.running_runs import running_runs
+from core.services.supabase import DBConnection
+from core.utils.logger import logger
+
+
+async def main(interval: float):
+    db = DBConnection()
+    await db.initialize()
+    client = await db.client
+
+    try:
+        while True:
+            try:
+                result = await running_runs.reconcile(client)
+                print(f"Reconciled {result['accounts']} accounts: {result['added']} added, {result['removed']} removed")
+            except Exception as e:
+                logger.error(f"Running run reconciliation failed: {e}", exc_info=True)
+                if not interval:
+                    raise
+            if not interval:
+                break
+            await asyncio.sleep(interval)
+    finally:
+        await redis.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcile the running agent run index with the database")
+    parser.add_argument('--interval', type=float, default=0, help="Repeat every N seconds instead of running once")
+    args = parser.parse_args()
+    asyncio.run(main(args.interval))
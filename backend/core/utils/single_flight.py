@@ -0,0 +1,55 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+async def single_flight(
+    inflight: Dict[Hashable, asyncio.Future],
+    key: Hashable,
+    coro_factory: Callable[[], Awaitable[T]],
+) -> T:
+    """
+    Run ``coro_factory()`` at most once per key at a time in this process.
+
+    Concurrent callers with the same key wait for the call already in flight
+    and get its result (or exception) instead of starting their own. A caller
+    cancelled while waiting does not cancel the shared call; if the caller
+    running it is cancelled, the waiters start a new one.
+
+    Args:
+        inflight: Futures of the calls in flight, owned by the caller (one dict per cache)
+        key: Identifies calls that can share a result
+        coro_factory: Starts the call; only invoked when no call for ``key`` is in flight
+
+    Returns:
+        The result of the shared call
+    """
+    while True:
+        future = inflight.get(key)
+        if future is None:
+            break
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # The leading call was cancelled, not us: run it ourselves
+            if not future.cancelled():
+                raise
+
+    future = asyncio.get_running_loop().create_future()
+    inflight[key] = future
+    try:
+        result = await coro_factory()
+        future.set_result(result)
+        return result
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Mark the exception retrieved; joiners re-raise it themselves
+        future.exception()
+        raise
+    finally:
+        if inflight.get(key) is future:
+            del inflight[key]
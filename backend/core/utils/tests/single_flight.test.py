@@ -0,0 +1,77 @@
+"""Tests for the shared single-flight helper."""
+
+import asyncio
+
+import pytest
+
+from core.utils.single_flight import single_flight
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+class TestSingleFlight:
+    async def test_concurrent_callers_share_one_call(self):
+        inflight = {}
+        calls = 0
+
+        async def load():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return calls
+
+        results = await asyncio.gather(*(single_flight(inflight, "key", load) for _ in range(5)))
+        assert results == [1] * 5
+        assert calls == 1
+        assert inflight == {}
+
+    async def test_exception_reaches_every_caller(self):
+        inflight = {}
+
+        async def load():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(*(single_flight(inflight, "key", load) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        assert inflight == {}
+
+    async def test_cancelled_leader_hands_over_to_waiters(self):
+        inflight = {}
+        started = asyncio.Event()
+        calls = 0
+
+        async def load():
+            nonlocal calls
+            calls += 1
+            started.set()
+            await asyncio.sleep(0.05)
+            return "loaded"
+
+        leader = asyncio.create_task(single_flight(inflight, "key", load))
+        await started.wait()
+        waiter = asyncio.create_task(single_flight(inflight, "key", load))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        assert await waiter == "loaded"
+        assert calls == 2
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+    async def test_cancelled_waiter_does_not_cancel_the_call(self):
+        inflight = {}
+
+        async def load():
+            await asyncio.sleep(0.02)
+            return "loaded"
+
+        leader = asyncio.create_task(single_flight(inflight, "key", load))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(single_flight(inflight, "key", load))
+        await asyncio.sleep(0)
+        waiter.cancel()
+
+        assert await leader == "loaded"
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
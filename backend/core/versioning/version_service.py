@@ -6,6 +6,7 @@ from uuid import uuid4, UUID
 from enum import Enum
 
 from core.services.supabase import DBConnection
+from core.services.identity_map import get_row
 from core.utils.logger import logger
 
 
@@ -86,17 +87,10 @@ class VersionService:
             
         client = await self._get_client()
         
-        owner_result = await client.table('agents').select('account_id').eq(
-            'agent_id', agent_id
-        ).eq('account_id', user_id).execute()
-        
-        is_owner = bool(owner_result.data)
-        
-        public_result = await client.table('agents').select('is_public').eq(
-            'agent_id', agent_id
-        ).execute()
+        agent = await get_row(client, 'agents', agent_id, 'account_id, is_public')
         
-        is_public = bool(public_result.data and public_result.data[0].get('is_public', False))
+        is_owner = bool(agent and agent.get('account_id') == user_id)
+        is_public = bool(agent and agent.get('is_public', False))
         
         return is_owner, is_public
     
@@ -304,14 +298,12 @@ class VersionService:
         
         client = await self._get_client()
         
-        result = await client.table('agent_versions').select('*').eq(
-            'version_id', version_id
-        ).eq('agent_id', agent_id).execute()
+        row = await get_row(client, 'agent_versions', version_id)
         
-        if not result.data:
+        if not row or row.get('agent_id') != agent_id:
             raise VersionNotFoundError(f"Version {version_id} not found")
         
-        return self._version_from_db_row(result.data[0])
+        return self._version_from_db_row(row)
     
     async def get_active_version(self, agent_id: str, user_id: str = "system") -> Optional[AgentVersion]:
         is_owner, is_public = await self._verify_and_authorize_agent_access(agent_id, user_id)
@@ -18,6 +18,9 @@ from core.services import redis
 from dramatiq.brokers.redis import RedisBroker
 import os
 from core.services.langfuse import langfuse
+from core.services.response_stream import ResponseStreamWriter, publish_control, expire_response_stream
+from core.services.running_runs import running_runs
+from core.services import active_runs
 from core.utils.retry import retry
 
 import sentry_sdk
@@ -116,13 +119,12 @@ async def run_agent_background(
     pubsub = None
     stop_checker = None
     stop_signal_received = False
+    response_writer = ResponseStreamWriter(agent_run_id)
 
     # Define Redis keys and channels
     response_list_key = f"agent_run:{agent_run_id}:responses"
-    response_channel = f"agent_run:{agent_run_id}:new_response"
     instance_control_channel = f"agent_run:{agent_run_id}:control:{instance_id}"
     global_control_channel = f"agent_run:{agent_run_id}:control"
-    instance_active_key = f"active_run:{instance_id}:{agent_run_id}"
 
     async def check_for_stop_signal():
         nonlocal stop_signal_received
@@ -139,8 +141,8 @@ async def run_agent_background(
                         break
                 # Periodically refresh the active run key TTL
                 if total_responses % 50 == 0: # Refresh every 50 responses or so
-                    try: await redis.expire(instance_active_key, redis.REDIS_KEY_TTL)
-                    except Exception as ttl_err: logger.warning(f"Failed to refresh TTL for {instance_active_key}: {ttl_err}")
+                    try: await active_runs.refresh(instance_id, agent_run_id)
+                    except Exception as ttl_err: logger.warning(f"Failed to refresh active run registration for {agent_run_id}: {ttl_err}")
                 await asyncio.sleep(0.1) # Short sleep to prevent tight loop
         except asyncio.CancelledError:
             logger.debug(f"Stop signal checker cancelled for {agent_run_id} (Instance: {instance_id})")
@@ -162,8 +164,8 @@ async def run_agent_background(
         logger.info(f"Subscribed to control channels: {instance_control_channel}, {global_control_channel}")
         stop_checker = asyncio.create_task(check_for_stop_signal())
 
-        # Ensure active run key exists and has TTL
-        await redis.set(instance_active_key, "running", ex=redis.REDIS_KEY_TTL)
+        # Register this instance as handling the run, so stops can signal it
+        await active_runs.register(instance_id, agent_run_id)
 
         # Initialize agent generator
         agent_gen = run_agent(
@@ -179,8 +181,6 @@ async def run_agent_background(
         final_status = "running"
         error_message = None
 
-        pending_redis_operations = []
-
         async for response in agent_gen:
             if stop_signal_received:
                 logger.debug(f"Agent run {agent_run_id} stopped by signal.")
@@ -188,10 +188,8 @@ async def run_agent_background(
                 trace.span(name="agent_run_stopped").end(status_message="agent_run_stopped", level="WARNING")
                 break
 
-            # Store response in Redis list and publish notification
-            response_json = json.dumps(response)
-            pending_redis_operations.append(asyncio.create_task(redis.rpush(response_list_key, response_json)))
-            pending_redis_operations.append(asyncio.create_task(redis.publish(response_channel, "new")))
+            # Store response in Redis list and publish notification (batched)
+            await response_writer.write(response)
             total_responses += 1
 
             # Check for agent-signaled completion or error
@@ -214,8 +212,10 @@ async def run_agent_background(
              logger.info(f"Agent run {agent_run_id} completed normally (duration: {duration:.2f}s, responses: {total_responses})")
              completion_message = {"type": "status", "status": "completed", "message": "Agent run completed successfully"}
              trace.span(name="agent_run_completed").end(status_message="agent_run_completed")
-             await redis.rpush(response_list_key, json.dumps(completion_message))
-             await redis.publish(response_channel, "new") # Notify about the completion message
+             await response_writer.write(completion_message)
+
+        # Make sure every response is in Redis before reading them back and signalling the end
+        await response_writer.close()
 
         # Fetch final responses from Redis for DB update
         all_responses_json = await redis.lrange(response_list_key, 0, -1)
@@ -227,7 +227,7 @@ async def run_agent_background(
         # Publish final control signal (END_STREAM or ERROR)
         control_signal = "END_STREAM" if final_status == "completed" else "ERROR" if final_status == "failed" else "STOP"
         try:
-            await redis.publish(global_control_channel, control_signal)
+            await publish_control(agent_run_id, control_signal)
             # No need to publish to instance channel as the run is ending on this instance
             logger.debug(f"Published final control signal '{control_signal}' to {global_control_channel}")
         except Exception as e:
@@ -244,8 +244,8 @@ async def run_agent_background(
         # Push error message to Redis list
         error_response = {"type": "status", "status": "error", "message": error_message}
         try:
-            await redis.rpush(response_list_key, json.dumps(error_response))
-            await redis.publish(response_channel, "new")
+            await response_writer.write(error_response)
+            await response_writer.close()
         except Exception as redis_err:
              logger.error(f"Failed to push error response to Redis for {agent_run_id}: {redis_err}")
 
@@ -254,7 +254,7 @@ async def run_agent_background(
 
         # Publish ERROR signal
         try:
-            await redis.publish(global_control_channel, "ERROR")
+            await publish_control(agent_run_id, "ERROR")
             logger.debug(f"Published ERROR signal to {global_control_channel}")
         except Exception as e:
             logger.warning(f"Failed to publish ERROR signal: {str(e)}")
@@ -276,35 +276,35 @@ async def run_agent_background(
             except Exception as e:
                 logger.warning(f"Error closing pubsub for {agent_run_id}: {str(e)}")
 
+        # Flush any responses still buffered (e.g. after a stop signal), with timeout
+        try:
+            await asyncio.wait_for(response_writer.close(), timeout=30.0)
+        except asyncio.TimeoutError:
+            logger.warning(f"Timeout flushing buffered responses for {agent_run_id}")
+        except Exception as e:
+            logger.warning(f"Failed to flush buffered responses for {agent_run_id}: {e}")
+        logger.debug(f"Response stream stats for {agent_run_id}: {response_writer.get_stats()}")
+
         # Set TTL on the response list in Redis
         await _cleanup_redis_response_list(agent_run_id)
 
         # Remove the instance-specific active run key
-        await _cleanup_redis_instance_key(agent_run_id)
+        await _cleanup_redis_instance_key(agent_run_id, instance_id)
 
         # Clean up the run lock
         await _cleanup_redis_run_lock(agent_run_id)
 
-        # Wait for all pending redis operations to complete, with timeout
-        try:
-            await asyncio.wait_for(asyncio.gather(*pending_redis_operations), timeout=30.0)
-        except asyncio.TimeoutError:
-            logger.warning(f"Timeout waiting for pending Redis operations for {agent_run_id}")
-
         logger.debug(f"Agent run background task fully completed for: {agent_run_id} (Instance: {instance_id}) with final status: {final_status}")
 
-async def _cleanup_redis_instance_key(agent_run_id: str):
-    """Clean up the instance-specific Redis key for an agent run."""
+async def _cleanup_redis_instance_key(agent_run_id: str, instance_id: str):
+    """Clean up the Redis registration of an agent run under the instance id it was registered with."""
     if not instance_id:
         logger.warning("Instance ID not set, cannot clean up instance key.")
         return
-    key = f"active_run:{instance_id}:{agent_run_id}"
-    # logger.debug(f"Cleaning up Redis instance key: {key}")
     try:
-        await redis.delete(key)
-        # logger.debug(f"Successfully cleaned up Redis key: {key}")
+        await active_runs.unregister(instance_id, agent_run_id)
     except Exception as e:
-        logger.warning(f"Failed to clean up Redis key {key}: {str(e)}")
+        logger.warning(f"Failed to clean up active run registration for {agent_run_id}: {str(e)}")
 
 async def _cleanup_redis_run_lock(agent_run_id: str):
     """Clean up the run lock Redis key for an agent run."""
@@ -324,6 +324,7 @@ async def _cleanup_redis_response_list(agent_run_id: str):
     response_list_key = f"agent_run:{agent_run_id}:responses"
     try:
         await redis.expire(response_list_key, REDIS_RESPONSE_LIST_TTL)
+        await expire_response_stream(agent_run_id, REDIS_RESPONSE_LIST_TTL)
         # logger.debug(f"Set TTL ({REDIS_RESPONSE_LIST_TTL}s) on response list: {response_list_key}")
     except Exception as e:
         logger.warning(f"Failed to set TTL on response list {response_list_key}: {str(e)}")
@@ -357,6 +358,12 @@ async def update_agent_run_status(
                 if hasattr(update_result, 'data') and update_result.data:
                     # logger.debug(f"Successfully updated agent run {agent_run_id} status to '{status}' (retry {retry})")
 
+                    if status != "running":
+                        try:
+                            await running_runs.release(agent_run_id)
+                        except Exception as e:
+                            logger.warning(f"Failed to release agent run {agent_run_id} from the running index: {str(e)}")
+
                     # Verify the update
                     verify_result = await client.table('agent_runs').select('status', 'completed_at').eq("id", agent_run_id).execute()
                     if verify_result.data:
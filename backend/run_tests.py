@@ -29,7 +29,8 @@ def run_pytest(
         print("❌ No test files found!")
         return 1
     
-    cmd = ["uv", "run", "pytest"]
+    # Test files are named <module>.test.py, which is not an importable module name
+    cmd = ["uv", "run", "pytest", "--import-mode=importlib"]
     
     cmd.extend([str(f) for f in test_files])
     
@@ -0,0 +1,194 @@
+BEGIN;
+
+-- One row per settled LLM response; the primary key makes settlement idempotent per message
+CREATE TABLE IF NOT EXISTS usage_events (
+    message_id UUID PRIMARY KEY,
+    account_id UUID NOT NULL,
+    thread_id UUID,
+    model TEXT NOT NULL,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    cache_read_tokens INTEGER NOT NULL DEFAULT 0,
+    cache_creation_tokens INTEGER NOT NULL DEFAULT 0,
+    cost DECIMAL(12, 6) NOT NULL,
+    status TEXT NOT NULL CHECK (status IN ('deducted', 'insufficient_credits', 'no_account')),
+    ledger_id UUID,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_usage_events_account ON usage_events(account_id, created_at DESC);
+
+ALTER TABLE usage_events ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view own usage events" ON usage_events
+    FOR SELECT USING (auth.uid() = account_id);
+
+CREATE POLICY "Service role manages usage events" ON usage_events
+    FOR ALL USING (auth.role() = 'service_role');
+
+-- balance is authoritative: fold any drift into the expiring/non-expiring split.
+-- Shared by every function that charges credits.
+CREATE OR REPLACE FUNCTION fold_credit_drift(
+    p_expiring DECIMAL,
+    p_non_expiring DECIMAL,
+    p_balance DECIMAL,
+    OUT expiring DECIMAL,
+    OUT non_expiring DECIMAL
+) AS $$
+DECLARE
+    v_drift DECIMAL := p_balance - (p_expiring + p_non_expiring);
+BEGIN
+    expiring := p_expiring;
+    non_expiring := p_non_expiring;
+    IF ABS(v_drift) > 0.01 THEN
+        IF v_drift > 0 THEN
+            non_expiring := non_expiring + v_drift;
+        ELSIF expiring >= -v_drift THEN
+            expiring := expiring + v_drift;
+        ELSE
+            non_expiring := GREATEST(0, non_expiring - (-v_drift - expiring));
+            expiring := 0;
+        END IF;
+    END IF;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- Take p_amount from expiring credits first and the rest from non-expiring ones.
+-- Callers check the balance covers p_amount before calling.
+CREATE OR REPLACE FUNCTION split_credit_deduction(
+    p_expiring DECIMAL,
+    p_non_expiring DECIMAL,
+    p_amount DECIMAL,
+    OUT from_expiring DECIMAL,
+    OUT from_non_expiring DECIMAL,
+    OUT expiring DECIMAL,
+    OUT non_expiring DECIMAL
+) AS $$
+BEGIN
+    from_expiring := LEAST(p_expiring, p_amount);
+    from_non_expiring := p_amount - from_expiring;
+    expiring := p_expiring - from_expiring;
+    non_expiring := GREATEST(0, p_non_expiring - from_non_expiring);
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- Settle a batch of usage events for one account in a single transaction.
+-- p_events: [{message_id, thread_id, model, prompt_tokens, completion_tokens,
+--             cache_read_tokens, cache_creation_tokens, cost}, ...]
+-- Events already present in usage_events are skipped, so redelivered batches are safe.
+CREATE OR REPLACE FUNCTION settle_usage_events(
+    p_account_id UUID,
+    p_events JSONB
+) RETURNS JSONB AS $$
+DECLARE
+    v_expiring DECIMAL;
+    v_non_expiring DECIMAL;
+    v_balance DECIMAL;
+    v_event JSONB;
+    v_message_id UUID;
+    v_cost DECIMAL;
+    v_from_expiring DECIMAL;
+    v_from_non_expiring DECIMAL;
+    v_ledger_id UUID;
+    v_settled INTEGER := 0;
+    v_duplicates INTEGER := 0;
+    v_insufficient INTEGER := 0;
+    v_deducted DECIMAL := 0;
+BEGIN
+    SELECT expiring_credits, non_expiring_credits, balance
+    INTO v_expiring, v_non_expiring, v_balance
+    FROM credit_accounts
+    WHERE account_id = p_account_id
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        INSERT INTO usage_events (
+            message_id, account_id, thread_id, model, prompt_tokens, completion_tokens,
+            cache_read_tokens, cache_creation_tokens, cost, status
+        )
+        SELECT
+            (e->>'message_id')::UUID, p_account_id, NULLIF(e->>'thread_id', '')::UUID, e->>'model',
+            COALESCE((e->>'prompt_tokens')::INTEGER, 0), COALESCE((e->>'completion_tokens')::INTEGER, 0),
+            COALESCE((e->>'cache_read_tokens')::INTEGER, 0), COALESCE((e->>'cache_creation_tokens')::INTEGER, 0),
+            (e->>'cost')::DECIMAL, 'no_account'
+        FROM jsonb_array_elements(p_events) AS e
+        ON CONFLICT (message_id) DO NOTHING;
+
+        RETURN jsonb_build_object('success', false, 'error', 'No credit account found');
+    END IF;
+
+    -- Same drift correction as CreditManager.use_credits
+    SELECT f.expiring, f.non_expiring INTO v_expiring, v_non_expiring
+    FROM fold_credit_drift(v_expiring, v_non_expiring, v_balance) AS f;
+    v_balance := v_expiring + v_non_expiring;
+
+    FOR v_event IN SELECT * FROM jsonb_array_elements(p_events) LOOP
+        v_message_id := (v_event->>'message_id')::UUID;
+        v_cost := (v_event->>'cost')::DECIMAL;
+
+        IF EXISTS (SELECT 1 FROM usage_events WHERE message_id = v_message_id) THEN
+            v_duplicates := v_duplicates + 1;
+            CONTINUE;
+        END IF;
+
+        IF v_balance < v_cost THEN
+            v_insufficient := v_insufficient + 1;
+            v_ledger_id := NULL;
+        ELSE
+            SELECT d.from_expiring, d.from_non_expiring, d.expiring, d.non_expiring
+            INTO v_from_expiring, v_from_non_expiring, v_expiring, v_non_expiring
+            FROM split_credit_deduction(v_expiring, v_non_expiring, v_cost) AS d;
+            v_balance := v_expiring + v_non_expiring;
+
+            INSERT INTO credit_ledger (
+                account_id, amount, balance_after, type, description, reference_id, metadata
+            ) VALUES (
+                p_account_id, -v_cost, v_balance, 'usage', (v_event->>'model') || ' usage', v_message_id,
+                jsonb_build_object(
+                    'thread_id', v_event->>'thread_id',
+                    'message_id', v_message_id,
+                    'from_expiring', v_from_expiring,
+                    'from_non_expiring', v_from_non_expiring
+                )
+            ) RETURNING id INTO v_ledger_id;
+
+            v_settled := v_settled + 1;
+            v_deducted := v_deducted + v_cost;
+        END IF;
+
+        INSERT INTO usage_events (
+            message_id, account_id, thread_id, model, prompt_tokens, completion_tokens,
+            cache_read_tokens, cache_creation_tokens, cost, status, ledger_id
+        ) VALUES (
+            v_message_id, p_account_id, NULLIF(v_event->>'thread_id', '')::UUID, v_event->>'model',
+            COALESCE((v_event->>'prompt_tokens')::INTEGER, 0), COALESCE((v_event->>'completion_tokens')::INTEGER, 0),
+            COALESCE((v_event->>'cache_read_tokens')::INTEGER, 0), COALESCE((v_event->>'cache_creation_tokens')::INTEGER, 0),
+            v_cost, CASE WHEN v_ledger_id IS NULL THEN 'insufficient_credits' ELSE 'deducted' END, v_ledger_id
+        );
+    END LOOP;
+
+    IF v_settled > 0 THEN
+        UPDATE credit_accounts
+        SET expiring_credits = v_expiring,
+            non_expiring_credits = v_non_expiring,
+            balance = v_balance,
+            updated_at = NOW()
+        WHERE account_id = p_account_id;
+    END IF;
+
+    RETURN jsonb_build_object(
+        'success', true,
+        'settled', v_settled,
+        'duplicates', v_duplicates,
+        'insufficient', v_insufficient,
+        'amount_deducted', v_deducted,
+        'new_expiring', v_expiring,
+        'new_non_expiring', v_non_expiring,
+        'new_total', v_balance
+    );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+GRANT EXECUTE ON FUNCTION settle_usage_events(UUID, JSONB) TO service_role;
+
+COMMIT;
@@ -0,0 +1,90 @@
+BEGIN;
+
+-- Atomic replacement for the read-modify-write in CreditManager.use_credits.
+-- The account row is locked for the duration of the call, so concurrent
+-- deductions for the same account serialize instead of overwriting each other.
+CREATE OR REPLACE FUNCTION use_credits_atomic(
+    p_account_id UUID,
+    p_amount DECIMAL,
+    p_description TEXT DEFAULT NULL,
+    p_thread_id UUID DEFAULT NULL,
+    p_message_id UUID DEFAULT NULL
+) RETURNS JSONB AS $$
+DECLARE
+    v_expiring DECIMAL;
+    v_non_expiring DECIMAL;
+    v_balance DECIMAL;
+    v_from_expiring DECIMAL;
+    v_from_non_expiring DECIMAL;
+    v_new_total DECIMAL;
+    v_transaction_id UUID;
+BEGIN
+    SELECT expiring_credits, non_expiring_credits, balance
+    INTO v_expiring, v_non_expiring, v_balance
+    FROM credit_accounts
+    WHERE account_id = p_account_id
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RETURN jsonb_build_object(
+            'success', false,
+            'error', 'No credit account found',
+            'required', p_amount,
+            'available', 0
+        );
+    END IF;
+
+    -- balance is authoritative; fold any drift into the expiring/non-expiring split
+    SELECT f.expiring, f.non_expiring INTO v_expiring, v_non_expiring
+    FROM fold_credit_drift(v_expiring, v_non_expiring, v_balance) AS f;
+
+    IF v_balance < p_amount THEN
+        RETURN jsonb_build_object(
+            'success', false,
+            'error', 'Insufficient credits',
+            'required', p_amount,
+            'available', v_balance
+        );
+    END IF;
+
+    SELECT d.from_expiring, d.from_non_expiring, d.expiring, d.non_expiring
+    INTO v_from_expiring, v_from_non_expiring, v_expiring, v_non_expiring
+    FROM split_credit_deduction(v_expiring, v_non_expiring, p_amount) AS d;
+    v_new_total := v_expiring + v_non_expiring;
+
+    UPDATE credit_accounts
+    SET expiring_credits = v_expiring,
+        non_expiring_credits = v_non_expiring,
+        balance = v_new_total,
+        updated_at = NOW()
+    WHERE account_id = p_account_id;
+
+    INSERT INTO credit_ledger (
+        account_id, amount, balance_after, type, description, reference_id, metadata
+    ) VALUES (
+        p_account_id, -p_amount, v_new_total, 'usage', p_description,
+        COALESCE(p_thread_id, p_message_id),
+        jsonb_build_object(
+            'thread_id', p_thread_id,
+            'message_id', p_message_id,
+            'from_expiring', v_from_expiring,
+            'from_non_expiring', v_from_non_expiring
+        )
+    ) RETURNING id INTO v_transaction_id;
+
+    RETURN jsonb_build_object(
+        'success', true,
+        'amount_deducted', p_amount,
+        'from_expiring', v_from_expiring,
+        'from_non_expiring', v_from_non_expiring,
+        'new_expiring', v_expiring,
+        'new_non_expiring', v_non_expiring,
+        'new_total', v_new_total,
+        'transaction_id', v_transaction_id
+    );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+GRANT EXECUTE ON FUNCTION use_credits_atomic(UUID, DECIMAL, TEXT, UUID, UUID) TO service_role;
+
+COMMIT;
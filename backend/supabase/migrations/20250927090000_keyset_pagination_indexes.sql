@@ -0,0 +1,12 @@
+BEGIN;
+
+-- Keyset pagination for thread and message listings orders by
+-- (created_at, id) within one account or thread. These indexes let each page
+-- start at the cursor instead of scanning the rows before it.
+CREATE INDEX IF NOT EXISTS idx_threads_account_created_keyset
+    ON threads(account_id, created_at DESC, thread_id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_messages_thread_created_keyset
+    ON messages(thread_id, created_at, message_id);
+
+COMMIT;
@@ -128,10 +128,12 @@ class Message:
 
 @dataclass
 class PaginationInfo:
-    page: int
+    page: Optional[int]  # None for cursor pages
     limit: int
-    total: int
-    pages: int
+    total: Optional[int]  # Not counted for cursor pages
+    pages: Optional[int]
+    next_cursor: Optional[str] = None
+    has_more: bool = False
 
 
 @dataclass
@@ -143,6 +145,7 @@ class ThreadsResponse:
 @dataclass
 class MessagesResponse:
     messages: List[Message]
+    next_cursor: Optional[str] = None
 
 
 @dataclass
@@ -321,12 +324,14 @@ class ThreadsClient:
         self,
         page: int = 1,
         limit: int = 1000,
+        cursor: Optional[str] = None,
     ) -> ThreadsResponse:
-        """Get all threads for the current user with associated project data.
+        """Get threads for the current user with associated project data, newest first.
 
         Args:
-            page: Page number (1-based)
+            page: Page number (1-based); ignored when cursor is set
             limit: Number of items per page (max 1000)
+            cursor: pagination.next_cursor of the previous page
 
         Returns:
             ThreadsResponse containing paginated threads
@@ -335,6 +340,8 @@ class ThreadsClient:
             "page": page,
             "limit": limit,
         }
+        if cursor:
+            params["cursor"] = cursor
 
         response = await self.client.get("/threads", params=params)
         data = self._handle_response(response)
@@ -398,25 +405,36 @@ class ThreadsClient:
         )
 
     async def get_thread_messages(
-        self, thread_id: str, order: str = "desc"
+        self,
+        thread_id: str,
+        order: str = "desc",
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
     ) -> MessagesResponse:
-        """Get ALL messages for a thread.
+        """Get messages for a thread.
 
         Args:
             thread_id: The thread ID
             order: Order by created_at: 'asc' or 'desc'
+            limit: Return one page of this many messages (max 1000) instead of all
+            cursor: next_cursor of the previous page
 
         Returns:
-            MessagesResponse containing all messages
+            MessagesResponse containing the messages and, for paged
+            requests, the cursor of the next page
         """
         params = {"order": order}
+        if limit is not None:
+            params["limit"] = limit
+        if cursor:
+            params["cursor"] = cursor
         response = await self.client.get(
             f"/threads/{thread_id}/messages", params=params
         )
         data = self._handle_response(response)
 
         messages = [from_dict(Message, msg_data) for msg_data in data["messages"]]
-        return MessagesResponse(messages=messages)
+        return MessagesResponse(messages=messages, next_cursor=data.get("next_cursor"))
 
     async def add_message_to_thread(self, thread_id: str, message: str) -> Message:
         """Add a simple message to a thread.